@@ -46,11 +46,47 @@ def create_app():
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool size/overflow/recycle/pre-ping, see backend/db_pool.py
+    from backend.db_pool import engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
     
     
     app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'uploads/profile_images')
     app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 5242880))    # 5MB
 
+    # Batch prediction settings (/api/predict/batch)
+    app.config['BATCH_CHUNK_SIZE'] = int(os.environ.get('BATCH_CHUNK_SIZE', 32))
+    app.config['BATCH_MAX_CHUNK_SIZE'] = int(os.environ.get('BATCH_MAX_CHUNK_SIZE', 1024))
+    app.config['BATCH_MAX_MESSAGES'] = int(os.environ.get('BATCH_MAX_MESSAGES', 10000))
+
+    # Always send per-stage Server-Timing headers (otherwise only with X-Debug-Timings: 1)
+    app.config['DEBUG_TIMINGS'] = os.environ.get('DEBUG_TIMINGS', 'false').lower() in ('1', 'true', 'yes')
+
+    # Admin endpoints (/api/admin/*) are disabled unless ADMIN_TOKEN is set
+    app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
+    # Profiling, see backend/profiling.py (all off by default)
+    app.config['PROFILE_REQUESTS'] = os.environ.get('PROFILE_REQUESTS', 'false').lower() in ('1', 'true', 'yes')
+    app.config['PROFILE_SIGNAL'] = os.environ.get('PROFILE_SIGNAL')  # e.g. SIGUSR2
+    app.config['PROFILE_SIGNAL_SECONDS'] = float(os.environ.get('PROFILE_SIGNAL_SECONDS', 10))
+
+    # Hot model reload, see backend/ml_model/model_registry.py
+    app.config['MODEL_RELOAD_WATCH'] = os.environ.get('MODEL_RELOAD_WATCH', 'false').lower() in ('1', 'true', 'yes')
+    app.config['MODEL_RELOAD_INTERVAL'] = float(os.environ.get('MODEL_RELOAD_INTERVAL', 30))
+    # Shadow evaluation of a candidate bundle, see backend/shadow_evaluation.py (off unless MODEL_SHADOW_DIR)
+    app.config['MODEL_SHADOW_DIR'] = os.environ.get('MODEL_SHADOW_DIR')
+    app.config['MODEL_SHADOW_SAMPLE_RATE'] = float(os.environ.get('MODEL_SHADOW_SAMPLE_RATE', 0.1))
+    app.config['MODEL_SHADOW_WORKERS'] = int(os.environ.get('MODEL_SHADOW_WORKERS', 1))
+    app.config['MODEL_SHADOW_MAX_PENDING'] = int(os.environ.get('MODEL_SHADOW_MAX_PENDING', 100))
+
+    # Slow-request log, see backend/slow_requests.py (SLOW_REQUEST_MS=0 disables)
+    app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+    app.config['SLOW_REQUEST_SAMPLE_RATE'] = float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', 1.0))
+    # One file per worker ({pid}): RotatingFileHandler must not be shared between processes
+    app.config['SLOW_REQUEST_LOG'] = os.environ.get(
+        'SLOW_REQUEST_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'slow_requests.{pid}.log'))
+    app.config['SLOW_REQUEST_LOG_MAX_BYTES'] = int(os.environ.get('SLOW_REQUEST_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    app.config['SLOW_REQUEST_LOG_BACKUPS'] = int(os.environ.get('SLOW_REQUEST_LOG_BACKUPS', 5))
+
     # Email configuration - SendGrid (Primary)
     app.config['SENDGRID_API_KEY'] = os.environ.get('SENDGRID_API_KEY')
 
@@ -87,7 +123,8 @@ def create_app():
     CORS(app,
          origins="*",
          supports_credentials=False,
-         allow_headers=["Content-Type", "Authorization"],
+         allow_headers=["Content-Type", "Authorization", "X-Debug-Timings", "X-Admin-Token", "X-Profile"],
+         expose_headers=["Server-Timing", "X-Profile-Id"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     print("CORS configured to allow all origins with full headers and methods")
     # -----------------------------------------------------------------------------------------------------------------
@@ -96,18 +133,40 @@ def create_app():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Import models to ensure they are registered
-    from backend.models import User, Prediction, PasswordResetToken
+    from backend.models import User, Prediction, PasswordResetToken, Message, PredictionDailyRollup
 
     # Register blueprints
     from backend.routes.auth import auth_bp
     from backend.routes.predictions import predictions_bp
     from backend.routes.users import users_bp
     from backend.routes.chatbot import chatbot_bp
+    from backend.routes.admin import admin_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(predictions_bp, url_prefix='/api')
     app.register_blueprint(users_bp, url_prefix='/api/user')
     app.register_blueprint(chatbot_bp, url_prefix='/api/chatbot')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+
+    # Prometheus metrics (GET /metrics), see backend/metrics.py
+    from backend import metrics
+    metrics.init_app(app)
+
+    # On-demand profiling hooks (only installed when configured)
+    from backend import profiling
+    profiling.init_app(app)
+
+    # Structured log of requests over SLOW_REQUEST_MS
+    from backend import slow_requests
+    slow_requests.init_app(app)
+
+    # Watch the model bundle and swap retrained models in (MODEL_RELOAD_WATCH)
+    from backend.ml_model import model_registry
+    model_registry.init_app(app)
+
+    # Score a candidate bundle in the background on sampled predictions (MODEL_SHADOW_DIR)
+    from backend import shadow_evaluation
+    shadow_evaluation.init_app(app)
     
     # Error handlers
     @app.errorhandler(404)
@@ -140,6 +199,15 @@ def create_app():
             'version': '1.0.0'
         })
 
+    # Connection pool instrumentation
+    @app.route('/api/health/db')
+    def db_pool_health():
+        from backend.db_pool import pool_stats
+        return jsonify({
+            'success': True,
+            'data': pool_stats()
+        })
+
     # Forgot password page (Flask-only solution)
     @app.route('/forgot-password')
     def forgot_password_page():
@@ -162,19 +230,18 @@ def create_app():
         '''
 
     
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-        print("Database initialized")
+    # Serve uploaded profile images at /uploads/profile_images/<filename>
+    @app.route('/uploads/profile_images/<filename>')
+    def uploaded_profile_image(filename):
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
-        # Check existing users
-        from backend.models import User
-        users = User.query.all()
-        print(f"Current users in database: {len(users)}")
-        for user in users:
-            print(f"  - {user.username} ({user.email})")
-
-        print("Ready for new user registrations")
+    # Schema creation is an explicit migration step (python -m backend.create_tables).
+    # DB_AUTO_CREATE=true restores create-on-boot for local development; it never
+    # scans tables, so boot time does not grow with the data.
+    if os.environ.get('DB_AUTO_CREATE', 'false').lower() in ('1', 'true', 'yes'):
+        with app.app_context():
+            db.create_all()
+            print("Database initialized (DB_AUTO_CREATE)")
 
     return app
 
@@ -184,11 +251,18 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=debug_mode)
 
-# Expose app instance for gunicorn (no --factory)
-app = create_app()
+_app = None
+
+def __getattr__(name):
+    """
+    Build the module-level app on first access (gunicorn app:app, from backend.app import app).
 
-# Serve uploaded profile images at /uploads/profile_images/<filename>
-@app.route('/uploads/profile_images/<filename>')
-def uploaded_profile_image(filename):
-    from flask import send_from_directory
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    Importing this module no longer builds an app, so gunicorn 'backend.app:create_app()'
+    and scripts that call create_app() only pay for one.
+    """
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
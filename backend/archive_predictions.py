@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Retention job for the predictions table.
+
+Predictions older than the retention age are, batch by batch:
+  1. written to compressed archive files on local disk
+     (gzip'd NDJSON by default, Parquet with --format parquet),
+  2. rolled into per-user daily aggregates (prediction_daily_rollups),
+  3. deleted, in the same transaction as the rollup update.
+
+UserStats.calculate_stats adds the rollups back in, so dashboard totals
+stay the same after a run. Each batch is its own short transaction, so the
+job never holds long locks on predictions.
+
+The archive is written before the transaction commits. If the job dies in
+between, the next run archives those rows again: archives are
+at-least-once, rollups exactly-once.
+
+Schedule it daily (cron, Render/Fly scheduled machine) with e.g.:
+    python -m backend.archive_predictions --older-than-days 90
+"""
+
+import argparse
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from backend.app import create_app
+from backend.models import db, Prediction, PredictionDailyRollup
+
+
+def archive_path(archive_dir, day, fmt, batch_tag):
+    """Archive file for one day; Parquet gets one file per run and batch"""
+    day_dir = os.path.join(archive_dir, day.strftime('%Y'), day.strftime('%m'))
+    os.makedirs(day_dir, exist_ok=True)
+    if fmt == 'parquet':
+        return os.path.join(day_dir, f"predictions-{day.isoformat()}-{batch_tag}.parquet")
+    return os.path.join(day_dir, f"predictions-{day.isoformat()}.ndjson.gz")
+
+
+def serialize(p):
+    """Archive record for a prediction row"""
+    return {
+        'id': p.id,
+        'user_id': p.user_id,
+        'message': p.message_text,
+        'message_hash': p.message_hash,
+        'prediction': p.prediction,
+        'confidence': p.confidence,
+        'timestamp': p.timestamp.isoformat() if p.timestamp else None,
+        'processing_time_ms': p.processing_time_ms,
+        'model_version': p.model_version,
+    }
+
+
+def write_archive(rows, archive_dir, fmt, batch_tag):
+    """Write a batch of rows to their per-day archive files"""
+    by_day = defaultdict(list)
+    for p in rows:
+        by_day[p.timestamp.date()].append(serialize(p))
+    for day, records in by_day.items():
+        path = archive_path(archive_dir, day, fmt, batch_tag)
+        if fmt == 'parquet':
+            import pandas as pd  # needs pyarrow or fastparquet
+            pd.DataFrame.from_records(records).to_parquet(path, index=False)
+        else:
+            # Appending adds a new gzip member; gzip readers see one stream
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def apply_rollups(rows):
+    """Add a batch of rows to their (user, day) rollups"""
+    deltas = defaultdict(lambda: [0, 0, 0, 0.0])
+    for p in rows:
+        d = deltas[(p.user_id, p.timestamp.date())]
+        d[0] += 1
+        if p.prediction == 'spam':
+            d[1] += 1
+        else:
+            d[2] += 1
+        d[3] += p.confidence or 0.0
+
+    user_ids = {user_id for user_id, _ in deltas}
+    days = {day for _, day in deltas}
+    existing = {
+        (r.user_id, r.day): r
+        for r in PredictionDailyRollup.query.filter(
+            PredictionDailyRollup.user_id.in_(user_ids),
+            PredictionDailyRollup.day.in_(days)
+        ).all()
+    }
+    for key, (total, spam, ham, conf_sum) in deltas.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            rollup = PredictionDailyRollup(user_id=key[0], day=key[1], total_count=0,
+                                           spam_count=0, ham_count=0, confidence_sum=0.0)
+            db.session.add(rollup)
+        rollup.total_count += total
+        rollup.spam_count += spam
+        rollup.ham_count += ham
+        rollup.confidence_sum += conf_sum
+
+
+def run(older_than_days=90, archive_dir='archive/predictions', fmt='ndjson', batch_size=1000,
+        max_batches=None, dry_run=False):
+    """Archive, roll up and delete predictions older than the cutoff"""
+    started = datetime.utcnow()
+    cutoff = started - timedelta(days=older_than_days)
+    print(f"🔄 Archiving predictions older than {cutoff.isoformat()} ({older_than_days} days)")
+
+    if dry_run:
+        count = Prediction.query.filter(Prediction.timestamp < cutoff).count()
+        print(f"Dry run: {count} predictions would be archived.")
+        return count
+
+    moved = 0
+    batch_no = 0
+    while max_batches is None or batch_no < max_batches:
+        rows = Prediction.query.filter(Prediction.timestamp < cutoff)\
+            .order_by(Prediction.timestamp, Prediction.id)\
+            .limit(batch_size)\
+            .all()
+        if not rows:
+            break
+        try:
+            write_archive(rows, archive_dir, fmt, f"{started:%Y%m%dT%H%M%S}-{batch_no:05d}")
+            apply_rollups(rows)
+            ids = [p.id for p in rows]
+            Prediction.query.filter(Prediction.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(rows)
+        batch_no += 1
+        print(f"  archived {moved} predictions...")
+
+    print(f"✅ Archived {moved} predictions to {archive_dir}")
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--older-than-days', type=int,
+                        default=int(os.environ.get('PREDICTION_RETENTION_DAYS', 90)))
+    parser.add_argument('--archive-dir', default=os.environ.get('PREDICTION_ARCHIVE_DIR', 'archive/predictions'))
+    parser.add_argument('--format', choices=['ndjson', 'parquet'], default='ndjson')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='rows per transaction; keeps lock time bounded')
+    parser.add_argument('--max-batches', type=int, default=None,
+                        help='stop after this many batches (spread large backlogs over several runs)')
+    parser.add_argument('--dry-run', action='store_true', help='only count eligible rows')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        run(args.older_than_days, args.archive_dir, args.format, args.batch_size,
+            args.max_batches, args.dry_run)
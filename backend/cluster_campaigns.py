@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Spam campaign clustering job.
+
+Spam predictions stored since the last run are, batch by batch:
+  1. grouped by message text and vectorized with the serving bundle's vectorizer,
+  2. folded into the generation's MiniBatchKMeans model
+     (ml_model/campaign_clusters.py), weighted by how often each text was sent,
+  3. recorded: texts seen for the first time get a campaign
+     (campaign_messages), and campaign sizes, top terms and last-seen times
+     are updated in campaign_clusters.
+
+Each batch commits with a campaign_cluster_runs row carrying the
+watermark: the (timestamp, id) of the last prediction it included, and
+the updated model in campaign_models. The
+next batch starts after it, so a run reads only new rows, never the whole
+table. Rows younger than --lag-seconds are left for the next run, so
+requests still committing are not skipped. The first run of a generation
+starts --since-days back. The first run does nothing until at least
+--clusters distinct spam texts are available.
+
+GET /api/campaigns/top serves the largest campaigns from these tables.
+
+Schedule it (cron, Render/Fly scheduled machine) or keep it running:
+    python -m backend.cluster_campaigns
+    python -m backend.cluster_campaigns --every 900
+"""
+
+import argparse
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import and_, or_
+
+from backend.app import create_app
+from backend.models import db, Prediction, CampaignCluster, CampaignMessage, CampaignClusterRun, CampaignModelState
+from backend.ml_model import spam_detector_multi as smd
+from backend.ml_model import campaign_clusters
+
+
+def last_run(generation):
+    return CampaignClusterRun.query.filter_by(generation=generation)\
+        .order_by(CampaignClusterRun.id.desc()).first()
+
+
+def load_model(generation):
+    """The stored model of a generation, or None"""
+    row = db.session.get(CampaignModelState, generation)
+    return campaign_clusters.loads(row.state) if row else None
+
+
+def save_model(model):
+    """Stage the model in the current transaction, next to the rows it produced"""
+    row = db.session.get(CampaignModelState, model.generation)
+    if row is None:
+        row = CampaignModelState(generation=model.generation)
+        db.session.add(row)
+    row.state = campaign_clusters.dumps(model)
+    row.samples = model.samples
+
+
+def new_spam_predictions(watermark, since, until, limit):
+    """Spam predictions after the watermark (or since, on a generation's first run), oldest first"""
+    query = Prediction.query.filter(Prediction.prediction == 'spam',
+                                    Prediction.message_hash.isnot(None),
+                                    Prediction.timestamp <= until)
+    if watermark is None:
+        query = query.filter(Prediction.timestamp >= since)
+    else:
+        timestamp, prediction_id = watermark
+        query = query.filter(or_(Prediction.timestamp > timestamp,
+                                 and_(Prediction.timestamp == timestamp, Prediction.id > prediction_id)))
+    return query.order_by(Prediction.timestamp, Prediction.id).limit(limit).all()
+
+
+def cluster_batch(model, rows):
+    """Fit and assign one batch of predictions; returns the run row, or None if it is too small to start"""
+    generation = model.generation
+    by_hash = OrderedDict()
+    for p in rows:
+        by_hash.setdefault(p.message_hash, []).append(p)
+    hashes = list(by_hash)
+    clean = [smd.transform_text(by_hash[h][0].message_ref.text) for h in hashes]
+    X = smd.current_engine().tfidf.transform(clean)
+    # Texts with no known term say nothing about a campaign
+    keep = np.flatnonzero(X.getnnz(axis=1))
+    if not model.fitted and len(keep) < model.n_clusters:
+        return None
+
+    known = {m.message_hash: m for m in CampaignMessage.query.filter(
+        CampaignMessage.generation == generation, CampaignMessage.message_hash.in_(hashes)).all()}
+    if len(keep):
+        weights = np.array([len(by_hash[hashes[i]]) for i in keep], dtype=float)
+        model.partial_fit(X[keep], weights)
+    new = [i for i in keep if hashes[i] not in known]
+    labels, distances = model.assign(X[new], [clean[i] for i in new]) if new else ([], [])
+
+    clusters = {c.label: c for c in CampaignCluster.query.filter_by(generation=generation).all()}
+
+    def cluster_for(label):
+        if label not in clusters:
+            clusters[label] = CampaignCluster(generation=generation, label=label)
+            db.session.add(clusters[label])
+            db.session.flush()
+        return clusters[label]
+
+    touched = set()
+    for i, label, distance in zip(new, labels, distances):
+        h = hashes[i]
+        cluster = cluster_for(int(label))
+        cluster.message_count = (cluster.message_count or 0) + 1
+        if cluster.example_hash is None:
+            cluster.example_hash = h
+        known[h] = CampaignMessage(generation=generation, message_hash=h, cluster_id=cluster.id,
+                                   distance=float(distance), hits=0, first_seen=by_hash[h][0].timestamp)
+        db.session.add(known[h])
+        touched.add(int(label))
+
+    by_id = {c.id: c for c in clusters.values()}
+    for h, predictions in by_hash.items():
+        message = known.get(h)
+        if message is None:
+            continue
+        cluster = by_id[message.cluster_id]
+        first, last = predictions[0].timestamp, predictions[-1].timestamp
+        message.hits = (message.hits or 0) + len(predictions)
+        message.last_seen = last
+        cluster.prediction_count = (cluster.prediction_count or 0) + len(predictions)
+        cluster.first_seen = min(cluster.first_seen or first, first)
+        cluster.last_seen = max(cluster.last_seen or last, last)
+        touched.add(cluster.label)
+    for label in touched:
+        clusters[label].top_terms = ','.join(model.top_terms(label))[:255]
+
+    run = CampaignClusterRun(generation=generation, watermark_timestamp=rows[-1].timestamp,
+                             watermark_id=rows[-1].id, rows=len(rows), messages=len(hashes),
+                             new_messages=len(new))
+    db.session.add(run)
+    return run
+
+
+def run(batch_size=2000, max_rows=None, since_days=30, lag_seconds=60, n_clusters=None):
+    """Cluster the spam predictions stored since the last run; returns the number of rows processed"""
+    engine = smd.current_engine()
+    generation = campaign_clusters.generation(engine.tfidf)
+    model = load_model(generation)
+    previous = last_run(generation)
+    if model is None:
+        if previous is not None:
+            # Both are written in one transaction, so only a manual delete gets here;
+            # new centres would give the stored labels a different meaning
+            raise RuntimeError(f"campaign_models has no row for generation {generation}, which has runs; "
+                               f"delete that generation's campaign rows to start it again")
+        model = campaign_clusters.CampaignModel(generation, n_clusters or campaign_clusters.N_CLUSTERS)
+    watermark = (previous.watermark_timestamp, previous.watermark_id) if previous else None
+    since = datetime.utcnow() - timedelta(days=since_days)
+    until = datetime.utcnow() - timedelta(seconds=lag_seconds)
+
+    processed = 0
+    window = batch_size
+    while max_rows is None or processed < max_rows:
+        limit = window if max_rows is None else min(window, max_rows - processed)
+        rows = new_spam_predictions(watermark, since, until, limit)
+        if not rows:
+            break
+        try:
+            batch = cluster_batch(model, rows)
+            if batch is None:
+                db.session.rollback()
+                if len(rows) == limit and (max_rows is None or limit < max_rows - processed):
+                    # Repeats of a few campaigns; read further to find enough distinct texts
+                    window *= 2
+                    continue
+                print(f"Only {len(rows)} spam prediction(s) so far; "
+                      f"waiting for {model.n_clusters} distinct texts to start generation {generation}.")
+                break
+            save_model(model)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        processed += len(rows)
+        window = batch_size
+        watermark = (batch.watermark_timestamp, batch.watermark_id)
+        print(f"🧩 Clustered {batch.rows} spam prediction(s), {batch.new_messages} new text(s), "
+              f"up to {batch.watermark_timestamp.isoformat()}")
+        if len(rows) < limit:
+            break
+    if processed == 0:
+        print("No new spam predictions to cluster.")
+    return processed
+
+
+def top_campaigns(limit=10, days=None):
+    """Largest campaigns of the latest generation, optionally only those seen in the last days"""
+    latest = CampaignClusterRun.query.order_by(CampaignClusterRun.id.desc()).first()
+    if latest is None:
+        return None, []
+    query = CampaignCluster.query.filter_by(generation=latest.generation)
+    if days:
+        query = query.filter(CampaignCluster.last_seen >= datetime.utcnow() - timedelta(days=days))
+    clusters = query.order_by(CampaignCluster.prediction_count.desc(), CampaignCluster.id).limit(limit).all()
+    return latest, clusters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=2000, help='predictions per transaction')
+    parser.add_argument('--max-rows', type=int, default=None, help='stop after this many predictions')
+    parser.add_argument('--since-days', type=int, default=30,
+                        help='how far back the first run of a generation starts')
+    parser.add_argument('--lag-seconds', type=int, default=60,
+                        help='leave predictions younger than this for the next run')
+    parser.add_argument('--clusters', type=int, default=None,
+                        help=f'clusters of a new generation (default {campaign_clusters.N_CLUSTERS})')
+    parser.add_argument('--every', type=float, default=None, help='repeat every N seconds')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        while True:
+            run(args.batch_size, args.max_rows, args.since_days, args.lag_seconds, args.clusters)
+            if not args.every:
+                break
+            db.session.remove()
+            time.sleep(args.every)
@@ -4,6 +4,10 @@ Configuration settings for SMS Guard Flask Application
 
 import os
 from datetime import timedelta
+try:
+    from backend.db_pool import engine_options
+except ImportError:
+    from db_pool import engine_options
 
 class Config:
     """Base configuration class"""
@@ -31,10 +35,16 @@ class Config:
     MODEL_PATH = os.environ.get('MODEL_PATH', 'ml_model/models/spam_model.pkl')
     VECTORIZER_PATH = os.environ.get('VECTORIZER_PATH', 'ml_model/models/vectorizer.pkl')
 
+    # Batch prediction settings
+    BATCH_CHUNK_SIZE = int(os.environ.get('BATCH_CHUNK_SIZE', 32))
+    BATCH_MAX_CHUNK_SIZE = int(os.environ.get('BATCH_MAX_CHUNK_SIZE', 1024))
+    BATCH_MAX_MESSAGES = int(os.environ.get('BATCH_MAX_MESSAGES', 10000))
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///smsguard_dev.db'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_ECHO = True  # Log SQL queries
 
 class ProductionConfig(Config):
@@ -49,6 +59,7 @@ class ProductionConfig(Config):
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
     
     SQLALCHEMY_DATABASE_URI = database_url
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(database_url)
     SQLALCHEMY_ECHO = False
     
     # Security settings for production
@@ -60,6 +71,7 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     WTF_CSRF_ENABLED = False
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=5)
 
@@ -5,7 +5,7 @@ Creates all necessary tables including the new PasswordResetToken table
 """
 
 from backend.app import create_app
-from backend.models import db, User, Prediction, PasswordResetToken
+from backend.models import db, User, Prediction, PasswordResetToken, Message, PredictionDailyRollup, PredictionFeedback, ShadowEvaluation, CampaignCluster, CampaignMessage, CampaignClusterRun
 
 def create_tables():
     """Create all database tables"""
@@ -21,6 +21,14 @@ def create_tables():
         print("📋 Tables created:")
         print("  - users")
         print("  - predictions") 
+        print("  - messages")
+        print("  - prediction_daily_rollups")
+        print("  - prediction_feedback")
+        print("  - shadow_evaluations")
+        print("  - campaign_clusters")
+        print("  - campaign_messages")
+        print("  - campaign_cluster_runs")
+        print("  - campaign_models")
         print("  - password_reset_tokens")
         
         # Verify tables exist
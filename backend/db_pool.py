@@ -0,0 +1,152 @@
+"""
+Database connection pool settings and instrumentation
+
+engine_options() builds SQLALCHEMY_ENGINE_OPTIONS from environment variables.
+Connections are pre-pinged and recycled, so a worker that Fly has idled does
+not stall on a dead connection. InstrumentedQueuePool records checkouts,
+time spent waiting for a connection and overflow use; pool_stats()
+returns a snapshot for the health endpoint.
+"""
+
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Checkouts slower than this are counted as stalls
+STALL_THRESHOLD_MS = float(os.environ.get('DB_POOL_STALL_MS', 100))
+
+_lock = threading.Lock()
+_counters = {
+    'checkouts': 0,
+    'checkins': 0,
+    'connects': 0,
+    'invalidations': 0,
+    'timeouts': 0,
+    'stalls': 0,
+    'wait_ms_total': 0.0,
+    'wait_ms_max': 0.0,
+    'overflow_max': 0,
+}
+_pools = weakref.WeakSet()
+# Callbacks (event, value) for exporters such as backend/metrics.py
+_observers = []
+
+
+def add_observer(callback):
+    """Register callback(event, value) for 'checkout' (wait ms), 'checkin', 'timeout' and 'invalidate'"""
+    _observers.append(callback)
+
+
+def _notify(event_name, value=None):
+    for callback in _observers:
+        callback(event_name, value)
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_url):
+    """SQLAlchemy engine options for the given database URL"""
+    options = {
+        # Test each connection before use; replaces it if the server closed it
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+        # Recycle before server/proxy idle timeouts kill the connection
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 280)),
+    }
+    if database_url.startswith('sqlite') and (':memory:' in database_url or database_url.rstrip('/') == 'sqlite:'):
+        # In-memory SQLite lives in a single connection; keep SQLAlchemy's default pool
+        return options
+    options.update({
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_use_lifo': True,  # lets idle extras age out via pool_recycle
+    })
+    return options
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # recreate() copies listeners over, so only attach them once
+        for name, fn in (('connect', _on_connect), ('checkin', _on_checkin), ('invalidate', _on_invalidate)):
+            if not event.contains(self, name, fn):
+                event.listen(self, name, fn)
+        with _lock:
+            _pools.add(self)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            with _lock:
+                _counters['timeouts'] += 1
+            _notify('timeout')
+            raise
+        wait_ms = (time.perf_counter() - start) * 1000
+        overflow = max(self.overflow(), 0)
+        with _lock:
+            _counters['checkouts'] += 1
+            _counters['wait_ms_total'] += wait_ms
+            if wait_ms > _counters['wait_ms_max']:
+                _counters['wait_ms_max'] = wait_ms
+            if wait_ms >= STALL_THRESHOLD_MS:
+                _counters['stalls'] += 1
+            if overflow > _counters['overflow_max']:
+                _counters['overflow_max'] = overflow
+        _notify('checkout', wait_ms)
+        return conn
+
+
+def _on_connect(dbapi_connection, connection_record):
+    with _lock:
+        _counters['connects'] += 1
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    with _lock:
+        _counters['checkins'] += 1
+    _notify('checkin')
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    with _lock:
+        _counters['invalidations'] += 1
+    _notify('invalidate')
+
+
+def pool_stats():
+    """Snapshot of pool counters and the current state of each pool"""
+    with _lock:
+        stats = dict(_counters)
+        pools = list(_pools)
+    checkouts = stats['checkouts']
+    stats['wait_ms_avg'] = round(stats['wait_ms_total'] / checkouts, 3) if checkouts else 0.0
+    stats['wait_ms_total'] = round(stats['wait_ms_total'], 3)
+    stats['wait_ms_max'] = round(stats['wait_ms_max'], 3)
+    stats['pools'] = [{
+        'size': p.size(),
+        'checked_out': p.checkedout(),
+        'checked_in': p.checkedin(),
+        'overflow': max(p.overflow(), 0),
+    } for p in pools]
+    return stats
+
+
+def reset_pool_stats():
+    """Zero the counters (used by tests and load runs)"""
+    with _lock:
+        for key in _counters:
+            _counters[key] = 0.0 if isinstance(_counters[key], float) else 0
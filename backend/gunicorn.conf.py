@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for SMS Guard
+
+    gunicorn -c backend/gunicorn.conf.py 'backend.app:create_app()'
+
+Points prometheus_client at a shared directory so GET /metrics on any
+worker reports the sum over all workers, and cleans up after workers
+that exit.
+"""
+
+import os
+import shutil
+import tempfile
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+# Must be set before any worker imports prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'smsguard_prometheus'))
+
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be summed in
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Online learning job for user feedback.
+
+Feedback rows (POST /api/feedback) that have not been learned yet are:
+  1. read together with their message text,
+  2. applied with partial_fit to the live online snapshot
+     (MultinomialNB and the SGD member, see ml_model/online_learning.py),
+  3. marked with the new snapshot version once it is published.
+
+Serving workers with MODEL_ONLINE_UPDATES=true pick the new snapshot up
+without a restart. A snapshot that loses more than --max-f1-drop test F1
+against the bootstrap snapshot is not published. Its feedback is marked
+with the rejected version and left out of later runs, which would only
+rebuild the same snapshot. After review, put it back in the queue or
+delete it:
+    python -m backend.learn_from_feedback --requeue-rejected [VERSION]
+    python -m backend.learn_from_feedback --discard-rejected [VERSION]
+
+Schedule it (cron, Render/Fly scheduled machine) or keep it running:
+    python -m backend.learn_from_feedback --min-feedback 20
+    python -m backend.learn_from_feedback --every 600
+    python -m backend.learn_from_feedback --bootstrap
+"""
+
+import argparse
+import os
+import time
+
+from backend.app import create_app
+from backend.models import db, PredictionFeedback
+from backend.ml_model import online_learning
+
+
+def pending_feedback(limit=None):
+    query = PredictionFeedback.query.filter(PredictionFeedback.learned_version.is_(None),
+                                            PredictionFeedback.rejected_version.is_(None))\
+        .order_by(PredictionFeedback.updated_at, PredictionFeedback.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def run(min_feedback=1, max_feedback=5000, feedback_weight=5.0, max_f1_drop=0.01):
+    """Learn pending feedback into a new snapshot; returns the version or None"""
+    rows = pending_feedback(max_feedback)
+    if len(rows) < min_feedback:
+        print(f"Only {len(rows)} pending feedback row(s); waiting for {min_feedback}.")
+        return None
+
+    texts = [row.message_ref.text for row in rows]
+    labels = [1 if row.label == 'spam' else 0 for row in rows]
+    print(f"🔄 Learning {len(rows)} feedback row(s) "
+          f"({sum(1 for r in rows if r.label != r.predicted)} corrections)")
+    version, manifest = online_learning.learn(texts, labels, feedback_weight, max_f1_drop)
+
+    ids = [row.id for row in rows]
+    column = PredictionFeedback.learned_version if version else PredictionFeedback.rejected_version
+    try:
+        PredictionFeedback.query.filter(PredictionFeedback.id.in_(ids))\
+            .update({column: version or manifest['version']}, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if version is None:
+        print(f"  {len(ids)} row(s) set aside as rejected_version {manifest['version']}; "
+              f"review them, then --requeue-rejected or --discard-rejected.")
+        return None
+    for name, metrics in manifest['metrics'].items():
+        print(f"  {name}: f1 {metrics['f1']:.4f}, accuracy {metrics['accuracy']:.4f}")
+    return version
+
+
+def _rejected(version=None):
+    query = PredictionFeedback.query.filter(PredictionFeedback.rejected_version.isnot(None))
+    if version:
+        query = query.filter(PredictionFeedback.rejected_version == version)
+    return query
+
+
+def requeue_rejected(version=None):
+    """Make rejected feedback (of one snapshot version, or all) pending again; returns the row count"""
+    try:
+        count = _rejected(version).update({PredictionFeedback.rejected_version: None},
+                                          synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    print(f"🔁 Re-queued {count} rejected feedback row(s).")
+    return count
+
+
+def discard_rejected(version=None):
+    """Delete rejected feedback (of one snapshot version, or all); returns the row count"""
+    try:
+        count = _rejected(version).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    print(f"🗑️ Discarded {count} rejected feedback row(s).")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--min-feedback', type=int, default=int(os.environ.get('FEEDBACK_MIN_BATCH', 1)),
+                        help='do nothing until this many rows are pending')
+    parser.add_argument('--max-feedback', type=int, default=5000, help='rows learned per snapshot')
+    parser.add_argument('--feedback-weight', type=float, default=5.0,
+                        help='sample weight of a feedback row relative to a training row')
+    parser.add_argument('--max-f1-drop', type=float, default=0.01,
+                        help='reject snapshots that lose more test F1 than this')
+    parser.add_argument('--every', type=float, default=None, help='repeat every N seconds')
+    parser.add_argument('--bootstrap', action='store_true',
+                        help='publish a fresh snapshot from the current bundle and exit')
+    parser.add_argument('--requeue-rejected', nargs='?', const='', default=None, metavar='VERSION',
+                        help='make feedback of a rejected snapshot (default: all) pending again and exit')
+    parser.add_argument('--discard-rejected', nargs='?', const='', default=None, metavar='VERSION',
+                        help='delete feedback of a rejected snapshot (default: all) and exit')
+    args = parser.parse_args()
+
+    if args.bootstrap:
+        online_learning.bootstrap()
+    elif args.requeue_rejected is not None or args.discard_rejected is not None:
+        app = create_app()
+        with app.app_context():
+            if args.requeue_rejected is not None:
+                requeue_rejected(args.requeue_rejected or None)
+            else:
+                discard_rejected(args.discard_rejected or None)
+    else:
+        app = create_app()
+        with app.app_context():
+            while True:
+                run(args.min_feedback, args.max_feedback, args.feedback_weight, args.max_f1_drop)
+                if not args.every:
+                    break
+                db.session.remove()
+                time.sleep(args.every)
@@ -0,0 +1,197 @@
+"""
+Prometheus metrics for the Flask backend (GET /metrics)
+
+Exposes request counts and latency per route, per-model inference and
+pipeline stage latency, cache hit/miss counts, DB pool activity and
+process RSS.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (backend/gunicorn.conf.py
+does this) so every worker writes its samples to a shared directory and
+any worker can serve the aggregate. Recording a sample is a few
+memory-mapped writes per request. Without prometheus_client installed,
+/metrics falls back to this worker's own counters in the same text
+format.
+"""
+
+import os
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+try:
+    from backend import db_pool, stage_timing
+except ImportError:
+    import db_pool
+    import stage_timing
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+MULTIPROCESS = PROMETHEUS_AVAILABLE and bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MODEL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+RSS_REFRESH_SECONDS = 5
+
+if PROMETHEUS_AVAILABLE:
+    HTTP_REQUESTS = Counter('smsguard_http_requests_total', 'HTTP requests',
+                            ['route', 'method', 'status'])
+    HTTP_LATENCY = Histogram('smsguard_http_request_duration_seconds', 'HTTP request latency',
+                             ['route', 'method'], buckets=LATENCY_BUCKETS)
+    MODEL_LATENCY = Histogram('smsguard_model_inference_seconds', 'Per-model inference time',
+                              ['model'], buckets=MODEL_BUCKETS)
+    STAGE_LATENCY = Histogram('smsguard_pipeline_stage_seconds', 'Prediction pipeline stage time',
+                              ['stage'], buckets=LATENCY_BUCKETS)
+    CACHE_REQUESTS = Counter('smsguard_cache_requests_total', 'Cache lookups',
+                             ['cache', 'result'])
+    DB_POOL_CHECKOUTS = Counter('smsguard_db_pool_checkouts_total', 'DB pool checkouts')
+    DB_POOL_WAIT = Histogram('smsguard_db_pool_wait_seconds', 'Time waiting for a DB connection',
+                             buckets=LATENCY_BUCKETS)
+    DB_POOL_EVENTS = Counter('smsguard_db_pool_events_total', 'DB pool timeouts and invalidations',
+                             ['event'])
+    DB_POOL_CHECKED_OUT = Gauge('smsguard_db_pool_checked_out', 'Connections currently checked out',
+                                multiprocess_mode='livesum')
+    PROCESS_RSS = Gauge('smsguard_process_resident_memory_bytes', 'Worker resident set size',
+                        multiprocess_mode='all')
+
+_lock = threading.Lock()
+_fallback_requests = {}  # (route, method, status) -> count
+_fallback_cache = {}     # (cache, result) -> count
+_rss_updated = 0.0
+
+
+def rss_bytes():
+    """Resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is peak, in KiB on Linux; best available elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup (cache name, hit or miss)"""
+    result = 'hit' if hit else 'miss'
+    if has_request_context():
+        # Per-request tally for the slow-request log
+        counts = g.setdefault('cache_results', {})
+        key = f"{cache}:{result}"
+        counts[key] = counts.get(key, 0) + 1
+    if PROMETHEUS_AVAILABLE:
+        CACHE_REQUESTS.labels(cache, result).inc()
+    else:
+        with _lock:
+            _fallback_cache[(cache, result)] = _fallback_cache.get((cache, result), 0) + 1
+
+
+def _on_pool_event(event_name, value):
+    if event_name == 'checkout':
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_WAIT.observe(value / 1000.0)
+        DB_POOL_CHECKED_OUT.inc()
+    elif event_name == 'checkin':
+        DB_POOL_CHECKED_OUT.dec()
+    else:
+        DB_POOL_EVENTS.labels(event_name).inc()
+
+
+def _update_rss(force=False):
+    global _rss_updated
+    now = time.monotonic()
+    if force or now - _rss_updated >= RSS_REFRESH_SECONDS:
+        _rss_updated = now
+        PROCESS_RSS.set(rss_bytes())
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None or request.path == '/metrics':
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if PROMETHEUS_AVAILABLE:
+        HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        HTTP_LATENCY.labels(route, request.method).observe(elapsed)
+        timer = g.get('stage_timer')
+        if timer is not None:
+            for name, ns in timer.stages.items():
+                if name.startswith('model:'):
+                    MODEL_LATENCY.labels(name[len('model:'):]).observe(ns / 1e9)
+                elif not name.startswith('weighted:model:'):
+                    STAGE_LATENCY.labels(name).observe(ns / 1e9)
+        _update_rss()
+    else:
+        key = (route, request.method, str(response.status_code))
+        with _lock:
+            _fallback_requests[key] = _fallback_requests.get(key, 0) + 1
+        stage_timing.observe_value('http:' + route, elapsed * 1000)
+    return response
+
+
+def _render_fallback():
+    """Prometheus text format from this process's own counters"""
+    lines = ['# TYPE smsguard_http_requests_total counter']
+    with _lock:
+        requests_ = dict(_fallback_requests)
+        cache = dict(_fallback_cache)
+    for (route, method, status), count in sorted(requests_.items()):
+        lines.append(f'smsguard_http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+    lines.append('# TYPE smsguard_cache_requests_total counter')
+    for (name, result), count in sorted(cache.items()):
+        lines.append(f'smsguard_cache_requests_total{{cache="{name}",result="{result}"}} {count}')
+    lines.append('# TYPE smsguard_stage_latency_ms summary')
+    for stage, snap in sorted(stage_timing.histograms().items()):
+        for quantile, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('0.99', 'p99_ms')):
+            if snap[key] is not None:
+                lines.append(f'smsguard_stage_latency_ms{{stage="{stage}",quantile="{quantile}"}} {snap[key]}')
+        lines.append(f'smsguard_stage_latency_ms_sum{{stage="{stage}"}} {snap["sum_ms"]}')
+        lines.append(f'smsguard_stage_latency_ms_count{{stage="{stage}"}} {snap["count"]}')
+    stats = db_pool.pool_stats()
+    lines.append('# TYPE smsguard_db_pool_checkouts_total counter')
+    lines.append(f'smsguard_db_pool_checkouts_total {stats["checkouts"]}')
+    lines.append(f'smsguard_db_pool_timeouts_total {stats["timeouts"]}')
+    lines.append(f'smsguard_db_pool_wait_ms_max {stats["wait_ms_max"]}')
+    lines.append(f'smsguard_db_pool_checked_out {sum(p["checked_out"] for p in stats["pools"])}')
+    lines.append('# TYPE smsguard_process_resident_memory_bytes gauge')
+    lines.append(f'smsguard_process_resident_memory_bytes {rss_bytes()}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('unauthorized\n', status=401, mimetype='text/plain')
+    if not PROMETHEUS_AVAILABLE:
+        return Response(_render_fallback(), mimetype=CONTENT_TYPE_LATEST)
+    _update_rss(force=True)
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Register request hooks, pool observers and the /metrics route"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if PROMETHEUS_AVAILABLE and _on_pool_event not in db_pool._observers:
+        db_pool.add_observer(_on_pool_event)
+
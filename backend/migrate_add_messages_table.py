@@ -0,0 +1,69 @@
+"""
+Migration script to move SMS text out of the predictions table into the
+deduplicated messages table (one row per distinct body, keyed by sha256).
+Run this ONCE on your backend (locally or on Render) before deploying the
+code that writes predictions.message_hash.
+
+Usage:
+    python -m backend.migrate_add_messages_table [--batch-size 500]
+"""
+import argparse
+from sqlalchemy import text
+from backend.models import db, Message, Prediction
+from backend.app import create_app
+
+def add_message_hash_column():
+    """Add predictions.message_hash if it doesn't exist"""
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE predictions ADD COLUMN message_hash VARCHAR(64)'))
+        print("✅ Added message_hash column to predictions table.")
+    except Exception as e:
+        msg = str(e)
+        if "duplicate" in msg or "exists" in msg:
+            print("Column message_hash already exists, skipping.")
+        else:
+            raise
+    with db.engine.begin() as conn:
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_predictions_message_hash ON predictions (message_hash)'))
+
+def backfill(batch_size=500):
+    """Link existing predictions to messages rows and clear their inline text"""
+    moved = 0
+    while True:
+        rows = Prediction.query.filter(Prediction.message_hash.is_(None))\
+            .filter(Prediction.message != '')\
+            .order_by(Prediction.timestamp)\
+            .limit(batch_size)\
+            .all()
+        if not rows:
+            break
+        for p in rows:
+            message = Message.get_or_create(p.message)
+            if not message.seen_count:
+                message.first_seen = p.timestamp
+            # Rows are visited oldest first, so the last one seen wins
+            message.record_verdict(p.prediction, p.confidence, p.model_version)
+            message.last_seen = p.timestamp
+            p.message_hash = message.content_hash
+            p.message = ''
+        db.session.commit()
+        moved += len(rows)
+        print(f"  moved {moved} predictions...")
+    return moved
+
+def migrate(batch_size=500):
+    app = create_app()
+    with app.app_context():
+        Message.__table__.create(db.engine, checkfirst=True)
+        print("✅ messages table ready.")
+        add_message_hash_column()
+        moved = backfill(batch_size)
+        distinct = Message.query.count()
+        print(f"✅ Migration complete: {moved} predictions now reference {distinct} distinct messages.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    migrate(args.batch_size)
@@ -0,0 +1,87 @@
+"""
+Spam campaign clustering on the serving vectorizer
+
+Spam messages are clustered with MiniBatchKMeans on the serving bundle's
+TF-IDF (or hashed) features. partial_fit folds in each new batch without
+refitting what came before, so the job (backend/cluster_campaigns.py)
+only ever touches new predictions. Each cluster also keeps counts of the
+stems it has seen, for a label readable on the dashboard. Tokens
+containing digits are counted as one placeholder and never shown, so
+phone numbers and codes do not end up in the labels.
+
+The state is keyed by a generation, the vectorizer's vocabulary hash. The
+job stores it (dumps/loads) in the database row campaign_models, in the
+same transaction as the campaign rows it produced, so it survives
+redeploys on ephemeral disks and never drifts from those rows. A bundle
+with a different vocabulary cannot extend these clusters, so it starts a
+new generation.
+"""
+
+import io
+import os
+from collections import Counter
+
+import joblib
+import numpy as np
+
+try:
+    from backend.ml_model.distill_student import vocabulary_hash
+    from backend.ml_model.near_duplicates import NUMBER_TOKEN
+except ImportError:
+    from distill_student import vocabulary_hash
+    from near_duplicates import NUMBER_TOKEN
+
+N_CLUSTERS = int(os.environ.get("CAMPAIGN_CLUSTERS", 50))
+TOP_TERMS = 8
+# Stems kept per cluster for top_terms; the rarest are dropped beyond this
+MAX_TERMS = 500
+
+
+def generation(vectorizer):
+    return vocabulary_hash(vectorizer)
+
+
+class CampaignModel:
+    """MiniBatchKMeans over spam messages plus per-cluster stem counts"""
+
+    def __init__(self, generation, n_clusters=N_CLUSTERS, seed=42):
+        from sklearn.cluster import MiniBatchKMeans
+        self.generation = generation
+        self.n_clusters = n_clusters
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3)
+        self.term_counts = [Counter() for _ in range(n_clusters)]
+        self.samples = 0
+
+    @property
+    def fitted(self):
+        return hasattr(self.kmeans, "cluster_centers_")
+
+    def partial_fit(self, X, weights=None):
+        """Fold a batch of feature rows in (the first batch needs at least n_clusters rows)"""
+        self.kmeans.partial_fit(X, sample_weight=weights)
+        self.samples += X.shape[0]
+
+    def assign(self, X, clean_texts):
+        """(labels, distances) of rows, counting their stems towards their clusters"""
+        distances = self.kmeans.transform(X)
+        labels = distances.argmin(axis=1)
+        for label, text in zip(labels, clean_texts):
+            counts = self.term_counts[label]
+            counts.update(NUMBER_TOKEN if any(ch.isdigit() for ch in t) else t for t in text.split())
+            if len(counts) > 2 * MAX_TERMS:
+                self.term_counts[label] = Counter(dict(counts.most_common(MAX_TERMS)))
+        return labels, distances[np.arange(len(labels)), labels]
+
+    def top_terms(self, label, n=TOP_TERMS):
+        return [term for term, _ in self.term_counts[label].most_common(n + 1) if term != NUMBER_TOKEN][:n]
+
+
+def dumps(model):
+    """Compressed pickle of the model, for the campaign_models row"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer, compress=3)
+    return buffer.getvalue()
+
+
+def loads(data):
+    return joblib.load(io.BytesIO(data))
@@ -0,0 +1,323 @@
+"""
+Distilled student model
+
+Trains one logistic regression on the bundle's TF-IDF features to
+reproduce the consensus's F1-weighted spam probability (the teacher, as in
+predict_weighted_consensus). The teacher labels spam.csv plus augmented
+copies of it (word dropout, adjacent swaps, rewritten digits), and the
+student is fit on those soft labels.
+
+It then picks the uncertainty band: the smallest margin around 0.5 inside
+which the student disagrees with the teacher too often on a calibration
+slice of the training split. With MODEL_SERVING_MODE=student,
+predict_consensus_batch answers from the student alone and only sends
+messages whose student probability falls inside the band to the full
+ensemble.
+
+Writes models/student.pkl and models/student_report.json (agreement with
+the teacher on the held-out split, band coverage, latency).
+save_all_models.py runs it after training; to re-distill an existing
+bundle:
+
+    python -m backend.ml_model.distill_student
+    python -m backend.ml_model.distill_student --copies 4 --target-agreement 0.999
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+try:
+    from backend.ml_model import spam_detector_multi as smd
+except ImportError:
+    import spam_detector_multi as smd
+
+STUDENT_FILE = os.path.join(smd.MODEL_DIR, "student.pkl")
+REPORT_FILE = os.path.join(smd.MODEL_DIR, "student_report.json")
+STUDENT_NAME = "Student"
+# Share of the training split held back to pick the uncertainty band
+CALIBRATION_SIZE = 0.15
+
+
+def vocabulary_hash(vectorizer):
+    """Fingerprint of the vectorizer's vocabulary; a student only serves with the vectorizer it was fit on"""
+    if hasattr(vectorizer, 'fingerprint'):
+        # HashedTfidfVectorizer has no vocabulary; its columns are fixed by parameters and idf
+        return vectorizer.fingerprint()[:16]
+    items = sorted((term, int(i)) for term, i in vectorizer.vocabulary_.items())
+    return hashlib.sha256(json.dumps(items).encode()).hexdigest()[:16]
+
+
+def spam_probability(model, X):
+    """Same confidence the serving path uses"""
+    if hasattr(model, "predict_proba"):
+        return model.predict_proba(X)[:, 1]
+    df = model.decision_function(X)
+    return np.clip(1 / (1 + np.exp(-df)), 0.01, 0.99)
+
+
+def teacher_outputs(members, weights, X):
+    """(weighted spam probability, majority vote) of the consensus for every row of X"""
+    probs = np.vstack([spam_probability(members[n], X) for n in members])
+    votes = np.vstack([members[n].predict(X).astype(int) for n in members])
+    w = np.asarray([weights[n] for n in members])[:, None]
+    weighted = (probs * w).sum(axis=0) / w.sum()
+    # Ties go to the first member, as Counter.most_common in _aggregate_votes
+    spam = votes.sum(axis=0)
+    ham = votes.shape[0] - spam
+    majority = np.where(spam > ham, 1, np.where(ham > spam, 0, votes[0]))
+    return weighted, majority
+
+
+# --- Augmentation (on raw text, before transform_text) ---
+
+def _drop_words(words, rng, rate=0.15):
+    kept = [w for w in words if rng.random() >= rate]
+    return kept or words
+
+
+def _swap_adjacent(words, rng):
+    words = list(words)
+    if len(words) > 1:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    return words
+
+
+def _rewrite_digits(text, rng):
+    # New phone numbers, short codes and prices keep their length
+    return re.sub(r'\d', lambda m: str(rng.randrange(10)), text)
+
+
+def augment(texts, copies=2, seed=42):
+    """copies perturbed variants of each text; returns (augmented texts, index of the source text)"""
+    rng = random.Random(seed)
+    out, source = [], []
+    for _ in range(copies):
+        for i, text in enumerate(texts):
+            words = text.split()
+            words = _drop_words(words, rng)
+            if rng.random() < 0.5:
+                words = _swap_adjacent(words, rng)
+            variant = ' '.join(words)
+            if rng.random() < 0.5:
+                variant = _rewrite_digits(variant, rng)
+            out.append(variant)
+            source.append(i)
+    return out, np.asarray(source, dtype=int)
+
+
+# --- Student ---
+
+def fit_student(X, soft_labels, C=10.0):
+    """
+    Logistic regression on soft labels
+
+    Each row appears once as spam with weight p and once as ham with
+    weight 1 - p, which minimises cross-entropy against the teacher's
+    probability.
+    """
+    from scipy.sparse import vstack
+    from sklearn.linear_model import LogisticRegression
+    n = X.shape[0]
+    X2 = vstack([X, X]).tocsr()
+    y2 = np.concatenate([np.ones(n, dtype=int), np.zeros(n, dtype=int)])
+    w2 = np.concatenate([soft_labels, 1 - soft_labels])
+    keep = w2 > 0
+    student = LogisticRegression(C=C, solver='liblinear', max_iter=1000)
+    student.fit(X2[keep], y2[keep], sample_weight=w2[keep])
+    return student
+
+
+def choose_band(student_prob, teacher_label, target_agreement=0.995, step=0.01):
+    """
+    Smallest margin m such that the student agrees with the teacher on at
+    least target_agreement of the rows with |p - 0.5| >= m
+    """
+    margin = 0.0
+    while margin < 0.5:
+        confident = np.abs(student_prob - 0.5) >= margin
+        if not confident.any():
+            break
+        agreement = float(((student_prob[confident] >= 0.5) == teacher_label[confident]).mean())
+        if agreement >= target_agreement:
+            return round(margin, 4)
+        margin += step
+    return 0.5
+
+
+def agreement_report(student_prob, teacher_prob, teacher_majority, y_true, low, high):
+    from sklearn.metrics import accuracy_score, f1_score
+    student_label = (student_prob >= 0.5).astype(int)
+    teacher_label = (teacher_prob >= 0.5).astype(int)
+    confident = (student_prob <= low) | (student_prob >= high)
+    # What serving returns: student where confident, ensemble majority elsewhere
+    served = np.where(confident, student_label, teacher_majority)
+    return {
+        'rows': int(len(student_prob)),
+        'agreement_weighted': float((student_label == teacher_label).mean()),
+        'agreement_majority': float((student_label == teacher_majority).mean()),
+        'probability_mae': float(np.abs(student_prob - teacher_prob).mean()),
+        'confident_share': float(confident.mean()),
+        'confident_agreement_majority': float((student_label[confident] == teacher_majority[confident]).mean())
+        if confident.any() else None,
+        'served_agreement_majority': float((served == teacher_majority).mean()),
+        'student': {'accuracy': float(accuracy_score(y_true, student_label)), 'f1': float(f1_score(y_true, student_label))},
+        'teacher_majority': {'accuracy': float(accuracy_score(y_true, teacher_majority)),
+                             'f1': float(f1_score(y_true, teacher_majority))},
+        'served': {'accuracy': float(accuracy_score(y_true, served)), 'f1': float(f1_score(y_true, served))},
+    }
+
+
+def _latency_ms(fn, X, samples=200):
+    """Mean single-message scoring time in ms"""
+    rows = [X[i] for i in range(min(samples, X.shape[0]))]
+    fn(rows[0])
+    start = time.perf_counter()
+    for row in rows:
+        fn(row)
+    return (time.perf_counter() - start) * 1000 / len(rows)
+
+
+def distill(vectorizer, members, weights, texts, y, copies=2, seed=42, C=10.0, target_agreement=0.995,
+            transformed=None):
+    """
+    Train a student on the consensus of `members`
+
+    texts are the raw messages of spam.csv and y their labels; the split
+    matches the one the metrics and select_members use. transformed, if
+    given, is transform_text of each text (e.g. from feature_cache), so
+    only the augmented copies are preprocessed. Returns (student bundle,
+    report).
+    """
+    from scipy.sparse import vstack
+    from sklearn.model_selection import train_test_split
+    texts = list(texts)
+    y = np.asarray(y)
+    train_idx, test_idx = train_test_split(
+        np.arange(len(texts)), test_size=0.2, stratify=y, random_state=42
+    )
+    fit_idx, calib_idx = train_test_split(
+        train_idx, test_size=CALIBRATION_SIZE, stratify=y[train_idx], random_state=seed
+    )
+
+    def features(raw):
+        return vectorizer.transform([smd.transform_text(t) for t in raw])
+
+    def original_features(idx):
+        if transformed is None:
+            return features([texts[i] for i in idx])
+        return vectorizer.transform([transformed[i] for i in idx])
+
+    print(f"🧪 Labelling {len(fit_idx)} messages and {copies} augmented copies with {len(members)} teachers...")
+    fit_texts = [texts[i] for i in fit_idx]
+    aug_texts, _ = augment(fit_texts, copies, seed)
+    X_fit = vstack([original_features(fit_idx), features(aug_texts)]).tocsr()
+    soft, _ = teacher_outputs(members, weights, X_fit)
+
+    print(f"🎓 Fitting student on {X_fit.shape[0]} rows...")
+    student = fit_student(X_fit, soft, C)
+
+    # Band from the calibration slice and its augmentations (unseen by the student)
+    calib_texts = [texts[i] for i in calib_idx]
+    calib_aug, _ = augment(calib_texts, copies, seed + 1)
+    X_calib = vstack([original_features(calib_idx), features(calib_aug)]).tocsr()
+    _, calib_majority = teacher_outputs(members, weights, X_calib)
+    margin = choose_band(student.predict_proba(X_calib)[:, 1], calib_majority, target_agreement)
+    low, high = 0.5 - margin, 0.5 + margin
+
+    X_test = original_features(test_idx)
+    teacher_prob, teacher_majority = teacher_outputs(members, weights, X_test)
+    student_prob = student.predict_proba(X_test)[:, 1]
+    test_aug, source = augment([texts[i] for i in test_idx], 1, seed + 2)
+    X_test_aug = features(test_aug)
+    aug_teacher_prob, aug_teacher_majority = teacher_outputs(members, weights, X_test_aug)
+
+    teacher_latency = sum(_latency_ms(lambda row, m=m: (m.predict(row), spam_probability(m, row)), X_test)
+                          for m in members.values())
+    report = {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'teachers': list(members),
+        'weights': {n: weights[n] for n in members},
+        'copies': copies,
+        'seed': seed,
+        'C': C,
+        'training_rows': int(X_fit.shape[0]),
+        'nonzero_coefficients': int(np.count_nonzero(student.coef_)),
+        'target_agreement': target_agreement,
+        'uncertainty_band': [low, high],
+        'test': agreement_report(student_prob, teacher_prob, teacher_majority, y[test_idx], low, high),
+        'test_augmented': agreement_report(student.predict_proba(X_test_aug)[:, 1], aug_teacher_prob,
+                                           aug_teacher_majority, y[test_idx][source], low, high),
+        'latency_ms': {
+            'student': round(_latency_ms(lambda row: student.predict_proba(row), X_test), 4),
+            'teacher': round(teacher_latency, 4),
+        },
+    }
+    bundle = {
+        'model': student,
+        'low': low,
+        'high': high,
+        'teachers': list(members),
+        'vocabulary_hash': vocabulary_hash(vectorizer),
+        'generated_at': report['generated_at'],
+    }
+    return bundle, report
+
+
+def save(bundle, report, student_path=STUDENT_FILE, report_path=REPORT_FILE):
+    joblib.dump(bundle, student_path)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Student saved to {student_path}, report to {report_path}")
+
+
+def print_report(report):
+    test = report['test']
+    low, high = report['uncertainty_band']
+    print(f"\n🎓 Student vs consensus on {test['rows']} held-out messages")
+    print(f"  Agreement (weighted probability): {test['agreement_weighted']:.4f}")
+    print(f"  Agreement (majority vote):        {test['agreement_majority']:.4f}")
+    print(f"  Probability MAE:                  {test['probability_mae']:.4f}")
+    print(f"  Uncertainty band:                 {low:.2f} < p < {high:.2f}")
+    print(f"  Answered by the student:          {test['confident_share']:.1%}")
+    print(f"  Served vs majority vote:          {test['served_agreement_majority']:.4f}")
+    print(f"  Accuracy student / served / teacher: {test['student']['accuracy']:.4f} / "
+          f"{test['served']['accuracy']:.4f} / {test['teacher_majority']['accuracy']:.4f}")
+    print(f"  Augmented agreement (majority):   {report['test_augmented']['agreement_majority']:.4f}")
+    latency = report['latency_ms']
+    print(f"  Latency per message: student {latency['student']:.3f} ms, teacher {latency['teacher']:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distil the serving consensus into one fast student model')
+    parser.add_argument('--copies', type=int, default=2, help='Augmented copies per training message (default: 2)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--C', type=float, default=10.0, help='Inverse regularisation strength (default: 10)')
+    parser.add_argument('--target-agreement', type=float, default=0.995,
+                        help='Agreement with the consensus required outside the uncertainty band (default: 0.995)')
+    parser.add_argument('--dry-run', action='store_true', help='Report only; do not write student.pkl')
+    args = parser.parse_args()
+
+    smd.evaluate_missing_metrics()
+    members = {name: r["model"] for name, r in smd.model_results.items()}
+    weights = {name: r.get("f1", 1.0) for name, r in smd.model_results.items()}
+    df = smd._load_dataset()
+    bundle, report = distill(smd.tfidf, members, weights, df['text'].values, df['target'].values,
+                             args.copies, args.seed, args.C, args.target_agreement,
+                             transformed=df['transformed_text'].values)
+    print_report(report)
+    if not args.dry_run:
+        save(bundle, report)
+
+
+if __name__ == '__main__':
+    main()
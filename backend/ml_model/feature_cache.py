@@ -0,0 +1,235 @@
+"""
+Preprocessing and feature cache for training runs
+
+transform_text over all of spam.csv and the TF-IDF fit are the same in
+every training run. This caches both on disk under FEATURE_CACHE_DIR:
+
+    <cache>/<dataset sha>-<preprocessing key>/corpus.json
+        raw text, transform_text output and labels
+    <cache>/<dataset sha>-<preprocessing key>/tfidf-<params key>/matrix.npz
+        the TF-IDF matrix of the whole corpus (scipy CSR)
+    <cache>/<dataset sha>-<preprocessing key>/tfidf-<params key>/vocabulary.json
+        vocabulary, idf weights and vectorizer parameters
+
+The preprocessing key covers PREPROCESSING_VERSION, the bundled stopword
+list and Punkt model, and the NLTK version, so editing transform_text
+(bump PREPROCESSING_VERSION), the NLTK data or spam.csv starts a new
+entry. Vectorizers are rebuilt from the vocabulary and idf instead of
+being unpickled. FEATURE_CACHE=false bypasses the cache.
+
+    python -m backend.ml_model.feature_cache           # warm the cache for the default vectorizer
+    python -m backend.ml_model.feature_cache --info
+    python -m backend.ml_model.feature_cache --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+try:
+    from backend.ml_model import nltk_resources
+    from backend.ml_model import spam_detector_multi as smd
+except ImportError:
+    import nltk_resources
+    import spam_detector_multi as smd
+
+CACHE_DIR = os.environ.get("FEATURE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache"))
+# Bump when transform_text changes its output
+PREPROCESSING_VERSION = 1
+# Vectorizer used by save_all_models.py and the serving bundle
+DEFAULT_TFIDF = {'max_features': 4000, 'ngram_range': (1, 2)}
+
+
+def enabled():
+    return os.environ.get("FEATURE_CACHE", "true").lower() == "true"
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dataset_hash(path=None):
+    return _sha256_file(path or smd.DATA_PATH)
+
+
+def preprocessing_key():
+    """Changes whenever transform_text could give different output"""
+    import nltk
+    parts = [str(PREPROCESSING_VERSION), nltk.__version__, _sha256_file(nltk_resources.STOPWORDS_FILE)]
+    parts.append(_sha256_file(nltk_resources.PUNKT_FILE) if nltk_resources.has_vendored_punkt() else 'no-punkt')
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:12]
+
+
+def corpus_dir(path=None, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, f"{dataset_hash(path)[:16]}-{preprocessing_key()}")
+
+
+def _tfidf_params(max_features, ngram_range):
+    return {'max_features': max_features, 'ngram_range': list(ngram_range)}
+
+
+def _params_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _write_dir_atomically(target, write):
+    """Call write(tmp_dir) and move the result into place; concurrent writers keep the first result"""
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        write(tmp)
+        os.rename(tmp, target)
+    except OSError:
+        if not os.path.isdir(target):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _read_csv(path):
+    import pandas as pd
+    df = pd.read_csv(path, encoding='latin-1')
+    df = df.rename(columns={'v1': 'target', 'v2': 'text'})
+    df = df[['target', 'text']].dropna()
+    df['target'] = df['target'].map({'ham': 0, 'spam': 1})
+    return df.reset_index(drop=True)
+
+
+def load_corpus(path=None, cache_dir=None):
+    """spam.csv as a DataFrame with text, target and transformed_text columns"""
+    import pandas as pd
+    path = path or smd.DATA_PATH
+    if not enabled():
+        df = _read_csv(path)
+        df['transformed_text'] = df['text'].apply(smd.transform_text)
+        return df
+
+    directory = corpus_dir(path, cache_dir)
+    corpus_file = os.path.join(directory, 'corpus.json')
+    if os.path.exists(corpus_file):
+        with open(corpus_file, encoding='utf-8') as f:
+            return pd.DataFrame(json.load(f))
+
+    print(f"🗂️  Preprocessing {os.path.basename(path)} (cached in {directory})")
+    df = _read_csv(path)
+    df['transformed_text'] = df['text'].apply(smd.transform_text)
+    corpus = {
+        'text': df['text'].tolist(),
+        'target': [int(t) for t in df['target']],
+        'transformed_text': df['transformed_text'].tolist(),
+    }
+
+    def write(tmp):
+        with open(os.path.join(tmp, 'corpus.json'), 'w', encoding='utf-8') as f:
+            json.dump(corpus, f)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'dataset': os.path.abspath(path), 'dataset_sha256': dataset_hash(path),
+                       'preprocessing_version': PREPROCESSING_VERSION,
+                       'preprocessing_key': preprocessing_key(), 'rows': len(df)}, f, indent=2)
+
+    _write_dir_atomically(directory, write)
+    return df
+
+
+def _rebuild_vectorizer(meta):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vectorizer = TfidfVectorizer(max_features=meta['params']['max_features'],
+                                 ngram_range=tuple(meta['params']['ngram_range']))
+    vectorizer.vocabulary_ = {term: int(i) for term, i in meta['vocabulary'].items()}
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = np.asarray(meta['idf'], dtype=np.float64)
+    # Terms dropped by max_features; only kept for inspection, and large
+    vectorizer.stop_words_ = set()
+    return vectorizer
+
+
+def load_features(df, max_features=DEFAULT_TFIDF['max_features'], ngram_range=DEFAULT_TFIDF['ngram_range'],
+                  path=None, cache_dir=None):
+    """
+    (fitted TfidfVectorizer, CSR matrix of every row of df) for df from load_corpus
+
+    The vectorizer is fit on the whole corpus, as in save_all_models.py.
+    """
+    from scipy.sparse import load_npz, save_npz
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    params = _tfidf_params(max_features, ngram_range)
+
+    def fit():
+        vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=tuple(ngram_range))
+        return vectorizer, vectorizer.fit_transform(df['transformed_text']).tocsr()
+
+    if not enabled():
+        return fit()
+
+    directory = os.path.join(corpus_dir(path, cache_dir), f"tfidf-{_params_key(params)}")
+    matrix_file = os.path.join(directory, 'matrix.npz')
+    vocabulary_file = os.path.join(directory, 'vocabulary.json')
+    if os.path.exists(matrix_file) and os.path.exists(vocabulary_file):
+        with open(vocabulary_file, encoding='utf-8') as f:
+            meta = json.load(f)
+        X = load_npz(matrix_file).tocsr()
+        if X.shape[0] == len(df):
+            return _rebuild_vectorizer(meta), X
+
+    vectorizer, X = fit()
+    meta = {
+        'params': params,
+        'vocabulary': {term: int(i) for term, i in vectorizer.vocabulary_.items()},
+        'idf': vectorizer.idf_.tolist(),
+    }
+
+    def write(tmp):
+        save_npz(os.path.join(tmp, 'matrix.npz'), X)
+        with open(os.path.join(tmp, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    _write_dir_atomically(directory, write)
+    return vectorizer, X
+
+
+def cache_info(cache_dir=None):
+    """Entries in the cache with their size on disk"""
+    cache_dir = cache_dir or CACHE_DIR
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    for name in sorted(os.listdir(cache_dir)):
+        directory = os.path.join(cache_dir, name)
+        if name.startswith('.') or not os.path.isdir(directory):
+            continue
+        size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(directory) for f in files)
+        matrices = [d for d in os.listdir(directory) if d.startswith('tfidf-')]
+        entries.append({'entry': name, 'bytes': size, 'vectorizers': len(matrices)})
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm, inspect or clear the training feature cache')
+    parser.add_argument('--info', action='store_true', help='List cache entries')
+    parser.add_argument('--clear', action='store_true', help='Delete the whole cache')
+    args = parser.parse_args()
+
+    if args.clear:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        print(f"🧹 Cleared {CACHE_DIR}")
+        return
+    if not args.info:
+        df = load_corpus()
+        _, X = load_features(df)
+        print(f"✅ {len(df)} messages, {X.shape[1]} features cached in {corpus_dir()}")
+    for entry in cache_info():
+        print(f"{entry['entry']}  {entry['bytes'] / 1024 / 1024:.1f} MB  {entry['vectorizers']} vectorizer(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Hashed TF-IDF features (no fitted vocabulary)
+
+TfidfVectorizer keeps a term -> column dict of every unigram and bigram it
+kept (plus, pickled, the ones max_features dropped) and looks each n-gram
+up in it on every transform. HashedTfidfVectorizer hashes n-grams straight
+into n_features columns with HashingVectorizer and keeps two small arrays:
+the max_features most frequent columns (int32) and their idf weights
+(float32). The pickle is about 32 KB whatever the corpus, and loading it
+is two array reads.
+
+Term and document frequencies are counted chunk by chunk, so fit() takes
+any iterable of preprocessed messages (a generator over a file works) and
+never builds a vocabulary. With max_features=None every hashed column is
+kept, so the partial_fit members in online_learning.py can learn words
+that only show up in feedback.
+
+Weights match TfidfVectorizer's defaults: raw counts times
+ln((1 + n) / (1 + df)) + 1, then l2 normalisation. n_features is 2**18
+because collisions in smaller spaces cost LogisticRegression and
+KNeighbors a few points of F1 (see --parity).
+
+    python -m backend.ml_model.hashing_features --parity     # compare with TF-IDF on the test split
+    python -m backend.ml_model.save_all_models --vectorizer hashing
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+try:
+    from backend.ml_model import spam_detector_multi as smd
+except ImportError:
+    import spam_detector_multi as smd
+
+# max_features keeps the most frequent columns, like TfidfVectorizer's max_features
+DEFAULT_HASHING = {'n_features': 2 ** 18, 'ngram_range': (1, 2), 'max_features': 4000}
+PARITY_REPORT = os.path.join(smd.MODEL_DIR, "vectorizer_parity.json")
+# Fast members compared by --parity; --models all trains the whole bundle
+PARITY_MODELS = ["MultinomialNB", "LogisticRegression", "SVC", "KNeighbors", "DecisionTree"]
+
+
+def _chunks(texts, size):
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class HashedTfidfVectorizer:
+    """TfidfVectorizer(norm='l2', smooth_idf=True) over hashed n-gram columns"""
+
+    def __init__(self, n_features=DEFAULT_HASHING['n_features'], ngram_range=DEFAULT_HASHING['ngram_range'],
+                 max_features=DEFAULT_HASHING['max_features'], chunk_size=2000):
+        self.n_features = int(n_features)
+        self.ngram_range = tuple(ngram_range)
+        self.max_features = max_features
+        self.chunk_size = chunk_size
+        self.idf_ = None
+        self.columns_ = None
+        self.n_documents_ = 0
+        self._hasher = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_hasher'] = None
+        return state
+
+    @property
+    def hasher(self):
+        if self._hasher is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self._hasher = HashingVectorizer(n_features=self.n_features, ngram_range=self.ngram_range,
+                                             alternate_sign=False, norm=None)
+        return self._hasher
+
+    def counts(self, texts):
+        """Raw n-gram counts (CSR, one row per text)"""
+        return self.hasher.transform(texts)
+
+    def _frequencies(self, X):
+        return (np.bincount(X.indices, minlength=self.n_features),
+                np.bincount(X.indices, weights=X.data, minlength=self.n_features))
+
+    def _set_idf(self, df, tf, n_documents):
+        self.n_documents_ = int(n_documents)
+        idf = np.log((1 + n_documents) / (1 + df)) + 1
+        if self.max_features and self.max_features < self.n_features:
+            # Keep the max_features most frequent columns, renumbered 0..max_features-1,
+            # so the members see as many features as with TfidfVectorizer
+            self.columns_ = np.sort(np.argsort(-tf, kind='stable')[:self.max_features]).astype(np.int32)
+            idf = idf[self.columns_]
+        else:
+            self.columns_ = None
+        self.idf_ = idf.astype(np.float32)
+
+    def fit(self, texts):
+        """Count term and document frequencies over any iterable of preprocessed texts, chunk_size at a time"""
+        df = np.zeros(self.n_features, dtype=np.int64)
+        tf = np.zeros(self.n_features, dtype=np.float64)
+        n_documents = 0
+        for chunk in _chunks(texts, self.chunk_size):
+            X = self.counts(chunk)
+            chunk_df, chunk_tf = self._frequencies(X)
+            df += chunk_df
+            tf += chunk_tf
+            n_documents += X.shape[0]
+        self._set_idf(df, tf, n_documents)
+        return self
+
+    def fit_transform(self, texts):
+        X = self.counts(texts)
+        self._set_idf(*self._frequencies(X), X.shape[0])
+        return self._weight(X)
+
+    def transform(self, texts):
+        if self.idf_ is None:
+            raise ValueError("HashedTfidfVectorizer is not fitted")
+        return self._weight(self.counts(texts))
+
+    def _weight(self, X):
+        from sklearn.preprocessing import normalize
+        if self.columns_ is not None:
+            X = self._keep_columns(X)
+        X.data *= self.idf_[X.indices]
+        return normalize(X, norm='l2', copy=False)
+
+    def _keep_columns(self, X):
+        """X restricted to columns_ and renumbered, in O(nnz log max_features)"""
+        from scipy.sparse import csr_matrix
+        position = np.searchsorted(self.columns_, X.indices)
+        position[position == len(self.columns_)] = 0
+        kept = self.columns_[position] == X.indices
+        indptr = np.concatenate([[0], np.cumsum(kept)])[X.indptr]
+        return csr_matrix((X.data[kept], position[kept], indptr), shape=(X.shape[0], len(self.columns_)))
+
+    def feature_index(self, term):
+        """Column of a single word, or None for text that is not one token or a dropped column"""
+        X = self.counts([term])
+        if X.nnz != 1:
+            return None
+        column = int(X.indices[0])
+        if self.columns_ is None:
+            return column
+        i = int(np.searchsorted(self.columns_, column))
+        return i if i < len(self.columns_) and self.columns_[i] == column else None
+
+    def fingerprint(self):
+        """Changes whenever transform could give different columns or weights"""
+        digest = hashlib.sha256(json.dumps(['hashing', self.n_features, list(self.ngram_range),
+                                             self.max_features]).encode())
+        digest.update(self.idf_.tobytes())
+        if self.columns_ is not None:
+            digest.update(self.columns_.tobytes())
+        return digest.hexdigest()
+
+
+def vectorizer_stats(vectorizer, texts, repeats=5):
+    """Pickled size, unpickle time and per-message transform latency"""
+    blob = pickle.dumps(vectorizer, protocol=pickle.HIGHEST_PROTOCOL)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        pickle.loads(blob)
+    load_ms = (time.perf_counter() - start) / repeats * 1000
+    vectorizer.transform(texts[:10])
+    start = time.perf_counter()
+    for text in texts:
+        vectorizer.transform([text])
+    transform_ms = (time.perf_counter() - start) / len(texts) * 1000
+    return {'bytes': len(blob), 'load_ms': round(load_ms, 3), 'transform_ms': round(transform_ms, 4)}
+
+
+def parity(models=None, n_features=DEFAULT_HASHING['n_features'], ngram_range=DEFAULT_HASHING['ngram_range'],
+           max_features=DEFAULT_HASHING['max_features'], n_jobs=1):
+    """
+    Train the same members on TF-IDF and on hashed features and compare them on the test split
+
+    Both use save_all_models' split, parameters and TF-IDF settings.
+    """
+    from sklearn.model_selection import train_test_split
+    try:
+        from backend.ml_model import feature_cache, save_all_models
+    except ImportError:
+        import feature_cache
+        import save_all_models
+
+    config = save_all_models.load_training_config() or {}
+    tfidf_params = dict(feature_cache.DEFAULT_TFIDF, **config.get('tfidf', {}))
+    df = feature_cache.load_corpus()
+    texts = df['transformed_text'].values
+    y = df['target'].values
+    tfidf, X_tfidf = feature_cache.load_features(df, tfidf_params['max_features'],
+                                                 tuple(tfidf_params['ngram_range']))
+    hashed = HashedTfidfVectorizer(n_features, ngram_range, max_features)
+    X_hashed = hashed.fit(texts).transform(texts)
+
+    train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
+    estimators = save_all_models.build_models(n_jobs, config.get('models'))
+    names = [n for n in (models or PARITY_MODELS) if n in estimators]
+
+    report = {
+        'tfidf': {'params': {k: list(v) if isinstance(v, tuple) else v for k, v in tfidf_params.items()},
+                  **vectorizer_stats(tfidf, list(texts[test_idx]))},
+        'hashing': {'params': {'n_features': n_features, 'ngram_range': list(ngram_range),
+                               'max_features': max_features},
+                    **vectorizer_stats(hashed, list(texts[test_idx]))},
+        'models': {},
+    }
+    for name in names:
+        from sklearn.base import clone
+        row = {}
+        predictions = {}
+        for kind, X in (('tfidf', X_tfidf), ('hashing', X_hashed)):
+            model = clone(estimators[name]).fit(X[train_idx], y[train_idx])
+            metrics = smd.evaluate_model(model, X[test_idx], y[test_idx])
+            predictions[kind] = model.predict(X[test_idx])
+            row[kind] = {'f1': round(metrics['f1'], 4), 'accuracy': round(metrics['accuracy'], 4)}
+        row['f1_delta'] = round(row['hashing']['f1'] - row['tfidf']['f1'], 4)
+        row['agreement'] = round(float(np.mean(predictions['tfidf'] == predictions['hashing'])), 4)
+        report['models'][name] = row
+        print(f"  {name:<20} f1 {row['tfidf']['f1']:.4f} -> {row['hashing']['f1']:.4f} "
+              f"({row['f1_delta']:+.4f}), agreement {row['agreement']:.1%}")
+    return report
+
+
+def print_parity(report):
+    print(f"\n{'vectorizer':<10} {'pickle KB':>10} {'load ms':>9} {'transform ms':>13}")
+    for kind in ('tfidf', 'hashing'):
+        r = report[kind]
+        print(f"{kind:<10} {r['bytes'] / 1024:>10.0f} {r['load_ms']:>9.2f} {r['transform_ms']:>13.4f}")
+    deltas = [row['f1_delta'] for row in report['models'].values()]
+    if deltas:
+        print(f"Mean F1 change {np.mean(deltas):+.4f}, worst {min(deltas):+.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hashed TF-IDF vectorizer: parity report against TF-IDF')
+    parser.add_argument('--parity', action='store_true', help='Compare both vectorizers on the test split')
+    parser.add_argument('--n-features', type=int, default=DEFAULT_HASHING['n_features'])
+    parser.add_argument('--max-features', type=int, default=DEFAULT_HASHING['max_features'],
+                        help='columns kept (0 keeps every hashed column)')
+    parser.add_argument('--models', help=f"Comma-separated members, or 'all' (default: {','.join(PARITY_MODELS)})")
+    parser.add_argument('--n-jobs', type=int, default=1)
+    parser.add_argument('--output', default=PARITY_REPORT)
+    args = parser.parse_args()
+
+    if not args.parity:
+        parser.print_help()
+        return
+    models = None
+    if args.models == 'all':
+        models = list(smd.MODEL_NAMES)
+    elif args.models:
+        models = args.models.split(',')
+    print(f"⚖️  TF-IDF vs hashed features (n_features={args.n_features})")
+    report = parity(models, args.n_features, DEFAULT_HASHING['ngram_range'], args.max_features or None, args.n_jobs)
+    print_parity(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Memory footprint of the serving model set
+
+Loads the TF-IDF vectorizer and each consensus member from models/ and
+reports, per artifact:
+
+- file_bytes: size of the .pkl on disk
+- rss_delta_bytes: growth in process RSS while loading it (measured on a
+  second copy, so modules imported by unpickling are reported separately
+  as import_rss_bytes)
+- object_bytes: deep size of the loaded object (arrays by nbytes, Python
+  containers and strings by sys.getsizeof)
+- largest: the biggest attributes, which is where a model pickled with
+  its training data (or a vectorizer with a huge stop_words_ set) shows up
+
+It then loads the set the way the API does (spam_detector_multi), runs a
+warm-up batch and reports the worker's total RSS.
+
+    python -m backend.ml_model.memory_report [--isolated] [--json report.json]
+
+(from the repository root; running the file from ml_model/ is not supported)
+
+--isolated loads each artifact in a fresh subprocess, so one model's RSS
+delta is not hidden by memory freed by an earlier one.
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+
+# Run as a module from the repository root; rss_bytes lives in backend/metrics.py
+from backend.ml_model import spam_detector_multi as smd
+from backend.metrics import rss_bytes
+
+VECTORIZER = "tfidf_vectorizer"
+WARMUP_MESSAGES = [
+    "WINNER!! You have been selected to receive a £900 prize reward! Call 09061701461 now",
+    "Hey, are we still on for lunch tomorrow?",
+    "URGENT! Your mobile number has won a cash award. Txt CLAIM to 81010",
+    "Sorry, I'll call you later. In a meeting right now",
+] * 8
+
+
+def _state(obj):
+    """Attribute dict of an object, including Cython types such as sklearn's Tree"""
+    if hasattr(obj, '__dict__'):
+        return vars(obj)
+    try:
+        state = obj.__getstate__()
+    except Exception:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def deep_size(obj, path='', sizes=None, seen=None):
+    """Approximate bytes reachable from obj; fills sizes[path] for arrays and large containers"""
+    if seen is None:
+        seen = {}
+    if id(obj) in seen:
+        return 0
+    # Hold a reference: __getstate__ builds temporary objects whose ids would otherwise be reused
+    seen[id(obj)] = obj
+
+    if isinstance(obj, np.ndarray):
+        size = obj.nbytes + sys.getsizeof(np.empty(0))
+        if obj.dtype == object:
+            size += sum(deep_size(item, f"{path}[]", None, seen) for item in obj.ravel())
+    elif hasattr(obj, 'tocsr') and hasattr(obj, 'data') and hasattr(obj, 'nnz'):
+        # scipy sparse matrix
+        size = sum(getattr(obj, part).nbytes for part in ('data', 'indices', 'indptr') if hasattr(obj, part))
+    elif isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return sys.getsizeof(obj)
+    elif isinstance(obj, dict):
+        size = sys.getsizeof(obj) + sum(deep_size(k, path, None, seen) + deep_size(v, f"{path}[{k!r}]"[:80], sizes, seen)
+                                        for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size = sys.getsizeof(obj) + sum(deep_size(item, f"{path}[]", None, seen) for item in obj)
+    else:
+        state = _state(obj)
+        if state is None:
+            return sys.getsizeof(obj)
+        size = sys.getsizeof(obj) + sum(deep_size(v, f"{path}.{k}" if path else str(k), sizes, seen)
+                                        for k, v in state.items())
+
+    if sizes is not None and path:
+        sizes[path] = size
+    return size
+
+
+def measure_artifact(name):
+    """Load one artifact and measure it"""
+    path = os.path.join(smd.MODEL_DIR, f"{name}.pkl")
+    gc.collect()
+    before = rss_bytes()
+    obj = joblib.load(path)
+    first_delta = rss_bytes() - before
+    # Load a second copy while the first is alive: its delta excludes module imports
+    before = rss_bytes()
+    copy = joblib.load(path)
+    rss_delta = rss_bytes() - before
+    del copy
+    sizes = {}
+    total = deep_size(obj, '', sizes)
+    # Report leaf-most large entries: drop parents that only repeat a child's size
+    largest = sorted(sizes.items(), key=lambda kv: kv[1], reverse=True)
+    top = []
+    def inside(child, parent):
+        return child.startswith(parent + '.') or child.startswith(parent + '[')
+
+    for attr, size in largest:
+        if any(inside(other, attr) for other, _ in top):
+            continue
+        top = [(other, s) for other, s in top if not inside(attr, other)] + [(attr, size)]
+        if len(top) >= 3:
+            break
+    return {
+        'name': name,
+        'type': type(obj).__name__,
+        'file_bytes': os.path.getsize(path),
+        'rss_delta_bytes': rss_delta,
+        'import_rss_bytes': max(first_delta - rss_delta, 0),
+        'object_bytes': total,
+        'largest': [{'attribute': attr, 'bytes': size} for attr, size in top],
+    }
+
+
+def _measure_isolated(name):
+    code = ("import json, sys\n"
+            "from backend.ml_model.memory_report import measure_artifact\n"
+            "try:\n"
+            "    print(json.dumps(measure_artifact(sys.argv[1])))\n"
+            "except ImportError as e:\n"
+            "    print(json.dumps({'name': sys.argv[1], 'skipped': str(e)}))\n")
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    out = subprocess.check_output([sys.executable, '-c', code, name], cwd=root, text=True)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def artifact_names():
+    """Vectorizer plus every consensus member with a .pkl in models/"""
+    names = [VECTORIZER] + [n for n in smd.MODEL_NAMES if os.path.exists(os.path.join(smd.MODEL_DIR, f"{n}.pkl"))]
+    return names
+
+
+def build_report(isolated=False):
+    """Per-artifact footprint plus worker RSS before and after loading and warm-up"""
+    start_rss = rss_bytes()
+    artifacts = []
+    for name in artifact_names():
+        try:
+            artifacts.append(_measure_isolated(name) if isolated else measure_artifact(name))
+        except (ImportError, subprocess.CalledProcessError) as e:
+            # e.g. XGBoost.pkl without xgboost installed; serving skips it too
+            artifacts.append({'name': name, 'skipped': str(e)})
+
+    # What a worker actually holds: the API's load path plus one warm-up batch
+    gc.collect()
+    before_load = rss_bytes()
+    smd.load_models()
+    smd.predict_consensus_batch(WARMUP_MESSAGES)
+    gc.collect()
+    after_warmup = rss_bytes()
+
+    return {
+        'isolated': isolated,
+        'artifacts': artifacts,
+        'serving_models': list(smd.model_results),
+        'rss_start_bytes': start_rss,
+        'rss_before_load_bytes': before_load,
+        'rss_after_warmup_bytes': after_warmup,
+    }
+
+
+def _mb(n):
+    return f"{n / 1024 / 1024:.1f}" if isinstance(n, (int, float)) else '-'
+
+
+def print_report(report):
+    print(f"\n📦 Model memory footprint ({'isolated' if report['isolated'] else 'in-process'})")
+    print(f"{'artifact':<20} {'type':<28} {'file MB':>8} {'RSS Δ MB':>9} {'import MB':>9} {'object MB':>10}  largest attributes")
+    for a in report['artifacts']:
+        if 'skipped' in a:
+            print(f"{a['name']:<20} skipped: {a['skipped']}")
+            continue
+        largest = ', '.join(f"{x['attribute']}={_mb(x['bytes'])}MB" for x in a['largest'])
+        print(f"{a['name']:<20} {a['type']:<28} {_mb(a['file_bytes']):>8} {_mb(a['rss_delta_bytes']):>9} "
+              f"{_mb(a['import_rss_bytes']):>9} {_mb(a['object_bytes']):>10}  {largest}")
+    print(f"\nWorker RSS: {_mb(report['rss_start_bytes'])} MB at start, "
+          f"{_mb(report['rss_after_warmup_bytes'])} MB after loading {len(report['serving_models'])} models and warm-up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report memory used by the serving model set')
+    parser.add_argument('--isolated', action='store_true', help='Measure each artifact in its own subprocess')
+    parser.add_argument('--json', dest='json_path', help='Also write the report as JSON here')
+    args = parser.parse_args()
+    report = build_report(isolated=args.isolated)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
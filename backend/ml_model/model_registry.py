@@ -0,0 +1,219 @@
+"""
+Hot reload of the model bundle without restarting workers
+
+A reload loads MODEL_DIR into a new ModelEngine (spam_detector_multi.py)
+in a background thread while the current engine keeps serving. The new
+engine then has to classify the canary messages (CANARY_MESSAGES, or
+MODEL_CANARY_FILE: a JSON list of {"text", "label"}) with at least
+MODEL_CANARY_MIN_ACCURACY. Only then does it replace the current engine,
+with a single reference assignment. Requests that already hold the old
+engine finish on it, and it is freed when the last of them returns;
+status() lists such draining versions. A bundle that fails to load or to
+pass the canaries is dropped and the current one keeps serving.
+
+Triggers:
+- POST /api/admin/models/reload (routes/admin.py). This reloads the
+  worker that answers.
+- MODEL_RELOAD_WATCH=true. Every worker polls MODEL_DIR every
+  MODEL_RELOAD_INTERVAL seconds and reloads once the .pkl/.json files
+  have stopped changing for one interval, so a retrain that writes files
+  one by one is only picked up once it is complete.
+
+The engine version (a hash of the loaded files) is what predictions store
+in Prediction.model_version.
+"""
+
+import json
+import os
+import threading
+import time
+import weakref
+from datetime import datetime
+
+try:
+    from backend.ml_model import spam_detector_multi as smd
+except ImportError:
+    import spam_detector_multi as smd
+
+CANARY_FILE = os.environ.get("MODEL_CANARY_FILE")
+CANARY_MIN_ACCURACY = float(os.environ.get("MODEL_CANARY_MIN_ACCURACY", 0.9))
+# Clear-cut messages every bundle should get right
+CANARY_MESSAGES = [
+    ("WINNER!! You have been selected to receive a £900 prize reward! Call 09061701461 to claim", "spam"),
+    ("URGENT! Your mobile number has won a £2000 cash award. Txt CLAIM to 81010 now", "spam"),
+    ("FREE entry in 2 a wkly comp to win FA Cup final tkts. Text FA to 87121 to receive entry", "spam"),
+    ("Congratulations! You've won a free holiday. Call 0800 123 4567 now to claim your prize", "spam"),
+    ("Hey, are we still on for lunch tomorrow?", "ham"),
+    ("Sorry, I'll call you later. In a meeting right now", "ham"),
+    ("Ok lar... Joking wif u oni...", "ham"),
+    ("I'm on my way home, do you want me to pick up some milk?", "ham"),
+    ("Happy birthday! Hope you have a great day", "ham"),
+    ("Can you send me the notes from today's class?", "ham"),
+]
+
+_reload_lock = threading.Lock()
+_watcher = None
+# Replaced engines that some request still references
+_retired = weakref.WeakSet()
+last_reload = None
+
+
+def load_canaries(path=None):
+    """[(text, "spam"|"ham")] from path / MODEL_CANARY_FILE, else CANARY_MESSAGES"""
+    path = path or CANARY_FILE
+    if not path:
+        return list(CANARY_MESSAGES)
+    with open(path) as f:
+        return [(item["text"], item["label"].lower()) for item in json.load(f)]
+
+
+def validate(candidate, canaries=None, min_accuracy=None):
+    """Score the canaries with candidate; returns a report with "passed" """
+    canaries = canaries or load_canaries()
+    min_accuracy = CANARY_MIN_ACCURACY if min_accuracy is None else min_accuracy
+    if not candidate.model_results:
+        return {'passed': False, 'error': 'bundle has no consensus members'}
+    start = time.perf_counter()
+    results = smd.predict_consensus_batch([text for text, _ in canaries], engine=candidate)
+    predicted = [r["consensus"]["majority_vote"].lower() for r in results]
+    wrong = [text for (text, label), p in zip(canaries, predicted) if p != label]
+    accuracy = 1 - len(wrong) / len(canaries)
+    return {
+        'passed': accuracy >= min_accuracy,
+        'accuracy': round(accuracy, 4),
+        'min_accuracy': min_accuracy,
+        'messages': len(canaries),
+        'misclassified': wrong,
+        'ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def reload(model_dir=None, force=False):
+    """
+    Load, validate and swap in the bundle in model_dir (default MODEL_DIR)
+
+    Returns the reload report; its "state" is "swapped", "unchanged" (same
+    version already serving, unless force), "rejected" (canaries failed),
+    "failed" (bundle did not load) or "busy" (another reload is running).
+    """
+    global last_reload
+    if not _reload_lock.acquire(blocking=False):
+        return {'state': 'busy'}
+    try:
+        start = time.perf_counter()
+        current = smd.engine
+        report = {'previous': current.version if current else None,
+                  'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z'}
+        try:
+            candidate = smd.load_bundle(model_dir)
+        except Exception as e:
+            report.update(state='failed', error=f"{type(e).__name__}: {e}")
+        else:
+            report['version'] = candidate.version
+            if current is not None and candidate.version == current.bundle_version and not force:
+                report['state'] = 'unchanged'
+            else:
+                try:
+                    report['canary'] = validate(candidate)
+                except Exception as e:
+                    report['canary'] = {'passed': False, 'error': f"{type(e).__name__}: {e}"}
+                if report['canary']['passed']:
+                    with smd._load_lock:
+                        if smd.engine is not None:
+                            _retired.add(smd.engine)
+                        smd.install_engine(candidate)
+                    report['state'] = 'swapped'
+                else:
+                    report['state'] = 'rejected'
+        report['seconds'] = round(time.perf_counter() - start, 3)
+        last_reload = report
+        icon = '✅' if report['state'] in ('swapped', 'unchanged') else '⚠️'
+        print(f"{icon} Model reload {report['state']}: {report.get('previous')} -> {report.get('version')}"
+              + (f" ({report['error']})" if 'error' in report else ""))
+        return report
+    finally:
+        _reload_lock.release()
+
+
+def reload_in_background(model_dir=None, force=False):
+    """Start reload() in a thread; False if one is already running"""
+    if _reload_lock.locked():
+        return False
+    threading.Thread(target=reload, args=(model_dir, force), name='model-reload', daemon=True).start()
+    return True
+
+
+def bundle_signature(model_dir=None):
+    """(name, size, mtime) of the bundle's .pkl and .json files; changes whenever any is rewritten"""
+    model_dir = model_dir or smd.MODEL_DIR
+    signature = []
+    try:
+        with os.scandir(model_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(('.pkl', '.json')):
+                    stat = entry.stat()
+                    signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    except OSError:
+        return None
+    return tuple(sorted(signature))
+
+
+class BundleWatcher(threading.Thread):
+    """Polls the bundle directory and reloads once a change has settled"""
+
+    def __init__(self, interval, model_dir=None):
+        super().__init__(name='model-watcher', daemon=True)
+        self.interval = interval
+        self.model_dir = model_dir
+        self.stopped = threading.Event()
+
+    def run(self):
+        seen = bundle_signature(self.model_dir)
+        pending = None
+        while not self.stopped.wait(self.interval):
+            signature = bundle_signature(self.model_dir)
+            if signature is None or signature == seen:
+                pending = None
+                continue
+            if signature != pending:
+                # Still being written; check again next interval
+                pending = signature
+                continue
+            seen, pending = signature, None
+            # Workers that have not served yet load the new files on first use anyway
+            if smd.engine is not None:
+                reload(self.model_dir)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_watcher(interval, model_dir=None):
+    global _watcher
+    if _watcher is None or not _watcher.is_alive():
+        _watcher = BundleWatcher(interval, model_dir)
+        _watcher.start()
+    return _watcher
+
+
+def status():
+    """Serving version, draining versions, watcher state and the last reload report"""
+    current = smd.engine
+    return {
+        'version': current.version if current else None,
+        'model_dir': current.model_dir if current else smd.MODEL_DIR,
+        'members': list(current.model_results) if current else [],
+        'student': bool(current and current.student),
+        'online_version': current.online_version if current else None,
+        'near_duplicates': current.near_duplicates.stats() if current and current.near_duplicates else None,
+        'draining': sorted({e.version for e in list(_retired) if e is not current}),
+        'watching': bool(_watcher and _watcher.is_alive()),
+        'reloading': _reload_lock.locked(),
+        'last_reload': last_reload,
+    }
+
+
+def init_app(app):
+    """Start the bundle watcher in this worker if MODEL_RELOAD_WATCH is on"""
+    if app.config.get('MODEL_RELOAD_WATCH'):
+        start_watcher(app.config.get('MODEL_RELOAD_INTERVAL', 30))
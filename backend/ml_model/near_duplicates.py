@@ -0,0 +1,266 @@
+"""
+Near-duplicate reuse of recent verdicts (SimHash + LSH)
+
+Spam campaigns send the same text many times with a different number,
+name or link. The messages table only catches exact repeats. This index
+fingerprints the preprocessed text (transform_text) with a 64-bit
+SimHash over unigrams and bigrams. Tokens containing digits are mapped to
+one placeholder first, so changed phone numbers, amounts and codes do not
+move the fingerprint. Two messages are near-duplicates when their
+fingerprints differ in at most MODEL_NEAR_DUP_MAX_DISTANCE bits.
+
+Lookups use LSH banding: the 64 bits are cut into max_distance + 1
+bands. Any fingerprint within max_distance bits agrees exactly on at least
+one band (pigeonhole), so only the entries bucketed under one of the
+query's bands are compared.
+
+With MODEL_NEAR_DUPLICATES=true, each serving ModelEngine
+(spam_detector_multi.py) owns one index:
+- Verdicts at least MODEL_NEAR_DUP_MIN_CONFIDENCE sure are stored.
+- A later message within the distance of a stored verdict younger than
+  MODEL_NEAR_DUP_TTL_SECONDS gets that verdict without running the models
+  (served_by "near_duplicate"). Its per-model rows are those of the matched
+  message (model_results_from "matched_message").
+- Hits and misses are counted per kind of result (stats()["kinds"]).
+- The index keeps at most MODEL_NEAR_DUP_MAX_ENTRIES entries and evicts the
+  least recently used.
+- A new bundle or online snapshot starts a fresh, empty index.
+
+Reuse rate and false-reuse rate on the test split:
+
+    python -m backend.ml_model.near_duplicates --evaluate [--max-distance 0 3 6]
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = int(os.environ.get("MODEL_NEAR_DUP_MAX_ENTRIES", 5000))
+MAX_DISTANCE = int(os.environ.get("MODEL_NEAR_DUP_MAX_DISTANCE", 3))
+MIN_CONFIDENCE = float(os.environ.get("MODEL_NEAR_DUP_MIN_CONFIDENCE", 0.85))
+TTL_SECONDS = float(os.environ.get("MODEL_NEAR_DUP_TTL_SECONDS", 3600))
+# Shorter messages are too easy to confuse ("ok see you" / "ok call you")
+MIN_TOKENS = 5
+NUMBER_TOKEN = "<num>"
+BITS = 64
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+def _features(clean):
+    tokens = [NUMBER_TOKEN if any(ch.isdigit() for ch in t) else t for t in clean.split()]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])], len(tokens)
+
+
+def simhash(clean):
+    """64-bit SimHash of preprocessed text, or None if it has fewer than MIN_TOKENS tokens"""
+    features, n_tokens = _features(clean)
+    if n_tokens < MIN_TOKENS:
+        return None
+    counts = [0] * BITS
+    for feature in features:
+        h = _token_hash(feature)
+        for bit in range(BITS):
+            counts[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, c in enumerate(counts) if c > 0)
+
+
+def _band_masks(max_distance):
+    bands = max_distance + 1
+    bounds = [BITS * i // bands for i in range(bands + 1)]
+    return [((1 << (hi - lo)) - 1) << lo for lo, hi in zip(bounds, bounds[1:])]
+
+
+def confidence(kind, item):
+    """How sure a stored result is, 0..1: member agreement for consensus, probability for weighted"""
+    if kind == "consensus":
+        consensus = item["consensus"]
+        return consensus["majority_count"] / consensus["total_votes"] if consensus["total_votes"] else 0.0
+    p = item.get("weighted_spam_prob")
+    return 0.0 if p is None else max(p, 1 - p)
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LRU of {kind: result} by SimHash, with banded lookup
+
+    kind separates results of different scoring paths for the same message
+    ("consensus", "weighted:f1"). Thread-safe.
+    """
+
+    def __init__(self, max_entries=None, max_distance=None, min_confidence=None, ttl_seconds=None):
+        self.max_entries = MAX_ENTRIES if max_entries is None else max_entries
+        self.max_distance = MAX_DISTANCE if max_distance is None else max_distance
+        self.min_confidence = MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.ttl_seconds = TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._masks = _band_masks(self.max_distance)
+        # fingerprint -> (stored_at, {kind: result})
+        self._entries = OrderedDict()
+        self._buckets = [{} for _ in self._masks]
+        self._lock = threading.Lock()
+        # kind -> {'hits', 'misses', 'stored'}; each scoring path has its own hit rate
+        self._counts = {}
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _count(self, kind, counter):
+        counts = self._counts.setdefault(kind, {'hits': 0, 'misses': 0, 'stored': 0})
+        counts[counter] += 1
+
+    def get(self, clean, kind="consensus"):
+        """(result, distance) of the nearest fresh near-duplicate with a kind result, else None"""
+        fingerprint = simhash(clean)
+        if fingerprint is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            best = None
+            for mask, bucket in zip(self._masks, self._buckets):
+                for other in bucket.get(fingerprint & mask, ()):
+                    distance = (fingerprint ^ other).bit_count()
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        stored_at, results = self._entries[other]
+                        if kind in results and now - stored_at <= self.ttl_seconds:
+                            best = (distance, other)
+            if best is None:
+                self._count(kind, 'misses')
+                return None
+            self._count(kind, 'hits')
+            self._entries.move_to_end(best[1])
+            return self._entries[best[1]][1][kind], best[0]
+
+    def put(self, clean, kind, result):
+        """Store a result if it is sure enough; returns whether it was stored"""
+        if confidence(kind, result) < self.min_confidence:
+            return False
+        fingerprint = simhash(clean)
+        if fingerprint is None:
+            return False
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                entry = self._entries[fingerprint] = (time.monotonic(), {})
+                for mask, bucket in zip(self._masks, self._buckets):
+                    bucket.setdefault(fingerprint & mask, set()).add(fingerprint)
+            else:
+                entry = self._entries[fingerprint] = (time.monotonic(), entry[1])
+                self._entries.move_to_end(fingerprint)
+            entry[1][kind] = result
+            self._count(kind, 'stored')
+            while len(self._entries) > self.max_entries:
+                self._evict()
+        return True
+
+    def _evict(self):
+        fingerprint, _ = self._entries.popitem(last=False)
+        for mask, bucket in zip(self._masks, self._buckets):
+            key = fingerprint & mask
+            members = bucket[key]
+            members.discard(fingerprint)
+            if not members:
+                del bucket[key]
+        self.evictions += 1
+
+    def stats(self):
+        """Entry counts, plus lookups per kind (/api/predict looks up both "consensus" and "weighted:f1")"""
+        with self._lock:
+            kinds = {}
+            for kind, counts in sorted(self._counts.items()):
+                lookups = counts['hits'] + counts['misses']
+                kinds[kind] = {**counts, 'hit_rate': round(counts['hits'] / lookups, 4) if lookups else None}
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'max_distance': self.max_distance,
+            'evictions': self.evictions,
+            'kinds': kinds,
+        }
+
+
+def evaluate(max_distances=(MAX_DISTANCE,), min_confidence=MIN_CONFIDENCE, max_entries=MAX_ENTRIES):
+    """
+    Reuse and false-reuse rate on the test split, per max distance
+
+    The index is filled with the serving consensus on the training split
+    (the "recently classified" traffic). Then the test split streams
+    through it: each message either reuses a near-duplicate's verdict or is
+    scored and stored. A reuse is false when the reused verdict differs
+    from what the models say about the message itself; reuses that get the
+    label wrong are counted separately.
+    """
+    from sklearn.model_selection import train_test_split
+    try:
+        from backend.ml_model import spam_detector_multi as smd
+        from backend.ml_model import feature_cache
+    except ImportError:
+        import spam_detector_multi as smd
+        import feature_cache
+
+    df = feature_cache.load_corpus()
+    train, test = train_test_split(df, test_size=0.2, stratify=df['target'].values, random_state=42)
+    current = smd.current_engine()
+
+    def score(texts):
+        return smd._score_clean(current, list(texts))
+
+    train_results = score(train['transformed_text'])
+    test_results = score(test['transformed_text'])
+
+    def vote(item):
+        return item["consensus"]["majority_vote"].lower()
+
+    report = {'train': len(train), 'test': len(test), 'min_confidence': min_confidence, 'runs': []}
+    for max_distance in max_distances:
+        index = NearDuplicateIndex(max_entries, max_distance, min_confidence, ttl_seconds=float('inf'))
+        for clean, item in zip(train['transformed_text'], train_results):
+            index.put(clean, "consensus", item)
+        reused = false_reuse = wrong_label = model_wrong = 0
+        for clean, label, own in zip(test['transformed_text'], test['target'], test_results):
+            hit = index.get(clean)
+            if hit is None:
+                index.put(clean, "consensus", own)
+                continue
+            reused += 1
+            verdict = vote(hit[0])
+            false_reuse += verdict != vote(own)
+            wrong_label += verdict != ("spam" if label == 1 else "ham")
+            model_wrong += vote(own) != ("spam" if label == 1 else "ham")
+        report['runs'].append({
+            'max_distance': max_distance,
+            'reused': reused,
+            'reuse_rate': round(reused / len(test), 4),
+            'false_reuse': false_reuse,
+            'false_reuse_rate': round(false_reuse / reused, 4) if reused else None,
+            'reused_wrong_label': wrong_label,
+            'models_wrong_label': model_wrong,
+            'index': index.stats(),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Near-duplicate verdict reuse on the test split")
+    parser.add_argument('--evaluate', action='store_true', help='report reuse and false-reuse rates')
+    parser.add_argument('--max-distance', type=int, nargs='+', default=[MAX_DISTANCE])
+    parser.add_argument('--min-confidence', type=float, default=MIN_CONFIDENCE)
+    parser.add_argument('--max-entries', type=int, default=MAX_ENTRIES)
+    args = parser.parse_args()
+    if not args.evaluate:
+        parser.error('nothing to do; pass --evaluate')
+
+    result = evaluate(args.max_distance, args.min_confidence, args.max_entries)
+    print(f"Train {result['train']} / test {result['test']} messages, min confidence {result['min_confidence']}")
+    for run in result['runs']:
+        print(f"  distance <= {run['max_distance']}: reused {run['reused']} ({run['reuse_rate']:.1%}), "
+              f"false reuse {run['false_reuse']} ({run['false_reuse_rate']}), "
+              f"label errors reused {run['reused_wrong_label']} vs models {run['models_wrong_label']}")
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,105 @@
+"""
+Offline NLTK resources for the preprocessing pipeline
+
+The English stopword list (and, when vendored, the Punkt sentence model)
+ship inside the model bundle under models/nltk_data and are read straight
+from disk. Nothing here searches the user's NLTK paths or calls
+nltk.download, so worker boot is deterministic with no network access.
+
+Without a vendored Punkt model, sentences are split on terminal
+punctuation followed by whitespace before word tokenization. This matches
+nltk.word_tokenize except around abbreviations ("Mr. Smith"); run
+scripts/setup/vendor_nltk_data.py to vendor Punkt and measure the
+difference on spam.csv.
+"""
+
+import os
+import re
+import sys
+import threading
+
+NLTK_DATA_DIR = os.path.join(os.path.dirname(__file__), "models", "nltk_data")
+STOPWORDS_FILE = os.path.join(NLTK_DATA_DIR, "corpora", "stopwords", "english")
+PUNKT_FILE = os.path.join(NLTK_DATA_DIR, "tokenizers", "punkt", "PY3", "english.pickle")
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+_lock = threading.Lock()
+_stopwords = None
+_stemmer = None
+_sentence_tokenizer = None
+_word_tokenizer = None
+
+
+def _import_nltk():
+    """
+    Import nltk on a throwaway thread
+
+    nltk keeps the exceptions of optional dependencies it fails to import
+    (bllipparser, ...), and their tracebacks keep every frame of the
+    importing stack alive. Imported from a request, that would pin the
+    request's locals, including the model engine, for the life of the
+    process and stop a replaced bundle from ever being freed.
+    """
+    if 'nltk' in sys.modules:
+        return
+    errors = []
+
+    def target():
+        try:
+            import nltk  # noqa: F401
+        except BaseException as e:
+            errors.append(e)
+
+    loader = threading.Thread(target=target, name='nltk-import')
+    loader.start()
+    loader.join()
+    if errors:
+        raise errors[0]
+
+
+def load_stopwords():
+    """English stopword set, read from the bundle"""
+    global _stopwords
+    if _stopwords is None:
+        with open(STOPWORDS_FILE, encoding='utf-8') as f:
+            _stopwords = frozenset(line.strip() for line in f if line.strip())
+    return _stopwords
+
+
+def get_stemmer():
+    """Shared Porter stemmer (needs no data files)"""
+    global _stemmer
+    if _stemmer is None:
+        _import_nltk()
+        from nltk.stem.porter import PorterStemmer
+        _stemmer = PorterStemmer()
+    return _stemmer
+
+
+def _load_tokenizers():
+    global _sentence_tokenizer, _word_tokenizer
+    with _lock:
+        if _word_tokenizer is not None:
+            return
+        _import_nltk()
+        from nltk.tokenize.destructive import NLTKWordTokenizer
+        if os.path.exists(PUNKT_FILE):
+            import pickle
+            with open(PUNKT_FILE, 'rb') as f:
+                punkt = pickle.load(f)
+            _sentence_tokenizer = punkt.tokenize
+        else:
+            _sentence_tokenizer = lambda text: [s for s in _SENTENCE_END.split(text) if s]
+        _word_tokenizer = NLTKWordTokenizer()
+
+
+def word_tokenize(text):
+    """Drop-in for nltk.word_tokenize that only uses bundled data"""
+    if _word_tokenizer is None:
+        _load_tokenizers()
+    return [token for sent in _sentence_tokenizer(text) for token in _word_tokenizer.tokenize(sent)]
+
+
+def has_vendored_punkt():
+    return os.path.exists(PUNKT_FILE)
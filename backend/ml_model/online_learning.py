@@ -0,0 +1,188 @@
+"""
+Incremental learning from user feedback
+
+Two consensus members can learn without a full retrain: MultinomialNB
+(partial_fit on the bundle's fixed TF-IDF or hashed columns) and an
+SGDClassifier with log loss on the same features ("SGD"). Corrected labels
+from prediction_feedback are applied with partial_fit together with a
+replay sample of the original training split, so a handful of corrections
+cannot drag a member away from everything it learned before.
+
+Each update is written as a new snapshot version:
+
+    models/online/<version>/MultinomialNB.pkl, SGD.pkl, manifest.json
+    models/online/CURRENT          (name of the live version)
+
+manifest.json records the parent version, the feedback learned and
+test-split metrics. A snapshot whose F1 drops more than max_f1_drop below
+the bootstrap snapshot's is not published. CURRENT is replaced atomically. With
+MODEL_ONLINE_UPDATES=true, serving workers check it every
+MODEL_ONLINE_RELOAD_SECONDS and swap the new members in without a
+restart (spam_detector_multi._maybe_reload_online).
+
+The database side (collecting and marking feedback) is
+backend/learn_from_feedback.py.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+try:
+    from backend.ml_model import spam_detector_multi as smd
+    from backend.ml_model import feature_cache
+    from backend.ml_model.distill_student import vocabulary_hash
+except ImportError:
+    import spam_detector_multi as smd
+    import feature_cache
+    from distill_student import vocabulary_hash
+
+ONLINE_MEMBERS = ["MultinomialNB", "SGD"]
+CURRENT_FILE = "CURRENT"
+# Training rows replayed per feedback row in each update
+REPLAY_RATIO = 4
+BOOTSTRAP_EPOCHS = 10
+
+
+def current_version(online_dir=None):
+    """Name of the live snapshot, or None"""
+    path = os.path.join(online_dir or smd.ONLINE_DIR, CURRENT_FILE)
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def load_snapshot(version, online_dir=None):
+    """({name: model}, manifest) of a published snapshot"""
+    directory = os.path.join(online_dir or smd.ONLINE_DIR, version)
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    models = {name: joblib.load(os.path.join(directory, f"{name}.pkl")) for name in manifest['members']}
+    return models, manifest
+
+
+def _new_version():
+    return datetime.utcnow().strftime('online-%Y%m%d%H%M%S%f')
+
+
+def _training_data(vectorizer):
+    """(X_train, y_train, X_test, y_test) on the bundle's vectorizer, split as in save_all_models"""
+    from sklearn.model_selection import train_test_split
+    df = feature_cache.load_corpus()
+    X = vectorizer.transform(df['transformed_text'].values)
+    y = df['target'].values
+    return train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+
+
+def _evaluate(models, X_test, y_test):
+    return {name: {k: v for k, v in smd.evaluate_model(model, X_test, y_test).items() if k != 'classification_report'}
+            for name, model in models.items()}
+
+
+def publish(models, manifest, online_dir=None):
+    """Write a snapshot and point CURRENT at it"""
+    online_dir = online_dir or smd.ONLINE_DIR
+    os.makedirs(online_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=online_dir, prefix='.tmp-')
+    try:
+        for name, model in models.items():
+            joblib.dump(model, os.path.join(tmp, f"{name}.pkl"))
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp, os.path.join(online_dir, manifest['version']))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    pointer = os.path.join(online_dir, f".{CURRENT_FILE}.tmp")
+    with open(pointer, 'w') as f:
+        f.write(manifest['version'])
+    os.replace(pointer, os.path.join(online_dir, CURRENT_FILE))
+    print(f"✅ Published online snapshot {manifest['version']}")
+    return manifest['version']
+
+
+def bootstrap(seed=42, online_dir=None):
+    """First snapshot: the bundle's MultinomialNB plus an SGD member trained on the training split"""
+    from sklearn.linear_model import SGDClassifier
+    smd.load_models()
+    X_train, X_test, y_train, y_test = _training_data(smd.tfidf)
+    nb = joblib.load(os.path.join(smd.MODEL_DIR, "MultinomialNB.pkl"))
+    # 'optimal' keeps its step count in t_, so later feedback updates take smaller steps
+    sgd = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=seed)
+    rng = np.random.RandomState(seed)
+    for _ in range(BOOTSTRAP_EPOCHS):
+        order = rng.permutation(X_train.shape[0])
+        sgd.partial_fit(X_train[order], y_train[order], classes=np.array([0, 1]))
+    models = {"MultinomialNB": nb, "SGD": sgd}
+    manifest = {
+        'version': _new_version(),
+        'parent': None,
+        'members': ONLINE_MEMBERS,
+        'vocabulary_hash': vocabulary_hash(smd.tfidf),
+        'feedback_count': 0,
+        'feedback_total': 0,
+        'metrics': _evaluate(models, X_test, y_test),
+        'baseline_metrics': None,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+    }
+    return publish(models, manifest, online_dir)
+
+
+def learn(texts, labels, feedback_weight=5.0, max_f1_drop=0.01, seed=42, online_dir=None):
+    """
+    partial_fit the live snapshot on (text, 0/1 label) feedback plus replayed training rows
+
+    Returns (version, manifest) of the published snapshot, or (None,
+    manifest) when it was rejected for losing more than max_f1_drop F1 on
+    the test split.
+    """
+    smd.load_models()
+    parent = current_version(online_dir)
+    if parent is None:
+        parent = bootstrap(seed, online_dir)
+    models, parent_manifest = load_snapshot(parent, online_dir)
+    if parent_manifest.get('vocabulary_hash') != vocabulary_hash(smd.tfidf):
+        raise ValueError(f"Online snapshot {parent} was built on a different vectorizer; run bootstrap again")
+
+    baseline = parent_manifest.get('baseline_metrics') or parent_manifest['metrics']
+
+    from scipy.sparse import vstack
+    X_train, X_test, y_train, y_test = _training_data(smd.tfidf)
+    X_feedback = smd.tfidf.transform([smd.transform_text(t) for t in texts])
+    y_feedback = np.asarray(labels, dtype=int)
+    rng = np.random.RandomState(seed + (parent_manifest.get('feedback_total') or 0))
+    replay = rng.choice(X_train.shape[0], size=min(X_train.shape[0], REPLAY_RATIO * len(texts)), replace=False)
+    X = vstack([X_feedback, X_train[replay]]).tocsr()
+    y = np.concatenate([y_feedback, y_train[replay]])
+    weights = np.concatenate([np.full(len(texts), feedback_weight), np.ones(len(replay))])
+    # NB counts never fade, so it only needs the feedback; SGD gets the replay too
+    models["MultinomialNB"].partial_fit(X_feedback, y_feedback,
+                                        sample_weight=np.full(len(texts), feedback_weight))
+    models["SGD"].partial_fit(X, y, sample_weight=weights)
+
+    metrics = _evaluate(models, X_test, y_test)
+    manifest = {
+        'version': _new_version(),
+        'parent': parent,
+        'members': list(models),
+        'vocabulary_hash': parent_manifest['vocabulary_hash'],
+        'feedback_count': len(texts),
+        'feedback_total': (parent_manifest.get('feedback_total') or 0) + len(texts),
+        'feedback_weight': feedback_weight,
+        'replayed': int(len(replay)),
+        'metrics': metrics,
+        'baseline_metrics': baseline,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+    }
+    # Against the bootstrap snapshot, so small drops cannot add up over many updates
+    drops = {name: baseline[name]['f1'] - m['f1'] for name, m in metrics.items() if name in baseline}
+    if any(drop > max_f1_drop for drop in drops.values()):
+        print(f"⚠️ Snapshot rejected: F1 drop {drops} exceeds {max_f1_drop}")
+        return None, manifest
+    return publish(models, manifest, online_dir), manifest
@@ -1,19 +1,42 @@
 """
 Script to train all models and save them as .pkl files for production use.
 Run this ONCE locally to generate the .pkl files, then commit them to your repo for use in production.
+
+Members train in parallel, one fresh worker process per model (so each
+model's peak memory can be measured). The soft-voting ensemble is assembled
+from the already fitted SVC, MultinomialNB and ExtraTrees instead of
+fitting them again. Wall time and peak RSS per model are written to
+models/training_report.json. The preprocessed corpus and TF-IDF matrix
+come from feature_cache.py, so repeat runs skip transform_text.
+Parameters tuned by tune_hyperparameters.py (models/training_config.json)
+replace the defaults when that file exists. --vectorizer hashing saves a
+HashedTfidfVectorizer (hashing_features.py) as tfidf_vectorizer.pkl instead
+of a TfidfVectorizer; compare the two with
+`python -m backend.ml_model.hashing_features --parity` first.
+
+    python -m backend.ml_model.save_all_models [--workers 8] [--n-jobs 1] [--vectorizer hashing]
+
+--workers 1 trains in this process, one model after another.
+
+--members NAME ... trains only those members, on the committed
+tfidf_vectorizer.pkl. The other committed pickles are kept and only
+evaluated, so model_metrics.json still covers the whole bundle. Use it to
+add members to a bundle without retraining (and re-versioning) the rest.
 """
 
+import argparse
+import json
 import os
-import pandas as pd
-import numpy as np
-import string
+import time
+from datetime import datetime
+from multiprocessing import Pool
+
 import joblib
 
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, classification_report
-from sklearn.naive_bayes import MultinomialNB, GaussianNB, BernoulliNB
+from sklearn.naive_bayes import MultinomialNB
 from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder
 from sklearn.svm import SVC
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.neighbors import KNeighborsClassifier
@@ -21,110 +44,324 @@ from sklearn.ensemble import (
     RandomForestClassifier, AdaBoostClassifier, BaggingClassifier,
     ExtraTreesClassifier, GradientBoostingClassifier, VotingClassifier, StackingClassifier
 )
+from sklearn.utils import Bunch
 try:
     from xgboost import XGBClassifier
 except ImportError:
     XGBClassifier = None
 
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem.porter import PorterStemmer
+# Same preprocessing as serving, using the NLTK data bundled in models/nltk_data
+try:
+    from backend.ml_model.spam_detector_multi import evaluate_model, write_metrics_file, _serving_members
+    from backend.ml_model.memory_report import rss_bytes
+    from backend.ml_model import distill_student, feature_cache, hashing_features
+except ImportError:
+    from spam_detector_multi import evaluate_model, write_metrics_file, _serving_members
+    from memory_report import rss_bytes
+    import distill_student
+    import feature_cache
+    import hashing_features
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '../../ml_notebooks/main_notebook/spam.csv')
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
+TRAINING_REPORT = os.path.join(MODEL_DIR, "training_report.json")
+# Tuned TF-IDF and member parameters written by tune_hyperparameters.py
+TRAINING_CONFIG = os.environ.get("TRAINING_CONFIG", os.path.join(MODEL_DIR, "training_config.json"))
 
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-ps = PorterStemmer()
-stop_words = set(stopwords.words('english'))
+# Members of the soft-voting and stacking ensembles
+ENSEMBLE_MEMBERS = [('svc', "SVC"), ('nb', "MultinomialNB"), ('et', "ExtraTrees")]
+# Slowest first, so the long fits start while the short ones fill the other workers
+TRAINING_ORDER = [
+    "StackingEnsemble", "SVC", "GradientBoosting", "Bagging", "RandomForest", "ExtraTrees",
+    "AdaBoost", "XGBoost", "KNeighbors", "LogisticRegression", "DecisionTree", "MultinomialNB",
+]
 
-def transform_text(text):
-    text = text.lower()
-    tokens = nltk.word_tokenize(text)
-    tokens = [w for w in tokens if w.isalnum()]
-    tokens = [w for w in tokens if w not in stop_words and w not in string.punctuation]
-    tokens = [ps.stem(w) for w in tokens]
-    return " ".join(tokens)
 
 # --- Load Data ---
-DATA_PATH = os.path.join(os.path.dirname(__file__), '../../ml_notebooks/main_notebook/spam.csv')
-df = pd.read_csv(DATA_PATH, encoding='latin-1')
-df = df.rename(columns={'v1': 'target', 'v2': 'text'})
-df = df[['target', 'text']].dropna()
-df['target'] = df['target'].map({'ham': 0, 'spam': 1})
-df['transformed_text'] = df['text'].apply(transform_text)
-
-# --- Feature Extraction ---
-tfidf = TfidfVectorizer(ngram_range=(1,2), max_features=4000)
-X = tfidf.fit_transform(df['transformed_text'])
-y = df['target'].values
-
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, stratify=y, random_state=42
-)
+def load_data():
+    # transform_text output is cached per dataset and preprocessing version
+    return feature_cache.load_corpus(DATA_PATH)
+
+
+def load_training_config(path=None):
+    """Tuned parameters, or None to train with the defaults below"""
+    path = path or TRAINING_CONFIG
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        config = json.load(f)
+    print(f"Using tuned parameters from {path}")
+    return config
+
 
 # --- Model Definitions ---
-models = {
-    "SVC": SVC(kernel='sigmoid', gamma=1.0, probability=True, random_state=42),
-    "KNeighbors": KNeighborsClassifier(),
-    "MultinomialNB": MultinomialNB(),
-    "DecisionTree": DecisionTreeClassifier(max_depth=5, random_state=42),
-    "LogisticRegression": LogisticRegression(solver='liblinear', penalty='l1', random_state=42),
-    "RandomForest": RandomForestClassifier(n_estimators=50, random_state=42),
-    "AdaBoost": AdaBoostClassifier(n_estimators=50, random_state=42, algorithm='SAMME'),
-    "Bagging": BaggingClassifier(n_estimators=50, random_state=42),
-    "ExtraTrees": ExtraTreesClassifier(n_estimators=50, random_state=42),
-    "GradientBoosting": GradientBoostingClassifier(n_estimators=50, random_state=42),
-}
-if XGBClassifier is not None:
-    models["XGBoost"] = XGBClassifier(n_estimators=50, random_state=42, eval_metric='logloss')
+def build_models(n_jobs=1, params=None):
+    """
+    Unfitted members; n_jobs goes to the models that parallelise internally
+
+    params ({name: {param: value}}, e.g. the "models" of the training config)
+    is applied on top of the defaults.
+    """
+    models = {
+        "SVC": SVC(kernel='sigmoid', gamma=1.0, probability=True, random_state=42),
+        "KNeighbors": KNeighborsClassifier(n_jobs=n_jobs),
+        "MultinomialNB": MultinomialNB(),
+        "DecisionTree": DecisionTreeClassifier(max_depth=5, random_state=42),
+        "LogisticRegression": LogisticRegression(solver='liblinear', penalty='l1', random_state=42),
+        "RandomForest": RandomForestClassifier(n_estimators=50, random_state=42, n_jobs=n_jobs),
+        "AdaBoost": AdaBoostClassifier(n_estimators=50, random_state=42, algorithm='SAMME'),
+        "Bagging": BaggingClassifier(n_estimators=50, random_state=42, n_jobs=n_jobs),
+        "ExtraTrees": ExtraTreesClassifier(n_estimators=50, random_state=42, n_jobs=n_jobs),
+        "GradientBoosting": GradientBoostingClassifier(n_estimators=50, random_state=42),
+    }
+    if XGBClassifier is not None:
+        models["XGBoost"] = XGBClassifier(n_estimators=50, random_state=42, eval_metric='logloss', n_jobs=n_jobs)
+    for name, overrides in (params or {}).items():
+        if name in models:
+            models[name].set_params(**overrides)
+    return models
+
 
 # --- Ensemble (Voting and Stacking) ---
-voting = VotingClassifier(
-    estimators=[
-        ('svc', models["SVC"]),
-        ('nb', models["MultinomialNB"]),
-        ('et', models["ExtraTrees"])
-    ],
-    voting='soft'
-)
-stacking = StackingClassifier(
-    estimators=[
-        ('svc', models["SVC"]),
-        ('nb', models["MultinomialNB"]),
-        ('et', models["ExtraTrees"])
-    ],
-    final_estimator=RandomForestClassifier(n_estimators=50, random_state=42)
-)
+def build_stacking(models, n_jobs=1):
+    # Fits its own clones: the final estimator needs cross-validated member predictions
+    return StackingClassifier(
+        estimators=[(short, models[name]) for short, name in ENSEMBLE_MEMBERS],
+        final_estimator=RandomForestClassifier(n_estimators=50, random_state=42),
+        n_jobs=n_jobs
+    )
 
-ensembles = {
-    "VotingEnsemble": voting,
-    "StackingEnsemble": stacking
-}
 
-# --- Training/Fitting and Saving ---
-MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
-os.makedirs(MODEL_DIR, exist_ok=True)
+def prefit_voting(fitted, y_train):
+    """
+    Soft-voting ensemble over members that are already fitted
+
+    Same result as VotingClassifier.fit, which would fit clones with the
+    same parameters on the same data again.
+    """
+    estimators = [(short, fitted[name]) for short, name in ENSEMBLE_MEMBERS]
+    voting = VotingClassifier(estimators=estimators, voting='soft')
+    voting.estimators_ = [est for _, est in estimators]
+    voting.named_estimators_ = Bunch(**dict(estimators))
+    voting.le_ = LabelEncoder().fit(y_train)
+    voting.classes_ = voting.le_.classes_
+    return voting
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def fit_and_evaluate(name, model, X_train, y_train, X_test, y_test):
+    """Fit one model; returns (name, model, metrics, stats). Runs in a pool worker."""
+    start_rss = rss_bytes()
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    wall = time.perf_counter() - start
+    peak = _peak_rss_bytes()
+    stats = {
+        'wall_s': round(wall, 3),
+        'peak_rss_bytes': peak,
+        'peak_rss_delta_bytes': max(peak - start_rss, 0) if peak is not None else None,
+        'pid': os.getpid(),
+    }
+    return name, model, evaluate_model(model, X_test, y_test), stats
+
+
+def train_all(models, stacking, X_train, y_train, X_test, y_test, workers):
+    """Fit every member and the stacking ensemble; returns ({name: model}, {name: metrics}, {name: stats})"""
+    jobs = dict(models)
+    if stacking is not None:
+        jobs["StackingEnsemble"] = stacking
+    order = [n for n in TRAINING_ORDER if n in jobs] + [n for n in jobs if n not in TRAINING_ORDER]
+    fitted, metrics, stats = {}, {}, {}
+
+    def collect(result):
+        name, model, model_metrics, model_stats = result
+        fitted[name], metrics[name], stats[name] = model, model_metrics, model_stats
+        print(f"Trained {name} in {model_stats['wall_s']:.1f}s")
+
+    if workers <= 1:
+        for name in order:
+            collect(fit_and_evaluate(name, jobs[name], X_train, y_train, X_test, y_test))
+        return fitted, metrics, stats
+
+    # A fresh process per model, so ru_maxrss is that model's peak
+    with Pool(processes=min(workers, len(order)), maxtasksperchild=1) as pool:
+        pending = [pool.apply_async(fit_and_evaluate, (name, jobs[name], X_train, y_train, X_test, y_test))
+                   for name in order]
+        for result in pending:
+            collect(result.get())
+    return fitted, metrics, stats
+
 
 def save_model(model, name):
     path = os.path.join(MODEL_DIR, f"{name}.pkl")
     joblib.dump(model, path)
     print(f"Saved {name} to {path}")
 
+
 def save_vectorizer(vectorizer):
     path = os.path.join(MODEL_DIR, "tfidf_vectorizer.pkl")
     joblib.dump(vectorizer, path)
-    print(f"Saved TFIDF vectorizer to {path}")
+    print(f"Saved {type(vectorizer).__name__} to {path}")
 
-print("Training and saving all models...")
 
-for name, model in models.items():
-    print(f"Training {name}...")
-    model.fit(X_train, y_train)
-    save_model(model, name)
+def build_features(df, kind, tfidf_params):
+    """(fitted vectorizer, feature matrix of df) for --vectorizer tfidf or hashing"""
+    if kind == 'hashing':
+        # Streams the corpus for document frequencies; no vocabulary to build or cache
+        vectorizer = hashing_features.HashedTfidfVectorizer(
+            hashing_features.DEFAULT_HASHING['n_features'], tuple(tfidf_params['ngram_range']),
+            tfidf_params['max_features'])
+        texts = df['transformed_text'].values
+        return vectorizer.fit(texts), vectorizer.transform(texts)
+    return feature_cache.load_features(df, max_features=tfidf_params['max_features'],
+                                       ngram_range=tuple(tfidf_params['ngram_range']))
 
-for name, model in ensembles.items():
-    print(f"Training {name}...")
-    model.fit(X_train, y_train)
-    save_model(model, name)
 
-save_vectorizer(tfidf)
+def load_saved(names):
+    """{name: model} of the committed pickles among names that load here (XGBoost needs xgboost)"""
+    saved = {}
+    for name in names:
+        path = os.path.join(MODEL_DIR, f"{name}.pkl")
+        if not os.path.exists(path):
+            continue
+        try:
+            saved[name] = joblib.load(path)
+        except Exception as e:
+            print(f"⚠️ Could not load {path}: {e}; its metrics are left out")
+    return saved
+
+
+def write_training_report(stats, total_wall, workers, n_jobs, path=None, config=None):
+    path = path or TRAINING_REPORT
+    report = {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'workers': workers,
+        'n_jobs': n_jobs,
+        'cpu_count': os.cpu_count(),
+        # With --workers 1 every model shares one process, so peak_rss_bytes only grows
+        'peak_rss_per_model': workers > 1,
+        'total_wall_s': round(total_wall, 3),
+        'parameters': config,
+        'models': stats,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n{'model':<20} {'wall s':>8} {'peak RSS MB':>12} {'fit Δ MB':>9}")
+    for name, s in sorted(stats.items(), key=lambda kv: -kv[1]['wall_s']):
+        peak = f"{s['peak_rss_bytes'] / 1024 / 1024:.0f}" if s.get('peak_rss_bytes') else '-'
+        delta = f"{s['peak_rss_delta_bytes'] / 1024 / 1024:.0f}" if s.get('peak_rss_delta_bytes') is not None else '-'
+        print(f"{name:<20} {s['wall_s']:>8.2f} {peak:>12} {delta:>9}")
+    print(f"Total training wall time {total_wall:.1f}s with {workers} worker(s); report saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train every consensus member and save the bundle')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Models trained at once, each in its own process (default: CPU count)')
+    parser.add_argument('--n-jobs', type=int, default=1,
+                        help='n_jobs for the forests, Bagging, KNeighbors, XGBoost and stacking (default: 1)')
+    parser.add_argument('--config', help=f"Tuned parameters (default: {TRAINING_CONFIG} if present)")
+    parser.add_argument('--default-params', action='store_true', help='Ignore the training config')
+    parser.add_argument('--vectorizer', choices=['tfidf', 'hashing'], default='tfidf',
+                        help='TfidfVectorizer, or hashed n-grams with IDF weights (default: tfidf)')
+    parser.add_argument('--members', nargs='+', choices=TRAINING_ORDER + ["VotingEnsemble"],
+                        help='Train only these on the saved vectorizer; keep and re-evaluate the rest')
+    args = parser.parse_args()
+    if args.members:
+        return add_members(args.members, args.workers, args.n_jobs, load_training_config(args.config)
+                           if not args.default_params else None)
+
+    config = None if args.default_params else load_training_config(args.config)
+    tfidf_params = dict(feature_cache.DEFAULT_TFIDF, **(config or {}).get('tfidf', {}))
+
+    df = load_data()
+
+    # --- Feature Extraction ---
+    tfidf, X = build_features(df, args.vectorizer, tfidf_params)
+    y = df['target'].values
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, stratify=y, random_state=42
+    )
+
+    # --- Training/Fitting and Saving ---
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    models = build_models(args.n_jobs, (config or {}).get('models'))
+    stacking = build_stacking(models, args.n_jobs)
+
+    print(f"Training and saving all models ({args.workers} worker(s))...")
+    start = time.perf_counter()
+    fitted, metrics, stats = train_all(models, stacking, X_train, y_train, X_test, y_test, args.workers)
+    voting_start = time.perf_counter()
+    fitted["VotingEnsemble"] = prefit_voting(fitted, y_train)
+    metrics["VotingEnsemble"] = evaluate_model(fitted["VotingEnsemble"], X_test, y_test)
+    stats["VotingEnsemble"] = {'wall_s': round(time.perf_counter() - voting_start, 3), 'reused_members': True}
+    total_wall = time.perf_counter() - start
+
+    for name, model in fitted.items():
+        save_model(model, name)
+    save_vectorizer(tfidf)
+    # Serving reads these instead of re-evaluating every model at startup
+    write_metrics_file(metrics, os.path.join(MODEL_DIR, "model_metrics.json"))
+    write_training_report(stats, total_wall, args.workers, args.n_jobs,
+                          config={'vectorizer': args.vectorizer, 'tfidf': tfidf_params,
+                                  'models': (config or {}).get('models', {})})
+
+    print("All models and vectorizer saved to:", MODEL_DIR)
+
+    # --- Distilled student (MODEL_SERVING_MODE=student); DISTILL_STUDENT=false skips it ---
+    if os.environ.get("DISTILL_STUDENT", "true").lower() == "true":
+        teachers = {name: fitted[name] for name in _serving_members() if name in fitted}
+        bundle, report = distill_student.distill(
+            tfidf, teachers, {name: metrics[name]["f1"] for name in teachers},
+            df['text'].values, y, transformed=df['transformed_text'].values
+        )
+        distill_student.print_report(report)
+        distill_student.save(bundle, report)
+
+
+def add_members(names, workers=1, n_jobs=1, config=None):
+    """Train names on the committed vectorizer and rewrite model_metrics.json for the whole bundle"""
+    try:
+        from backend.ml_model.spam_detector_multi import MODEL_NAMES
+    except ImportError:
+        from spam_detector_multi import MODEL_NAMES
+    df = load_data()
+    tfidf = joblib.load(os.path.join(MODEL_DIR, "tfidf_vectorizer.pkl"))
+    X = tfidf.transform(df['transformed_text'].values)
+    y = df['target'].values
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+
+    all_models = build_models(n_jobs, (config or {}).get('models'))
+    models = {name: all_models[name] for name in names if name in all_models}
+    stacking = build_stacking(all_models, n_jobs) if "StackingEnsemble" in names else None
+    saved = load_saved([name for name in MODEL_NAMES if name not in names])
+    missing = [name for _, name in ENSEMBLE_MEMBERS if name not in saved and name not in models]
+    if "VotingEnsemble" in names and missing:
+        raise SystemExit(f"VotingEnsemble needs {', '.join(missing)}; add them to --members")
+
+    print(f"Training {', '.join(names)} on the saved vectorizer; keeping {', '.join(saved)}")
+    start = time.perf_counter()
+    fitted, metrics, stats = train_all(models, stacking, X_train, y_train, X_test, y_test, workers)
+    if "VotingEnsemble" in names:
+        fitted["VotingEnsemble"] = prefit_voting({**saved, **fitted}, y_train)
+        metrics["VotingEnsemble"] = evaluate_model(fitted["VotingEnsemble"], X_test, y_test)
+    for name, model in saved.items():
+        metrics[name] = evaluate_model(model, X_test, y_test)
+    for name, model in fitted.items():
+        save_model(model, name)
+    write_metrics_file(metrics, os.path.join(MODEL_DIR, "model_metrics.json"))
+    print(f"Added {len(fitted)} member(s) in {time.perf_counter() - start:.1f}s; "
+          f"metrics for {len(metrics)} written to model_metrics.json")
+
 
-print("All models and vectorizer saved to:", MODEL_DIR)
+if __name__ == '__main__':
+    main()
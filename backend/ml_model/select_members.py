@@ -0,0 +1,264 @@
+"""
+Consensus member selection
+
+Scores every subset of the bundled consensus members (or a greedy forward
+search when there are too many) on the held-out split, under both
+majority voting (what /api/predict returns) and F1-weighted voting (as in
+predict_weighted_consensus). Each subset's cost is the sum of its
+members' measured single-message latency and loaded size.
+
+It prints the Pareto frontier of score against latency and memory, then
+writes models/serving_config.json with the cheapest subset of at least
+--min-members that keeps the full ensemble's score (within --tolerance).
+load_models() in spam_detector_multi reads that file and loads only the
+chosen members; delete it to serve every member again.
+
+    python -m backend.ml_model.select_members                # exhaustive, majority, accuracy
+    python -m backend.ml_model.select_members --objective f1 --voting weighted --tolerance 0.002
+    python -m backend.ml_model.select_members --dry-run --json selection.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+try:
+    from backend.ml_model import spam_detector_multi as smd
+    from backend.ml_model.memory_report import deep_size
+except ImportError:
+    import spam_detector_multi as smd
+    from memory_report import deep_size
+
+# Above this many members, exhaustive search switches to greedy
+EXHAUSTIVE_LIMIT = 16
+LATENCY_SAMPLES = 200
+
+
+def load_candidates():
+    """{name: model} for every member with a loadable .pkl, in MODEL_NAMES order"""
+    models = {}
+    for name in smd.MODEL_NAMES:
+        path = os.path.join(smd.MODEL_DIR, f"{name}.pkl")
+        if not os.path.exists(path):
+            continue
+        try:
+            models[name] = joblib.load(path)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+    return models
+
+
+def held_out_split():
+    """(X_test, y_test) from the same stratified split the metrics use"""
+    from sklearn.model_selection import train_test_split
+    smd.load_models()
+    df = smd._load_dataset()
+    _, test_idx = train_test_split(
+        np.arange(len(df)), test_size=0.2, stratify=df['target'].values, random_state=42
+    )
+    return smd.tfidf.transform(df['transformed_text'].values[test_idx]), df['target'].values[test_idx]
+
+
+def spam_probability(model, X):
+    """Same confidence the serving path uses"""
+    if hasattr(model, "predict_proba"):
+        return model.predict_proba(X)[:, 1]
+    df = model.decision_function(X)
+    return np.clip(1 / (1 + np.exp(-df)), 0.01, 0.99)
+
+
+def profile_member(model, X, samples=LATENCY_SAMPLES):
+    """Mean single-message predict + confidence time in ms (as in predict_consensus)"""
+    rows = [X[i] for i in range(min(samples, X.shape[0]))]
+    model.predict(rows[0])
+    spam_probability(model, rows[0])
+    start = time.perf_counter()
+    for row in rows:
+        model.predict(row)
+        spam_probability(model, row)
+    return (time.perf_counter() - start) * 1000 / len(rows)
+
+
+def majority_vote(votes):
+    """
+    Majority of 0/1 votes (members x samples)
+
+    Ties go to the first member's vote, matching Counter.most_common in
+    _aggregate_votes.
+    """
+    spam = votes.sum(axis=0)
+    ham = votes.shape[0] - spam
+    return np.where(spam > ham, 1, np.where(ham > spam, 0, votes[0]))
+
+
+def weighted_vote(votes, weights):
+    """F1-weighted vote; ties ('unknown' in predict_weighted_consensus) count as ham"""
+    w = np.asarray(weights)[:, None]
+    spam = (votes * w).sum(axis=0)
+    ham = ((1 - votes) * w).sum(axis=0)
+    return (spam > ham).astype(int)
+
+
+def _scores(y_true, y_pred):
+    from sklearn.metrics import accuracy_score, f1_score
+    return {'accuracy': float(accuracy_score(y_true, y_pred)), 'f1': float(f1_score(y_true, y_pred))}
+
+
+def evaluate_subset(members, votes, f1_weights, y_test):
+    idx = list(members)
+    v = votes[idx]
+    return {
+        'majority': _scores(y_test, majority_vote(v)),
+        'weighted': _scores(y_test, weighted_vote(v, [f1_weights[i] for i in idx])),
+    }
+
+
+def _subsets(n, search, key):
+    """Candidate member index tuples"""
+    if search == 'exhaustive':
+        for size in range(1, n + 1):
+            yield from itertools.combinations(range(n), size)
+        return
+    # Greedy forward selection on the objective, then every prefix is a candidate
+    chosen, remaining = [], list(range(n))
+    while remaining:
+        best = max(remaining, key=lambda i: key(tuple(sorted(chosen + [i]))))
+        chosen.append(best)
+        remaining.remove(best)
+        yield tuple(sorted(chosen))
+
+
+def pareto_front(rows, score_key):
+    """Rows not dominated on (score up, latency down, memory down)"""
+    front = []
+    for r in rows:
+        dominated = any(
+            o[score_key] >= r[score_key] and o['latency_ms'] <= r['latency_ms'] and o['memory_bytes'] <= r['memory_bytes']
+            and (o[score_key] > r[score_key] or o['latency_ms'] < r['latency_ms'] or o['memory_bytes'] < r['memory_bytes'])
+            for o in rows
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: (r['latency_ms'], -r[score_key]))
+
+
+def select(objective='accuracy', voting='majority', search='auto', tolerance=0.0, min_members=3):
+    models = load_candidates()
+    names = list(models)
+    X_test, y_test = held_out_split()
+
+    print(f"⏱️  Profiling {len(names)} members...")
+    votes = np.vstack([models[n].predict(X_test).astype(int) for n in names])
+    f1_weights = [_scores(y_test, votes[i])['f1'] for i in range(len(names))]
+    latency = [profile_member(models[n], X_test) for n in names]
+    memory = [deep_size(models[n]) for n in names]
+
+    if search == 'auto':
+        search = 'exhaustive' if len(names) <= EXHAUSTIVE_LIMIT else 'greedy'
+    cache = {}
+
+    def evaluate(members):
+        if members not in cache:
+            cache[members] = evaluate_subset(members, votes, f1_weights, y_test)
+        return cache[members]
+
+    rows = []
+    for members in _subsets(len(names), search, lambda m: evaluate(m)[voting][objective]):
+        scores = evaluate(members)
+        rows.append({
+            'members': [names[i] for i in members],
+            'majority_accuracy': scores['majority']['accuracy'],
+            'majority_f1': scores['majority']['f1'],
+            'weighted_accuracy': scores['weighted']['accuracy'],
+            'weighted_f1': scores['weighted']['f1'],
+            'latency_ms': round(sum(latency[i] for i in members), 3),
+            'memory_bytes': int(sum(memory[i] for i in members)),
+        })
+
+    score_key = f"{voting}_{objective}"
+    full = next(r for r in rows if len(r['members']) == len(names))
+    target = full[score_key] - tolerance
+    eligible = [r for r in rows if r[score_key] >= target and len(r['members']) >= min(min_members, len(names))]
+    if not eligible:
+        eligible = [full]
+    chosen = min(eligible, key=lambda r: (r['latency_ms'], r['memory_bytes'], -r[score_key]))
+    return {
+        'search': search,
+        'objective': objective,
+        'voting': voting,
+        'tolerance': tolerance,
+        'min_members': min_members,
+        'members': {n: {'latency_ms': round(latency[i], 3), 'memory_bytes': int(memory[i]), 'f1': f1_weights[i]}
+                    for i, n in enumerate(names)},
+        'subsets_evaluated': len(rows),
+        'full': full,
+        'chosen': chosen,
+        'pareto': pareto_front(rows, score_key),
+    }
+
+
+def write_serving_config(result, path=None):
+    path = path or smd.SERVING_CONFIG_FILE
+    config = {
+        'members': result['chosen']['members'],
+        'voting': result['voting'],
+        'objective': result['objective'],
+        'score': result['chosen'][f"{result['voting']}_{result['objective']}"],
+        'full_score': result['full'][f"{result['voting']}_{result['objective']}"],
+        'latency_ms': result['chosen']['latency_ms'],
+        'full_latency_ms': result['full']['latency_ms'],
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+    }
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"✅ Serving config written to {path}")
+    return config
+
+
+def print_result(result):
+    key = f"{result['voting']}_{result['objective']}"
+    print(f"\n📊 {result['subsets_evaluated']} subsets ({result['search']}), "
+          f"objective {result['voting']} {result['objective']}")
+    print(f"{'score':>8} {'maj acc':>8} {'wtd f1':>8} {'ms':>8} {'MB':>7}  members")
+    for r in result['pareto']:
+        mark = ' ◀ chosen' if r['members'] == result['chosen']['members'] else ''
+        print(f"{r[key]:>8.4f} {r['majority_accuracy']:>8.4f} {r['weighted_f1']:>8.4f} {r['latency_ms']:>8.2f} "
+              f"{r['memory_bytes'] / 1024 / 1024:>7.2f}  {', '.join(r['members'])}{mark}")
+    full, chosen = result['full'], result['chosen']
+    print(f"\nFull set: {full[key]:.4f} at {full['latency_ms']:.2f} ms ({len(full['members'])} members)")
+    print(f"Chosen:   {chosen[key]:.4f} at {chosen['latency_ms']:.2f} ms, "
+          f"{chosen['memory_bytes'] / 1024 / 1024:.2f} MB: {', '.join(chosen['members'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pick the cheapest consensus subset that keeps accuracy')
+    parser.add_argument('--objective', choices=['accuracy', 'f1'], default='accuracy')
+    parser.add_argument('--voting', choices=['majority', 'weighted'], default='majority',
+                        help='Voting rule the serving config is chosen for (default: majority, as /api/predict)')
+    parser.add_argument('--search', choices=['auto', 'exhaustive', 'greedy'], default='auto')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Allowed drop from the full set score (default: 0)')
+    parser.add_argument('--min-members', type=int, default=3,
+                        help='Smallest subset that may be chosen, so it stays a consensus (default: 3)')
+    parser.add_argument('--output', help=f"Serving config path (default: {smd.SERVING_CONFIG_FILE})")
+    parser.add_argument('--dry-run', action='store_true', help='Do not write the serving config')
+    parser.add_argument('--json', dest='json_path', help='Write the full result here')
+    args = parser.parse_args()
+
+    result = select(args.objective, args.voting, args.search, args.tolerance, args.min_members)
+    print_result(result)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(result, f, indent=2)
+    if not args.dry_run:
+        write_serving_config(result, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,43 +12,27 @@ import time
 from typing import Dict, Tuple, List, Optional
 import numpy as np
 
-# NLTK imports for exact notebook preprocessing
+# NLTK preprocessing with data bundled in models/nltk_data (no downloads)
 try:
-    import nltk
     import string
-    from nltk.corpus import stopwords
-    from nltk.stem.porter import PorterStemmer
-
-    # Download required NLTK data if not present
-    try:
-        nltk.data.find('tokenizers/punkt')
-    except LookupError:
-        nltk.download('punkt')
-
     try:
-        nltk.data.find('corpora/stopwords')
-    except LookupError:
-        nltk.download('stopwords')
+        from backend.ml_model import nltk_resources
+    except ImportError:
+        import nltk_resources
 
     NLTK_AVAILABLE = True
-    ps = PorterStemmer()
+    ps = nltk_resources.get_stemmer()
+    STOP_WORDS = nltk_resources.load_stopwords()
 except ImportError:
     NLTK_AVAILABLE = False
     ps = None
+    STOP_WORDS = frozenset()
 
-# Explainable AI imports (optional)
-try:
-    import lime
-    import lime.lime_text
-    LIME_AVAILABLE = True
-except ImportError:
-    LIME_AVAILABLE = False
-
-try:
-    import shap
-    SHAP_AVAILABLE = True
-except ImportError:
-    SHAP_AVAILABLE = False
+# Explainable AI imports (optional). Only checked for here; lime and shap
+# are imported on first use because shap alone adds seconds to worker boot.
+import importlib.util
+LIME_AVAILABLE = importlib.util.find_spec('lime') is not None
+SHAP_AVAILABLE = importlib.util.find_spec('shap') is not None
 
 class SpamDetector:
     """
@@ -155,7 +139,7 @@ class SpamDetector:
             if NLTK_AVAILABLE:
                 # EXACT preprocessing from notebook transform_text function
                 text = text.lower()
-                text = nltk.word_tokenize(text)
+                text = nltk_resources.word_tokenize(text)
 
                 # Keep only alphanumeric tokens
                 y = []
@@ -168,7 +152,7 @@ class SpamDetector:
 
                 # Remove stopwords and punctuation
                 for i in text:
-                    if i not in stopwords.words('english') and i not in string.punctuation:
+                    if i not in STOP_WORDS and i not in string.punctuation:
                         y.append(i)
 
                 text = y[:]
@@ -389,6 +373,7 @@ class SpamDetector:
         """
         try:
             # Create LIME explainer with enhanced configuration
+            import lime.lime_text
             explainer = lime.lime_text.LimeTextExplainer(
                 class_names=['ham', 'spam'],
                 feature_selection='auto',  # Auto feature selection like Databricks
@@ -491,6 +476,8 @@ class SpamDetector:
             Dictionary containing SHAP explanation
         """
         try:
+            import shap
+
             # Preprocess and vectorize the message
             processed_message = self.preprocess_text(message)
             message_vector = self.vectorizer.transform([processed_message]).toarray()
@@ -1,43 +1,3 @@
-# --- Weighted Voting by F1 ---
-def predict_weighted_consensus(msg, metric='f1'):
-    load_models()
-    """
-    Weighted consensus using model F1 (or other metric) as weights.
-    Returns weighted spam probability and weighted majority.
-    """
-    clean = transform_text(msg)
-    features = tfidf.transform([clean])
-    weighted_probs = []
-    weights = []
-    model_votes = []
-    details = []
-    for name, r in model_results.items():
-        model = r["model"]
-        weight = r.get(metric, 1.0)
-        if hasattr(model, "predict_proba"):
-            proba = float(model.predict_proba(features)[0][1])
-        elif hasattr(model, "decision_function"):
-            df = model.decision_function(features)[0]
-            proba = float(1 / (1 + np.exp(-df)))
-            proba = float(np.clip(proba, 0.01, 0.99))
-        else:
-            continue
-        weighted_probs.append(proba * weight)
-        model_votes.append(('spam' if proba >= 0.5 else 'ham', weight))
-        weights.append(weight)
-        details.append((name, weight, proba, proba * weight))
-    if not weights:
-        return {"weighted_spam_prob": None, "weighted_majority": "Unknown", "weights": [], "details": []}
-    weighted_spam_prob = float(sum(weighted_probs) / sum(weights))
-    spam_weight = sum(w for v, w in model_votes if v == 'spam')
-    ham_weight = sum(w for v, w in model_votes if v == 'ham')
-    weighted_majority = 'spam' if spam_weight > ham_weight else 'ham' if ham_weight > spam_weight else 'unknown'
-    return {
-        "weighted_spam_prob": weighted_spam_prob,
-        "weighted_majority": weighted_majority,
-        "weights": weights,
-        "details": details
-    }
 """
 SMS Spam Detector - Multi-Model Evaluation Script
 
@@ -47,155 +7,356 @@ SMS Spam Detector - Multi-Model Evaluation Script
 - Prints detailed metrics and prediction for each model
 - Also evaluates the best ensemble (stacking or voting) and prints the same
 
+Serving (the API functions below) only loads the pickled bundle in
+models/ and imports what inference needs. pandas, the training estimators,
+XGBoost and LIME are imported on first use, so importing this module stays
+cheap for gunicorn workers.
+
 To run:
     python spam_detector_multi.py
 
 Author: [Ogboi Favour Ifeanyi]
 """
 
-import pandas as pd
-import numpy as np
-import re
+import json
+import logging
+import os
 import string
+import threading
+import time
+from contextlib import nullcontext
+
 import joblib
-import sys
-
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics import (
-    accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, classification_report
-)
-from sklearn.naive_bayes import MultinomialNB, GaussianNB, BernoulliNB
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.ensemble import (
-    RandomForestClassifier, AdaBoostClassifier, BaggingClassifier,
-    ExtraTreesClassifier, GradientBoostingClassifier, VotingClassifier, StackingClassifier
-)
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
+METRICS_FILE = os.path.join(MODEL_DIR, "model_metrics.json")
+# Members chosen by select_members.py; when present only these are loaded
+SERVING_CONFIG_FILE = os.environ.get("MODEL_SERVING_CONFIG", os.path.join(MODEL_DIR, "serving_config.json"))
+DATA_PATH = os.path.join(os.path.dirname(__file__), '../../ml_notebooks/main_notebook/spam.csv')
+# "student": answer from the distilled student (distill_student.py) and send only
+# messages inside its uncertainty band to the consensus; "ensemble" always runs every member
+SERVING_MODE = os.environ.get("MODEL_SERVING_MODE", "ensemble").lower()
+STUDENT_FILE = os.path.join(MODEL_DIR, "student.pkl")
+# Snapshots of the members updated from user feedback (online_learning.py); with
+# MODEL_ONLINE_UPDATES=true the live one replaces MultinomialNB (if served) and adds "SGD"
+ONLINE_DIR = os.environ.get("MODEL_ONLINE_DIR", os.path.join(MODEL_DIR, "online"))
+ONLINE_UPDATES = os.environ.get("MODEL_ONLINE_UPDATES", "false").lower() == "true"
+ONLINE_RELOAD_SECONDS = float(os.environ.get("MODEL_ONLINE_RELOAD_SECONDS", 30))
+ONLINE_ONLY_MEMBERS = ("SGD",)
+# Reuse recent sure verdicts for near-duplicate messages (near_duplicates.py)
+NEAR_DUPLICATES = os.environ.get("MODEL_NEAR_DUPLICATES", "false").lower() == "true"
+
+# Consensus members, in voting order; members without a .pkl in MODEL_DIR are skipped
+MODEL_NAMES = [
+    "SVC", "KNeighbors", "MultinomialNB", "DecisionTree", "LogisticRegression",
+    "RandomForest", "AdaBoost", "Bagging", "ExtraTrees", "GradientBoosting",
+    "VotingEnsemble", "StackingEnsemble", "XGBoost"
+]
+
+# --- Text Preprocessing (bundled NLTK data, loaded on first use) ---
 try:
-    from xgboost import XGBClassifier
+    from backend.ml_model import nltk_resources
+    from backend.ml_model.near_duplicates import NearDuplicateIndex
 except ImportError:
-    XGBClassifier = None
+    import nltk_resources
+    from near_duplicates import NearDuplicateIndex
+
+ps = None
+stop_words = None
+_word_tokenize = None
 
-# --- Text Preprocessing ---
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem.porter import PorterStemmer
+def _load_preprocessing():
+    global ps, stop_words, _word_tokenize
+    if _word_tokenize is not None:
+        return
+    ps = nltk_resources.get_stemmer()
+    stop_words = nltk_resources.load_stopwords()
+    _word_tokenize = nltk_resources.word_tokenize
 
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-ps = PorterStemmer()
-stop_words = set(stopwords.words('english'))
+def transform_text(text):
+    _load_preprocessing()
+    text = text.lower()
+    tokens = _word_tokenize(text)
+    tokens = [w for w in tokens if w.isalnum()]
+    tokens = [w for w in tokens if w not in stop_words and w not in string.punctuation]
+    tokens = [ps.stem(w) for w in tokens]
+    return " ".join(tokens)
 
 # --- Lazy Model Loading ---
+class ModelEngine:
+    """
+    One loaded bundle: vectorizer, consensus members and optional student
+
+    Serving functions read the module-level `engine` once per call and use
+    only that object, so swapping in a new bundle (model_registry.py) never
+    mixes one bundle's vectorizer with another's members, and a request
+    that started on the old bundle finishes on it. The old engine is freed
+    when the last such request drops its reference.
+    """
+
+    def __init__(self, tfidf, model_results, student=None, version="N/A", model_dir=None,
+                 bundle_results=None, online_version=None):
+        self.tfidf = tfidf
+        self.model_results = model_results
+        self.student = student
+        # Written to Prediction.model_version
+        self.version = version
+        self.model_dir = model_dir
+        # Members as loaded from model_dir, before any online snapshot replaced some
+        self.bundle_results = bundle_results if bundle_results is not None else model_results
+        self.online_version = online_version
+        # Verdicts are only reused within the bundle that produced them
+        self.near_duplicates = NearDuplicateIndex() if NEAR_DUPLICATES else None
+
+    @property
+    def bundle_version(self):
+        return self.version.split("+", 1)[0]
+
+# Legacy aliases of engine's fields, kept for the training and report scripts
 tfidf = None
 model_results = None
+student = None
+online_version = None
+engine = None
+_online_checked_at = 0.0
+_load_lock = threading.Lock()
+
+def load_bundle(model_dir=None):
+    """
+    Load a bundle directory into a new ModelEngine without serving it
+
+    Members are those of model_dir's own serving_config.json, so a shadow
+    or reloaded candidate is measured with the selection it would be served
+    with. The version is a hash of the files that were loaded (including
+    that config), so retraining into the same directory gives a new version
+    and copying a bundle does not.
+    """
+    import hashlib
+    model_dir = model_dir or MODEL_DIR
+    digest = hashlib.sha256()
+
+    def read(path):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return joblib.load(path)
+
+    tfidf_local = read(os.path.join(model_dir, "tfidf_vectorizer.pkl"))
+
+    # The bundle's own member selection, so a candidate is loaded as it would be served
+    config_file = _serving_config_file(model_dir)
+    if os.path.exists(config_file):
+        with open(config_file, "rb") as f:
+            digest.update(f.read())
+
+    model_results_local = {}
+    for name in _serving_members(config_file):
+        model_path = os.path.join(model_dir, f"{name}.pkl")
+        if not os.path.exists(model_path):
+            continue
+        try:
+            model = read(model_path)
+        except ImportError as e:
+            # e.g. XGBoost.pkl without xgboost installed
+            print(f"Skipping {name}: {e}")
+            continue
+        digest.update(name.encode())
+        model_results_local[name] = {"model": model}
+
+    # Test-set metrics written by save_all_models.py
+    metrics_file = os.path.join(model_dir, os.path.basename(METRICS_FILE))
+    if os.path.exists(metrics_file):
+        with open(metrics_file, "rb") as f:
+            raw = f.read()
+        digest.update(raw)
+        for name, metrics in json.loads(raw).items():
+            if name in model_results_local:
+                model_results_local[name].update(metrics)
+
+    student_local = None
+    if SERVING_MODE == "student":
+        student_local = _load_student(tfidf_local, os.path.join(model_dir, os.path.basename(STUDENT_FILE)))
+        if student_local is not None:
+            digest.update(student_local.get("vocabulary_hash", "").encode())
+    return ModelEngine(tfidf_local, model_results_local, student_local,
+                       version=digest.hexdigest()[:12], model_dir=model_dir)
+
+def install_engine(new_engine):
+    """Serve new_engine from now on; requests already running keep the engine they started with"""
+    global engine, tfidf, model_results, student, online_version, _online_checked_at
+    engine = new_engine
+    tfidf = new_engine.tfidf
+    model_results = new_engine.model_results
+    student = new_engine.student
+    online_version = new_engine.online_version
+    _online_checked_at = 0.0
 
 def load_models():
     """
     Loads all models and the TFIDF vectorizer from .pkl files in the models directory.
     """
-    global tfidf, model_results
-    if tfidf is not None and model_results is not None:
+    if engine is not None:
+        if ONLINE_UPDATES:
+            _maybe_reload_online()
+        return
+    with _load_lock:
+        if engine is not None:
+            return
+        install_engine(load_bundle())
+    if ONLINE_UPDATES:
+        _maybe_reload_online(force=True)
+
+def current_engine():
+    """The engine serving new requests (loads the bundle on first use)"""
+    load_models()
+    return engine
+
+def current_model_version():
+    """Bundle hash, plus "+<online snapshot>" when feedback-trained members are live"""
+    return current_engine().version
+
+def _maybe_reload_online(force=False):
+    """
+    Swap in the live online snapshot if CURRENT changed
+
+    Checked at most every MODEL_ONLINE_RELOAD_SECONDS. The snapshot's
+    members replace the bundle's in a new engine, so requests already
+    running finish on the old members.
+    """
+    global online_version, _online_checked_at
+    now = time.monotonic()
+    if not force and now - _online_checked_at < ONLINE_RELOAD_SECONDS:
         return
-    import os
-    import joblib
-
-    MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
-    tfidf_path = os.path.join(MODEL_DIR, "tfidf_vectorizer.pkl")
-    tfidf = joblib.load(tfidf_path)
-
-    model_names = [
-        "SVC", "KNeighbors", "MultinomialNB", "DecisionTree", "LogisticRegression",
-        "RandomForest", "AdaBoost", "Bagging", "ExtraTrees", "GradientBoosting",
-        "VotingEnsemble", "StackingEnsemble"
-    ]
-    # Add XGBoost if available
+    _online_checked_at = now
     try:
-        from xgboost import XGBClassifier
-        model_names.append("XGBoost")
+        with open(os.path.join(ONLINE_DIR, "CURRENT")) as f:
+            version = f.read().strip()
+    except OSError:
+        return
+    if not version or version == online_version:
+        return
+    with _load_lock:
+        base = engine
+        if base is None or version == base.online_version:
+            return
+        try:
+            with open(os.path.join(ONLINE_DIR, version, "manifest.json")) as f:
+                manifest = json.load(f)
+            online = {name: joblib.load(os.path.join(ONLINE_DIR, version, f"{name}.pkl"))
+                      for name in manifest["members"]}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load online snapshot {version}: {e}")
+            return
+        try:
+            from backend.ml_model.distill_student import vocabulary_hash
+        except ImportError:
+            from distill_student import vocabulary_hash
+        if manifest.get("vocabulary_hash") != vocabulary_hash(base.tfidf):
+            print(f"Online snapshot {version} was built on a different vectorizer; ignoring it")
+            online_version = version
+            return
+        results = dict(base.bundle_results)
+        # Members the serving config dropped stay dropped; SGD only exists online
+        online = {name: model for name, model in online.items()
+                  if name in base.bundle_results or name in ONLINE_ONLY_MEMBERS}
+        for name, model in online.items():
+            results[name] = {"model": model, **manifest.get("metrics", {}).get(name, {})}
+        install_engine(ModelEngine(
+            base.tfidf, results, base.student, version=f"{base.bundle_version}+{version}",
+            model_dir=base.model_dir, bundle_results=base.bundle_results, online_version=version,
+        ))
+        _online_checked_at = now
+    print(f"Serving online snapshot {version} ({', '.join(online)})")
+
+def _load_student(vectorizer, path=STUDENT_FILE):
+    """The distilled student bundle, if there is one fit on this vectorizer"""
+    if not os.path.exists(path):
+        print(f"MODEL_SERVING_MODE=student but {path} is missing; serving the full consensus")
+        return None
+    try:
+        from backend.ml_model.distill_student import vocabulary_hash
     except ImportError:
-        pass
-
-    model_results_local = {}
-    for name in model_names:
-        model_path = os.path.join(MODEL_DIR, f"{name}.pkl")
-        if os.path.exists(model_path):
-            model = joblib.load(model_path)
-            model_results_local[name] = {"model": model}
-    model_results = model_results_local
+        from distill_student import vocabulary_hash
+    bundle = joblib.load(path)
+    if bundle.get("vocabulary_hash") != vocabulary_hash(vectorizer):
+        print("student.pkl was fit on a different vectorizer; re-run distill_student. Serving the full consensus")
+        return None
+    print(f"Serving the distilled student; consensus only for {bundle['low']:.2f} < p < {bundle['high']:.2f}")
+    return bundle
+
+def _serving_config_file(model_dir):
+    """model_dir's serving_config.json; MODEL_SERVING_CONFIG overrides it for the serving MODEL_DIR only"""
+    if os.environ.get("MODEL_SERVING_CONFIG") and os.path.abspath(model_dir) == os.path.abspath(MODEL_DIR):
+        return SERVING_CONFIG_FILE
+    return os.path.join(model_dir, "serving_config.json")
+
+def _serving_members(config_file=None):
+    """MODEL_NAMES, narrowed to the serving config's members if there is one"""
+    config_file = config_file or SERVING_CONFIG_FILE
+    if not os.path.exists(config_file):
+        return MODEL_NAMES
+    with open(config_file) as f:
+        chosen = set(json.load(f).get("members") or [])
+    members = [name for name in MODEL_NAMES if name in chosen]
+    if not members:
+        print(f"{config_file} lists no known members; loading all models")
+        return MODEL_NAMES
+    print(f"Serving {len(members)} consensus members from {config_file}: {', '.join(members)}")
+    return members
+
+_warned_missing_metrics = set()
+
+def _ensure_metrics():
+    """
+    The serving engine; warns once per bundle about members without test-set metrics
 
-def transform_text(text):
-    text = text.lower()
-    tokens = nltk.word_tokenize(text)
-    tokens = [w for w in tokens if w.isalnum()]
-    tokens = [w for w in tokens if w not in stop_words and w not in string.punctuation]
-    tokens = [ps.stem(w) for w in tokens]
-    return " ".join(tokens)
+    Metrics (the voting weights) come from model_metrics.json, written by
+    save_all_models.py. Serving never evaluates: that would import pandas
+    and preprocess the whole dataset inside the first request. Members
+    without metrics vote with weight 1.0.
+    """
+    current = current_engine()
+    missing = [name for name, r in current.model_results.items() if "f1" not in r]
+    if missing and current.bundle_version not in _warned_missing_metrics:
+        _warned_missing_metrics.add(current.bundle_version)
+        logging.getLogger(__name__).warning(
+            "No model_metrics.json entry for %s in bundle %s; they vote with weight 1.0. "
+            "Run python -m backend.ml_model.save_all_models to write it.",
+            ", ".join(missing), current.bundle_version)
+    return current
+
+def evaluate_missing_metrics(current=None):
+    """
+    Evaluate members without metrics on the training split's test set (offline scripts only)
 
-# --- Load Data ---
-import os
-DATA_PATH = os.path.join(os.path.dirname(__file__), '../../ml_notebooks/main_notebook/spam.csv')
-df = pd.read_csv(DATA_PATH, encoding='latin-1')
-df = df.rename(columns={'v1': 'target', 'v2': 'text'})
-df = df[['target', 'text']].dropna()
-df['target'] = df['target'].map({'ham': 0, 'spam': 1})
-
-df['transformed_text'] = df['text'].apply(transform_text)
-
-# --- Feature Extraction ---
-tfidf = TfidfVectorizer(ngram_range=(1,2), max_features=4000)
-X = tfidf.fit_transform(df['transformed_text'])
-y = df['target'].values
-
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, stratify=y, random_state=42
-)
-
-# --- Model Definitions ---
-models = {
-    "SVC": SVC(kernel='sigmoid', gamma=1.0, probability=True, random_state=42),
-    "KNeighbors": KNeighborsClassifier(),
-    "MultinomialNB": MultinomialNB(),
-    "DecisionTree": DecisionTreeClassifier(max_depth=5, random_state=42),
-    "LogisticRegression": LogisticRegression(solver='liblinear', penalty='l1', random_state=42),
-    "RandomForest": RandomForestClassifier(n_estimators=50, random_state=42),
-    "AdaBoost": AdaBoostClassifier(n_estimators=50, random_state=42, algorithm='SAMME'),
-    "Bagging": BaggingClassifier(n_estimators=50, random_state=42),
-    "ExtraTrees": ExtraTreesClassifier(n_estimators=50, random_state=42),
-    "GradientBoosting": GradientBoostingClassifier(n_estimators=50, random_state=42),
-}
-if XGBClassifier is not None:
-    models["XGBoost"] = XGBClassifier(n_estimators=50, random_state=42, eval_metric='logloss')
-
-# --- Ensemble (Voting and Stacking) ---
-voting = VotingClassifier(
-    estimators=[
-        ('svc', models["SVC"]),
-        ('nb', models["MultinomialNB"]),
-        ('et', models["ExtraTrees"])
-    ],
-    voting='soft'
-)
-stacking = StackingClassifier(
-    estimators=[
-        ('svc', models["SVC"]),
-        ('nb', models["MultinomialNB"]),
-        ('et', models["ExtraTrees"])
-    ],
-    final_estimator=RandomForestClassifier(n_estimators=50, random_state=42)
-)
-
-ensembles = {
-    "VotingEnsemble": voting,
-    "StackingEnsemble": stacking
-}
-
-# --- Training/Fitting ---
-def fit_and_eval(model, name):
-    model.fit(X_train, y_train)
+    Same stratified split as save_all_models.py. Returns the engine.
+    """
+    current = current or current_engine()
+    results = current.model_results
+    missing = [name for name, r in results.items() if "f1" not in r]
+    if not missing:
+        return current
+    with _load_lock:
+        missing = [name for name, r in results.items() if "f1" not in r]
+        if not missing:
+            return current
+        from sklearn.model_selection import train_test_split
+        df = _load_dataset()
+        _, test_idx = train_test_split(
+            np.arange(len(df)), test_size=0.2, stratify=df['target'].values, random_state=42
+        )
+        X_test = current.tfidf.transform(df['transformed_text'].values[test_idx])
+        y_test = df['target'].values[test_idx]
+        for name in missing:
+            results[name].update(evaluate_model(results[name]["model"], X_test, y_test))
+    return current
+
+def evaluate_model(model, X_test, y_test):
+    """Test-set metrics for a fitted model (JSON-serialisable)."""
+    from sklearn.metrics import (
+        accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, classification_report
+    )
     y_pred = model.predict(X_test)
     # Improved confidence calculation for SVM and models without predict_proba
     if hasattr(model, "predict_proba"):
@@ -207,33 +368,210 @@ def fit_and_eval(model, name):
         y_proba = np.clip(y_proba, 0.01, 0.99)
     else:
         y_proba = None
-    acc = accuracy_score(y_test, y_pred)
-    prec = precision_score(y_test, y_pred)
-    rec = recall_score(y_test, y_pred)
-    f1 = f1_score(y_test, y_pred)
-    roc = roc_auc_score(y_test, y_proba) if y_proba is not None else None
-    report = classification_report(y_test, y_pred, target_names=['Ham', 'Spam'])
     return {
-        "model": model,
-        "accuracy": acc,
-        "precision": prec,
-        "recall": rec,
-        "f1": f1,
-        "roc_auc": roc,
-        "classification_report": report
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "precision": float(precision_score(y_test, y_pred)),
+        "recall": float(recall_score(y_test, y_pred)),
+        "f1": float(f1_score(y_test, y_pred)),
+        "roc_auc": float(roc_auc_score(y_test, y_proba)) if y_proba is not None else None,
+        "classification_report": classification_report(y_test, y_pred, target_names=['Ham', 'Spam'])
     }
 
-model_results = {}
-for name, model in models.items():
-    model_results[name] = fit_and_eval(model, name)
-for name, model in ensembles.items():
-    model_results[name] = fit_and_eval(model, name)
+def write_metrics_file(results, path=METRICS_FILE):
+    """Persist per-model metrics next to the bundle so serving never has to evaluate."""
+    metrics = {name: {k: v for k, v in r.items() if k != "model"} for name, r in results.items()}
+    with open(path, "w") as f:
+        json.dump(metrics, f, indent=2)
+    print(f"Saved model metrics to {path}")
+
+# --- Load Data ---
+def _load_dataset():
+    """spam.csv with transformed_text, from the training feature cache"""
+    try:
+        from backend.ml_model import feature_cache
+    except ImportError:
+        import feature_cache
+    return feature_cache.load_corpus(DATA_PATH)
+
+# --- Training (interactive script only) ---
+def train_all_models():
+    """
+    Fit the vectorizer and every model on spam.csv and evaluate them on the test split.
+
+    Replaces the loaded bundle in this process with the freshly trained models.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import SVC
+    from sklearn.tree import DecisionTreeClassifier
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.ensemble import (
+        RandomForestClassifier, AdaBoostClassifier, BaggingClassifier,
+        ExtraTreesClassifier, GradientBoostingClassifier, VotingClassifier, StackingClassifier
+    )
+    try:
+        from xgboost import XGBClassifier
+    except ImportError:
+        XGBClassifier = None
+
+    try:
+        from backend.ml_model import feature_cache
+    except ImportError:
+        import feature_cache
+
+    df = _load_dataset()
+
+    # --- Feature Extraction ---
+    tfidf_local, X = feature_cache.load_features(df, max_features=4000, ngram_range=(1,2))
+    y = df['target'].values
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, stratify=y, random_state=42
+    )
+
+    # --- Model Definitions ---
+    models = {
+        "SVC": SVC(kernel='sigmoid', gamma=1.0, probability=True, random_state=42),
+        "KNeighbors": KNeighborsClassifier(),
+        "MultinomialNB": MultinomialNB(),
+        "DecisionTree": DecisionTreeClassifier(max_depth=5, random_state=42),
+        "LogisticRegression": LogisticRegression(solver='liblinear', penalty='l1', random_state=42),
+        "RandomForest": RandomForestClassifier(n_estimators=50, random_state=42),
+        "AdaBoost": AdaBoostClassifier(n_estimators=50, random_state=42, algorithm='SAMME'),
+        "Bagging": BaggingClassifier(n_estimators=50, random_state=42),
+        "ExtraTrees": ExtraTreesClassifier(n_estimators=50, random_state=42),
+        "GradientBoosting": GradientBoostingClassifier(n_estimators=50, random_state=42),
+    }
+    if XGBClassifier is not None:
+        models["XGBoost"] = XGBClassifier(n_estimators=50, random_state=42, eval_metric='logloss')
+
+    # --- Ensemble (Voting and Stacking) ---
+    voting = VotingClassifier(
+        estimators=[
+            ('svc', models["SVC"]),
+            ('nb', models["MultinomialNB"]),
+            ('et', models["ExtraTrees"])
+        ],
+        voting='soft'
+    )
+    stacking = StackingClassifier(
+        estimators=[
+            ('svc', models["SVC"]),
+            ('nb', models["MultinomialNB"]),
+            ('et', models["ExtraTrees"])
+        ],
+        final_estimator=RandomForestClassifier(n_estimators=50, random_state=42)
+    )
+
+    ensembles = {
+        "VotingEnsemble": voting,
+        "StackingEnsemble": stacking
+    }
+
+    # --- Training/Fitting ---
+    def fit_and_eval(model, name):
+        model.fit(X_train, y_train)
+        return {"model": model, **evaluate_model(model, X_test, y_test)}
+
+    results = {}
+    for name, model in models.items():
+        results[name] = fit_and_eval(model, name)
+    for name, model in ensembles.items():
+        results[name] = fit_and_eval(model, name)
+
+    install_engine(ModelEngine(tfidf_local, results, version="trained"))
+    return results
 
 # --- API Functions ---
 
-def explain_consensus_prediction(msg, num_features=5):
+def _reused(hit):
+    """A near-duplicate index hit as a result; the per-model rows are the matched message's"""
+    result, distance = hit
+    return {**result, "served_by": "near_duplicate", "near_duplicate_distance": distance,
+            "model_results_from": "matched_message"}
+
+# --- Weighted Voting by F1 ---
+def predict_weighted_consensus(msg, metric='f1', timer=None):
     load_models()
     """
+    Weighted consensus using model F1 (or other metric) as weights.
+    Returns weighted spam probability and weighted majority.
+    """
+    current = _ensure_metrics()
+    with _stage(timer, 'weighted:preprocess'):
+        clean = transform_text(msg)
+    index = current.near_duplicates
+    if index is not None:
+        with _stage(timer, 'weighted:near_duplicates'):
+            hit = index.get(clean, f"weighted:{metric}")
+        if hit is not None:
+            return _reused(hit)
+        result = _weighted_consensus(current, clean, metric, timer)
+        index.put(clean, f"weighted:{metric}", result)
+        return result
+    return _weighted_consensus(current, clean, metric, timer)
+
+def _weighted_consensus(current, clean, metric='f1', timer=None):
+    """F1-weighted vote of an engine's members on one preprocessed message"""
+    student = current.student
+    with _stage(timer, 'weighted:vectorize'):
+        features = current.tfidf.transform([clean])
+    if student is not None and metric == 'f1':
+        # The student was distilled from exactly this F1-weighted probability
+        with _stage(timer, 'weighted:model:Student'):
+            proba = float(student["model"].predict_proba(features)[0, 1])
+        if not student["low"] < proba < student["high"]:
+            return {
+                "weighted_spam_prob": proba,
+                "weighted_majority": 'spam' if proba >= 0.5 else 'ham',
+                "weights": [1.0],
+                "details": [("Student", 1.0, proba, proba)]
+            }
+    weighted_probs = []
+    weights = []
+    model_votes = []
+    details = []
+    for name, r in current.model_results.items():
+        model = r["model"]
+        weight = r.get(metric, 1.0)
+        with _stage(timer, f'weighted:model:{name}'):
+            if hasattr(model, "predict_proba"):
+                proba = float(model.predict_proba(features)[0][1])
+            elif hasattr(model, "decision_function"):
+                df = model.decision_function(features)[0]
+                proba = float(1 / (1 + np.exp(-df)))
+                proba = float(np.clip(proba, 0.01, 0.99))
+            else:
+                continue
+        weighted_probs.append(proba * weight)
+        model_votes.append(('spam' if proba >= 0.5 else 'ham', weight))
+        weights.append(weight)
+        details.append((name, weight, proba, proba * weight))
+    if not weights:
+        return {"weighted_spam_prob": None, "weighted_majority": "Unknown", "weights": [], "details": []}
+    weighted_spam_prob = float(sum(weighted_probs) / sum(weights))
+    spam_weight = sum(w for v, w in model_votes if v == 'spam')
+    ham_weight = sum(w for v, w in model_votes if v == 'ham')
+    weighted_majority = 'spam' if spam_weight > ham_weight else 'ham' if ham_weight > spam_weight else 'unknown'
+    return {
+        "weighted_spam_prob": weighted_spam_prob,
+        "weighted_majority": weighted_majority,
+        "weights": weights,
+        "details": details
+    }
+
+def _feature_index(vectorizer, term):
+    """Column of term in a TF-IDF (vocabulary) or hashed vectorizer, or None"""
+    if hasattr(vectorizer, "vocabulary_"):
+        return vectorizer.vocabulary_.get(term)
+    return vectorizer.feature_index(term)
+
+def explain_consensus_prediction(msg, num_features=5):
+    current = current_engine()
+    tfidf = current.tfidf
+    model_results = current.model_results
+    """
     Return the top spam/ham indicator words for the consensus prediction.
     Uses LIME if available, else falls back to Naive Bayes feature log probabilities.
     """
@@ -278,13 +616,12 @@ def explain_consensus_prediction(msg, num_features=5):
         }
     except Exception as e:
         # Fallback to NB feature log prob explanation
-        feature_names = tfidf.get_feature_names_out()
         if hasattr(nb_model, "feature_log_prob_"):
             log_prob = nb_model.feature_log_prob_
             word_scores = []
             for word in clean.split():
-                if word in feature_names:
-                    idx = list(feature_names).index(word)
+                idx = _feature_index(tfidf, word)
+                if idx is not None:
                     spam_score = log_prob[1][idx]
                     ham_score = log_prob[0][idx]
                     diff = spam_score - ham_score
@@ -313,39 +650,132 @@ def explain_consensus_prediction(msg, num_features=5):
 
 
 def get_best_accuracy():
-    load_models()
     """Return the highest accuracy among all models."""
-    return max([r["accuracy"] for r in model_results.values()])
+    return max([r["accuracy"] for r in _ensure_metrics().model_results.values() if "accuracy" in r], default=None)
 
 def get_all_metrics():
-    load_models()
     """Return all metrics for all models."""
-    return {name: {k: v for k, v in r.items() if k != "model"} for name, r in model_results.items()}
+    return {name: {k: v for k, v in r.items() if k != "model"} for name, r in _ensure_metrics().model_results.items()}
+
+def _stage(timer, name):
+    """timer.stage(name) when a StageTimer is passed, else a no-op"""
+    return timer.stage(name) if timer is not None else nullcontext()
 
-def predict_consensus(msg):
+def predict_consensus(msg, timer=None):
     load_models()
     """Return consensus prediction and per-model predictions for a message."""
-    clean = transform_text(msg)
-    features = tfidf.transform([clean])
-    model_results_dict = {}
-    for name, r in model_results.items():
+    return predict_consensus_batch([msg], timer=timer)[0]
+
+def predict_consensus_batch(msgs, timer=None, engine=None):
+    """
+    Return consensus predictions for a list of messages.
+
+    All messages are vectorized together and each model scores the whole
+    matrix in one call. Each item has the same structure as predict_consensus.
+    Pass a StageTimer to record preprocess, vectorize, model:<name> and vote stages.
+
+    With MODEL_SERVING_MODE=student, messages the distilled student is sure
+    about are answered by it alone (model_results holds only "Student") and
+    the rest go to the consensus; each item then also has "served_by".
+    Every item carries the "model_version" of the bundle that scored it.
+    Pass engine to score with a bundle that is not being served (canary
+    checks, shadow evaluation); that always runs the models.
+
+    With MODEL_NEAR_DUPLICATES=true, a message close to one the serving
+    engine was recently sure about reuses that verdict (served_by
+    "near_duplicate", plus "near_duplicate_distance" in bits); its
+    model_results are the matched message's (model_results_from
+    "matched_message").
+    """
+    current = engine or current_engine()
+    if not msgs:
+        return []
+    with _stage(timer, 'preprocess'):
+        clean = [transform_text(m) for m in msgs]
+    index = current.near_duplicates if engine is None else None
+    if index is None:
+        return _score_clean(current, clean, timer)
+
+    results = [None] * len(msgs)
+    misses = []
+    with _stage(timer, 'near_duplicates'):
+        for i, text in enumerate(clean):
+            hit = index.get(text)
+            if hit is None:
+                misses.append(i)
+            else:
+                results[i] = _reused(hit)
+    if misses:
+        for i, item in zip(misses, _score_clean(current, [clean[i] for i in misses], timer)):
+            results[i] = item
+            index.put(clean[i], "consensus", item)
+    return results
+
+def _score_clean(current, clean, timer=None):
+    """predict_consensus_batch on already preprocessed messages, always running the models"""
+    with _stage(timer, 'vectorize'):
+        features = current.tfidf.transform(clean)
+    student = current.student
+    if student is None:
+        return _consensus_results(current, features, timer)
+
+    with _stage(timer, 'model:Student'):
+        probs = student["model"].predict_proba(features)[:, 1]
+    uncertain = np.flatnonzero((probs > student["low"]) & (probs < student["high"]))
+    results = [None] * len(clean)
+    if len(uncertain):
+        for i, item in zip(uncertain, _consensus_results(current, features[uncertain], timer)):
+            item["served_by"] = "ensemble"
+            results[i] = item
+    with _stage(timer, 'vote'):
+        for i, p in enumerate(probs):
+            if results[i] is not None:
+                continue
+            model_results_dict = {"Student": {"prediction": "spam" if p >= 0.5 else "ham", "confidence": float(p)}}
+            results[i] = {
+                "consensus": _aggregate_votes(model_results_dict),
+                "model_results": model_results_dict,
+                "served_by": "student",
+                "model_version": current.version
+            }
+    return results
+
+def _consensus_results(current, features, timer=None):
+    """Score a feature matrix with every consensus member of an engine and vote per row"""
+    n = features.shape[0]
+    per_model = {}
+    for name, r in current.model_results.items():
         model = r["model"]
-        pred = model.predict(features)[0]
-        # Improved confidence calculation for SVM and models without predict_proba
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(features)[0][1]
-            conf = float(proba)
-        elif hasattr(model, "decision_function"):
-            df = model.decision_function(features)[0]
-            conf = float(1 / (1 + np.exp(-df)))
-            conf = float(np.clip(conf, 0.01, 0.99))
-        else:
-            conf = None
-        model_results_dict[name] = {
-            "prediction": "spam" if pred == 1 else "ham",
-            "confidence": conf
-        }
-    # Consensus
+        with _stage(timer, f'model:{name}'):
+            preds = model.predict(features)
+            # Improved confidence calculation for SVM and models without predict_proba
+            if hasattr(model, "predict_proba"):
+                confs = [float(p) for p in model.predict_proba(features)[:, 1]]
+            elif hasattr(model, "decision_function"):
+                df = model.decision_function(features)
+                confs = [float(c) for c in np.clip(1 / (1 + np.exp(-df)), 0.01, 0.99)]
+            else:
+                confs = [None] * n
+        per_model[name] = (preds, confs)
+    results = []
+    with _stage(timer, 'vote'):
+        for i in range(n):
+            model_results_dict = {
+                name: {
+                    "prediction": "spam" if preds[i] == 1 else "ham",
+                    "confidence": confs[i]
+                }
+                for name, (preds, confs) in per_model.items()
+            }
+            results.append({
+                "consensus": _aggregate_votes(model_results_dict),
+                "model_results": model_results_dict,
+                "model_version": current.version
+            })
+    return results
+
+def _aggregate_votes(model_results_dict):
+    """Combine per-model predictions into the consensus summary."""
     from collections import Counter
     votes = [r["prediction"].capitalize() for r in model_results_dict.values() if r["prediction"] in ["spam", "ham"]]
     vote_counts = Counter(votes)
@@ -371,20 +801,19 @@ def predict_consensus(msg):
     # Truthful consensus confidence: agreement * avg_majority_conf
     consensus_confidence = round(agreement_percentage * avg_majority_conf * 100, 1)
     return {
-        "consensus": {
-            "majority_vote": majority,
-            "weighted_vote": weighted_vote,
-            "confidence": consensus_confidence,
-            "majority_count": majority_count,
-            "total_votes": total_votes,
-            "spam_votes": spam_votes,
-            "ham_votes": ham_votes
-        },
-        "model_results": model_results_dict
+        "majority_vote": majority,
+        "weighted_vote": weighted_vote,
+        "confidence": consensus_confidence,
+        "majority_count": majority_count,
+        "total_votes": total_votes,
+        "spam_votes": spam_votes,
+        "ham_votes": ham_votes
     }
 
 # --- Main Interactive Loop ---
 if __name__ == "__main__":
+    print("Training all models on spam.csv...")
+    train_all_models()
     print("All models loaded and ready.")
     print("Enter an SMS message to test all models (or type 'exit' to quit):")
     history = []
@@ -0,0 +1,308 @@
+"""
+Hyperparameter search for the consensus members
+
+Successive halving over each member's grid, run once per TF-IDF setting
+(max_features x ngram_range) on the cached feature matrices
+(feature_cache.py). Every candidate is fit on a small stratified sample of
+the training split and scored on a validation slice of it. The best
+1/--eta go on to a sample --eta times larger, until the survivors are fit
+on the whole training split. The held-out test split is never used.
+
+Objective: validation F1 - --latency-weight x single-message latency (ms,
+predict + confidence, as in select_members).
+
+Every trial is stored in a SQLite database (--db, default
+cache/tuning.sqlite), keyed by dataset, preprocessing, model, parameters,
+TF-IDF setting and sample size. Re-runs and overlapping grids reuse
+stored trials instead of fitting again.
+
+The bundle has one vectorizer, so the export picks the TF-IDF setting
+with the best mean member score, plus each member's winner under it. It
+writes models/training_config.json, which save_all_models.py applies.
+
+    python -m backend.ml_model.tune_hyperparameters
+    python -m backend.ml_model.tune_hyperparameters --models SVC,MultinomialNB --max-features 4000 --dry-run
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+
+try:
+    from backend.ml_model import feature_cache, save_all_models
+    from backend.ml_model.select_members import profile_member
+except ImportError:
+    import feature_cache
+    import save_all_models
+    from select_members import profile_member
+
+DB_PATH = os.path.join(feature_cache.CACHE_DIR, "tuning.sqlite")
+LATENCY_SAMPLES = 30
+
+TFIDF_GRID = {
+    'max_features': [2000, 4000, 8000],
+    'ngram_range': [(1, 1), (1, 2)],
+}
+# Parameters set on top of build_models(); probability=True stays on SVC (serving needs its confidence)
+SEARCH_SPACE = {
+    "SVC": {'kernel': ['sigmoid', 'linear', 'rbf'], 'C': [0.5, 1.0, 2.0], 'gamma': [1.0, 'scale']},
+    "KNeighbors": {'n_neighbors': [3, 5, 9], 'weights': ['uniform', 'distance']},
+    "MultinomialNB": {'alpha': [0.01, 0.1, 0.5, 1.0]},
+    "DecisionTree": {'max_depth': [5, 10, 20, None]},
+    "LogisticRegression": {'C': [0.5, 1.0, 4.0, 10.0], 'penalty': ['l1', 'l2']},
+    "RandomForest": {'n_estimators': [25, 50, 100], 'max_depth': [None, 20]},
+    "AdaBoost": {'n_estimators': [25, 50, 100], 'learning_rate': [0.5, 1.0]},
+    "Bagging": {'n_estimators': [10, 25, 50]},
+    "ExtraTrees": {'n_estimators': [25, 50, 100], 'max_depth': [None, 20]},
+    "GradientBoosting": {'n_estimators': [50, 100], 'learning_rate': [0.1, 0.3]},
+    "XGBoost": {'n_estimators': [50, 100], 'max_depth': [3, 6], 'learning_rate': [0.1, 0.3]},
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trial_key TEXT UNIQUE NOT NULL,
+    corpus TEXT NOT NULL,
+    model TEXT NOT NULL,
+    params TEXT NOT NULL,
+    tfidf TEXT NOT NULL,
+    n_samples INTEGER NOT NULL,
+    f1 REAL,
+    accuracy REAL,
+    latency_ms REAL,
+    fit_s REAL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trials_model ON trials (corpus, model);
+"""
+
+
+def grid(space):
+    """Every combination of a {param: [values]} grid as dicts"""
+    keys = sorted(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def objective(trial, latency_weight):
+    return trial['f1'] - latency_weight * trial['latency_ms']
+
+
+class TrialStore:
+    """SQLite store of finished trials"""
+
+    def __init__(self, path=DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    @staticmethod
+    def key(corpus, model, params, tfidf, n_samples, seed):
+        payload = json.dumps([corpus, model, params, tfidf, n_samples, seed], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, trial_key):
+        row = self.conn.execute(
+            "SELECT f1, accuracy, latency_ms, fit_s FROM trials WHERE trial_key = ?", (trial_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'f1': row[0], 'accuracy': row[1], 'latency_ms': row[2], 'fit_s': row[3], 'cached': True}
+
+    def put(self, trial_key, corpus, model, params, tfidf, n_samples, result):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO trials (trial_key, corpus, model, params, tfidf, n_samples, f1, accuracy, "
+            "latency_ms, fit_s, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (trial_key, corpus, model, json.dumps(params, sort_keys=True, default=str),
+             json.dumps(tfidf, sort_keys=True), n_samples, result['f1'], result['accuracy'],
+             result['latency_ms'], result['fit_s'], datetime.utcnow().isoformat(timespec='seconds') + 'Z')
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def split_indices(y, seed=42, validation_size=0.2):
+    """(fit, validation) indices inside the training split that save_all_models uses"""
+    from sklearn.model_selection import train_test_split
+    train_idx, _ = train_test_split(np.arange(len(y)), test_size=0.2, stratify=y, random_state=42)
+    fit_idx, val_idx = train_test_split(
+        train_idx, test_size=validation_size, stratify=y[train_idx], random_state=seed
+    )
+    # Fixed order, so every rung's sample contains the previous one
+    rng = np.random.RandomState(seed)
+    return rng.permutation(fit_idx), val_idx
+
+
+def stratified_prefix(order, y, n):
+    """First n of order, keeping the class ratio of the whole order"""
+    if n >= len(order):
+        return order
+    picked = []
+    for label in np.unique(y[order]):
+        members = order[y[order] == label]
+        share = max(1, round(n * len(members) / len(order)))
+        picked.append(members[:share])
+    return np.concatenate(picked)
+
+
+def run_trial(model, X, y, fit_idx, val_idx):
+    from sklearn.metrics import accuracy_score, f1_score
+    start = time.perf_counter()
+    model.fit(X[fit_idx], y[fit_idx])
+    fit_s = time.perf_counter() - start
+    X_val = X[val_idx]
+    y_pred = model.predict(X_val)
+    return {
+        'f1': float(f1_score(y[val_idx], y_pred)),
+        'accuracy': float(accuracy_score(y[val_idx], y_pred)),
+        'latency_ms': float(profile_member(model, X_val, samples=LATENCY_SAMPLES)),
+        'fit_s': round(fit_s, 3),
+        'cached': False,
+    }
+
+
+def successive_halving(evaluate, candidates, n_max, min_resource=300, eta=3):
+    """
+    Evaluate candidates on growing samples, keeping the best 1/eta each rung
+
+    evaluate(candidate, n) returns a trial dict with a 'score'. Returns
+    (best candidate, its trial at n_max, every (rung, n, candidate, trial)).
+    """
+    rungs = math.ceil(math.log(len(candidates), eta)) + 1 if len(candidates) > 1 else 1
+    sizes = []
+    for r in range(rungs):
+        n = max(min(min_resource, n_max), int(round(n_max / eta ** (rungs - 1 - r))))
+        if n not in sizes:
+            sizes.append(n)
+    survivors = list(candidates)
+    history = []
+    for rung, n in enumerate(sizes):
+        trials = [(c, evaluate(c, n)) for c in survivors]
+        history.extend((rung, n, c, t) for c, t in trials)
+        trials.sort(key=lambda ct: ct[1]['score'], reverse=True)
+        survivors = [c for c, _ in trials[:max(1, math.ceil(len(trials) / eta))]]
+    return trials[0][0], trials[0][1], history
+
+
+def search(models=None, tfidf_grid=None, eta=3, min_resource=300, latency_weight=0.002,
+           seed=42, n_jobs=1, db_path=DB_PATH):
+    """Winners per (TF-IDF setting, member) plus the chosen TF-IDF setting"""
+    from sklearn.base import clone
+    df = feature_cache.load_corpus()
+    y = df['target'].values
+    corpus = os.path.basename(feature_cache.corpus_dir())
+    fit_order, val_idx = split_indices(y, seed)
+    base = save_all_models.build_models(n_jobs)
+    names = [n for n in (models or list(SEARCH_SPACE)) if n in base]
+    store = TrialStore(db_path)
+    settings = grid(tfidf_grid or TFIDF_GRID)
+    results = []
+    try:
+        for tfidf in settings:
+            _, X = feature_cache.load_features(df, tfidf['max_features'], tfidf['ngram_range'])
+            tfidf_key = {'max_features': tfidf['max_features'], 'ngram_range': list(tfidf['ngram_range'])}
+            for name in names:
+                candidates = grid(SEARCH_SPACE[name])
+
+                def evaluate(params, n, name=name, X=X, tfidf_key=tfidf_key):
+                    key = TrialStore.key(corpus, name, params, tfidf_key, n, seed)
+                    trial = store.get(key)
+                    if trial is None:
+                        model = clone(base[name]).set_params(**params)
+                        trial = run_trial(model, X, y, stratified_prefix(fit_order, y, n), val_idx)
+                        store.put(key, corpus, name, params, tfidf_key, n, trial)
+                    trial['score'] = objective(trial, latency_weight)
+                    return trial
+
+                best, trial, history = successive_halving(evaluate, candidates, len(fit_order), min_resource, eta)
+                fitted = sum(1 for *_, t in history if not t['cached'])
+                print(f"  {name:<20} {tfidf_key} -> {best}  f1 {trial['f1']:.4f}  {trial['latency_ms']:.3f} ms  "
+                      f"({len(history)} trials, {fitted} fitted)")
+                results.append({'tfidf': tfidf_key, 'model': name, 'params': best, **trial})
+    finally:
+        store.close()
+
+    by_setting = {}
+    for r in results:
+        by_setting.setdefault(json.dumps(r['tfidf'], sort_keys=True), []).append(r)
+    chosen_key = max(by_setting, key=lambda k: float(np.mean([r['score'] for r in by_setting[k]])))
+    return {
+        'latency_weight': latency_weight,
+        'eta': eta,
+        'min_resource': min_resource,
+        'seed': seed,
+        'settings': {k: float(np.mean([r['score'] for r in v])) for k, v in by_setting.items()},
+        'tfidf': json.loads(chosen_key),
+        'models': {r['model']: r for r in by_setting[chosen_key]},
+        'results': results,
+    }
+
+
+def export_config(result, path=None):
+    """Write the winning TF-IDF setting and member parameters for save_all_models.py"""
+    path = path or save_all_models.TRAINING_CONFIG
+    config = {
+        'tfidf': result['tfidf'],
+        'models': {name: r['params'] for name, r in result['models'].items()},
+        'objective': {'latency_weight': result['latency_weight'],
+                      'scores': {name: round(r['score'], 4) for name, r in result['models'].items()}},
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+    }
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"✅ Training config written to {path}")
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Successive-halving hyperparameter search for the consensus members')
+    parser.add_argument('--models', help='Comma-separated members to tune (default: all)')
+    parser.add_argument('--max-features', help='Comma-separated TF-IDF max_features values (default: 2000,4000,8000)')
+    parser.add_argument('--ngram', action='append', choices=['1,1', '1,2', '1,3'],
+                        help='TF-IDF ngram_range to try; repeat for several (default: 1,1 and 1,2)')
+    parser.add_argument('--eta', type=int, default=3, help='Keep 1/eta of the candidates per rung (default: 3)')
+    parser.add_argument('--min-resource', type=int, default=300, help='Training rows in the first rung (default: 300)')
+    parser.add_argument('--latency-weight', type=float, default=0.002,
+                        help='F1 given up per ms of single-message latency (default: 0.002)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--n-jobs', type=int, default=1)
+    parser.add_argument('--db', default=DB_PATH, help=f"Trial store (default: {DB_PATH})")
+    parser.add_argument('--output', help=f"Config path (default: {save_all_models.TRAINING_CONFIG})")
+    parser.add_argument('--json', dest='json_path', help='Write the full result here')
+    parser.add_argument('--dry-run', action='store_true', help='Do not write the training config')
+    args = parser.parse_args()
+
+    tfidf_grid = dict(TFIDF_GRID)
+    if args.max_features:
+        tfidf_grid['max_features'] = [int(v) for v in args.max_features.split(',')]
+    if args.ngram:
+        tfidf_grid['ngram_range'] = [tuple(int(v) for v in n.split(',')) for n in args.ngram]
+    models = args.models.split(',') if args.models else None
+
+    print(f"🔎 Successive halving (eta={args.eta}) over {len(grid(tfidf_grid))} TF-IDF setting(s)")
+    result = search(models, tfidf_grid, args.eta, args.min_resource, args.latency_weight,
+                    args.seed, args.n_jobs, args.db)
+    print("\nMean member score per TF-IDF setting:")
+    for setting, score in sorted(result['settings'].items(), key=lambda kv: -kv[1]):
+        print(f"  {score:.4f}  {setting}")
+    print(f"Chosen TF-IDF: {result['tfidf']}")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(result, f, indent=2, default=str)
+    if not args.dry_run:
+        export_config(result, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 import uuid
 import secrets
+import hashlib
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Initialize SQLAlchemy
@@ -111,13 +113,63 @@ class PasswordResetToken(db.Model):
     def __repr__(self):
         return f'<PasswordResetToken {self.token[:8]}...>'
 
+class Message(db.Model):
+    """Distinct SMS body, stored once and shared by every prediction of it"""
+    __tablename__ = 'messages'
+
+    content_hash = db.Column(db.String(64), primary_key=True)  # sha256 of the text
+    text = db.Column(db.Text, nullable=False)
+    # Cached verdict from the most recent prediction of this text
+    prediction = db.Column(db.String(10), nullable=True)
+    confidence = db.Column(db.Float, nullable=True)
+    model_version = db.Column(db.String(50), nullable=True)
+    seen_count = db.Column(db.Integer, default=0, nullable=False)
+    first_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @staticmethod
+    def hash_text(text):
+        """Content hash used as the primary key"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_or_create(cls, text):
+        """Return the row for this text, inserting it if it is new"""
+        content_hash = cls.hash_text(text)
+        message = db.session.get(cls, content_hash)
+        if message is not None:
+            return message
+        try:
+            # Savepoint so a concurrent insert of the same text does not
+            # roll back the caller's transaction
+            with db.session.begin_nested():
+                message = cls(content_hash=content_hash, text=text)
+                db.session.add(message)
+        except IntegrityError:
+            message = db.session.get(cls, content_hash)
+        return message
+
+    def record_verdict(self, prediction, confidence, model_version=None):
+        """Cache the latest verdict and count the sighting"""
+        self.prediction = prediction
+        self.confidence = confidence
+        self.model_version = model_version
+        self.seen_count = (self.seen_count or 0) + 1
+        self.last_seen = datetime.utcnow()
+
+    def __repr__(self):
+        return f'<Message {self.content_hash[:12]}...>'
+
 class Prediction(db.Model):
     """Prediction model for storing SMS spam detection results"""
     __tablename__ = 'predictions'
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
-    message = db.Column(db.Text, nullable=False)
+    # Text lives in messages; this inline copy is only kept for rows written
+    # before migrate_add_messages_table.py and is '' otherwise
+    message = db.Column(db.Text, nullable=False, default='')
+    message_hash = db.Column(db.String(64), db.ForeignKey('messages.content_hash'), nullable=True, index=True)
     prediction = db.Column(db.String(10), nullable=False)  # 'spam' or 'ham'
     confidence = db.Column(db.Float, nullable=False)  # 0.0 to 1.0
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -130,12 +182,21 @@ class Prediction(db.Model):
         db.CheckConstraint("prediction IN ('spam', 'ham')", name='check_prediction_values'),
         db.CheckConstraint('confidence >= 0 AND confidence <= 1', name='check_confidence_range'),
     )
+
+    message_ref = db.relationship('Message', lazy='joined')
+
+    @property
+    def message_text(self):
+        """Full SMS text, from the shared messages row when there is one"""
+        if self.message_ref is not None:
+            return self.message_ref.text
+        return self.message
     
     def to_dict(self):
         """Convert prediction object to dictionary for JSON serialization"""
         return {
             'id': self.id,
-            'message': self.message,
+            'message': self.message_text,
             'prediction': self.prediction,
             'confidence': round(self.confidence, 4),
             'timestamp': self.timestamp.isoformat() + 'Z',
@@ -145,20 +206,223 @@ class Prediction(db.Model):
     def __repr__(self):
         return f'<Prediction {self.id}: {self.prediction}>'
 
+class PredictionDailyRollup(db.Model):
+    """Per-user daily aggregate of predictions removed by archive_predictions.py"""
+    __tablename__ = 'prediction_daily_rollups'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    day = db.Column(db.Date, nullable=False)
+    total_count = db.Column(db.Integer, default=0, nullable=False)
+    spam_count = db.Column(db.Integer, default=0, nullable=False)
+    ham_count = db.Column(db.Integer, default=0, nullable=False)
+    confidence_sum = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_rollup_user_day'),
+    )
+
+    # Rollups go away with the account, like the predictions they summarise
+    user = db.relationship('User', backref=db.backref('daily_rollups', lazy=True, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<PredictionDailyRollup {self.user_id} {self.day}: {self.total_count}>'
+
+class PredictionFeedback(db.Model):
+    """A user's corrected label for one of their predictions, for online learning"""
+    __tablename__ = 'prediction_feedback'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # SET NULL: archive_predictions.py may delete the prediction before the feedback is learned
+    prediction_id = db.Column(db.String(36), db.ForeignKey('predictions.id', ondelete='SET NULL'),
+                              nullable=True, unique=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    message_hash = db.Column(db.String(64), db.ForeignKey('messages.content_hash'), nullable=False)
+    label = db.Column(db.String(10), nullable=False)  # what the user says it is
+    predicted = db.Column(db.String(10), nullable=False)  # what the model said
+    # Online snapshot this feedback was learned into; NULL until then
+    learned_version = db.Column(db.String(50), nullable=True, index=True)
+    # Rejected snapshot this feedback was part of; kept out of learning until re-queued
+    rejected_version = db.Column(db.String(50), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.CheckConstraint("label IN ('spam', 'ham')", name='check_feedback_label'),
+    )
+
+    message_ref = db.relationship('Message', lazy='joined')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'predictionId': self.prediction_id,
+            'label': self.label,
+            'predicted': self.predicted,
+            'learned': self.learned_version is not None,
+            'rejected': self.rejected_version is not None,
+            'createdAt': self.created_at.isoformat() + 'Z',
+            'updatedAt': self.updated_at.isoformat() + 'Z'
+        }
+
+    def __repr__(self):
+        return f'<PredictionFeedback {self.prediction_id}: {self.predicted} -> {self.label}>'
+
+class ShadowEvaluation(db.Model):
+    """One sampled /api/predict request scored again by a shadow candidate bundle"""
+    __tablename__ = 'shadow_evaluations'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    prediction_id = db.Column(db.String(36), db.ForeignKey('predictions.id', ondelete='SET NULL'),
+                              nullable=True, index=True)
+    message_hash = db.Column(db.String(64), db.ForeignKey('messages.content_hash'), nullable=False)
+    primary_version = db.Column(db.String(50), nullable=False)
+    candidate_version = db.Column(db.String(50), nullable=False, index=True)
+    # primary_* is what the user was answered with
+    primary_prediction = db.Column(db.String(10), nullable=False)
+    primary_confidence = db.Column(db.Float, nullable=True)
+    candidate_prediction = db.Column(db.String(10), nullable=False)
+    candidate_confidence = db.Column(db.Float, nullable=True)
+    agrees = db.Column(db.Boolean, nullable=False)
+    # Both timed back to back on the shadow worker, so they are comparable
+    primary_ms = db.Column(db.Float, nullable=False)
+    candidate_ms = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'predictionId': self.prediction_id,
+            'primaryVersion': self.primary_version,
+            'candidateVersion': self.candidate_version,
+            'primaryPrediction': self.primary_prediction,
+            'candidatePrediction': self.candidate_prediction,
+            'agrees': self.agrees,
+            'primaryMs': self.primary_ms,
+            'candidateMs': self.candidate_ms,
+            'createdAt': self.created_at.isoformat() + 'Z'
+        }
+
+    def __repr__(self):
+        return f'<ShadowEvaluation {self.candidate_version}: {self.primary_prediction} / {self.candidate_prediction}>'
+
+class CampaignCluster(db.Model):
+    """A spam campaign: one MiniBatchKMeans cluster of spam messages, kept up to date by cluster_campaigns.py"""
+    __tablename__ = 'campaign_clusters'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # Vocabulary hash of the vectorizer the clusters were fit on; a new bundle starts a new generation
+    generation = db.Column(db.String(32), nullable=False, index=True)
+    label = db.Column(db.Integer, nullable=False)  # cluster index within the generation
+    message_count = db.Column(db.Integer, default=0, nullable=False)  # distinct texts
+    prediction_count = db.Column(db.Integer, default=0, nullable=False)  # spam predictions of them
+    top_terms = db.Column(db.String(255), nullable=True)  # comma-separated stems
+    example_hash = db.Column(db.String(64), db.ForeignKey('messages.content_hash'), nullable=True)
+    first_seen = db.Column(db.DateTime, nullable=True)
+    last_seen = db.Column(db.DateTime, nullable=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('generation', 'label', name='uq_campaign_generation_label'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'label': self.label,
+            'size': self.message_count,
+            'predictions': self.prediction_count,
+            'topTerms': self.top_terms.split(',') if self.top_terms else [],
+            'firstSeen': self.first_seen.isoformat() + 'Z' if self.first_seen else None,
+            'lastSeen': self.last_seen.isoformat() + 'Z' if self.last_seen else None
+        }
+
+    def __repr__(self):
+        return f'<CampaignCluster {self.generation}:{self.label} ({self.message_count})>'
+
+class CampaignMessage(db.Model):
+    """Campaign a distinct spam text was assigned to when the clustering job first saw it"""
+    __tablename__ = 'campaign_messages'
+
+    generation = db.Column(db.String(32), primary_key=True)
+    message_hash = db.Column(db.String(64), db.ForeignKey('messages.content_hash'), primary_key=True)
+    cluster_id = db.Column(db.Integer, db.ForeignKey('campaign_clusters.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    distance = db.Column(db.Float, nullable=True)  # to the cluster centre when assigned
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    first_seen = db.Column(db.DateTime, nullable=True)
+    last_seen = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<CampaignMessage {self.message_hash[:12]}... -> {self.cluster_id}>'
+
+class CampaignClusterRun(db.Model):
+    """One batch of the clustering job; the latest row of a generation is its watermark"""
+    __tablename__ = 'campaign_cluster_runs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    generation = db.Column(db.String(32), nullable=False, index=True)
+    # Last prediction included, in (timestamp, id) order
+    watermark_timestamp = db.Column(db.DateTime, nullable=False)
+    watermark_id = db.Column(db.String(36), nullable=False)
+    rows = db.Column(db.Integer, default=0, nullable=False)
+    messages = db.Column(db.Integer, default=0, nullable=False)
+    new_messages = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'generation': self.generation,
+            'watermark': self.watermark_timestamp.isoformat() + 'Z',
+            'rows': self.rows,
+            'messages': self.messages,
+            'newMessages': self.new_messages,
+            'createdAt': self.created_at.isoformat() + 'Z'
+        }
+
+    def __repr__(self):
+        return f'<CampaignClusterRun {self.generation} @ {self.watermark_timestamp}>'
+
+class CampaignModelState(db.Model):
+    """Pickled clustering model of a generation, saved with each run (ml_model/campaign_clusters.py)"""
+    __tablename__ = 'campaign_models'
+
+    generation = db.Column(db.String(32), primary_key=True)
+    state = db.Column(db.LargeBinary, nullable=False)
+    samples = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CampaignModelState {self.generation}: {self.samples} samples>'
+
 class UserStats:
     """Helper class for calculating user statistics"""
     
     @staticmethod
     def calculate_stats(user_id):
         """Calculate comprehensive statistics for a user"""
-        predictions = Prediction.query.filter_by(user_id=user_id).all()
-        
-        total_messages = len(predictions)
-        spam_count = len([p for p in predictions if p.prediction == 'spam'])
-        ham_count = len([p for p in predictions if p.prediction == 'ham'])
+        # Aggregate in the database; archived predictions are counted
+        # through their daily rollups
+        live = db.session.query(
+            Prediction.prediction,
+            db.func.count(Prediction.id),
+            db.func.coalesce(db.func.sum(Prediction.confidence), 0.0)
+        ).filter(Prediction.user_id == user_id).group_by(Prediction.prediction).all()
+        rolled = db.session.query(
+            db.func.coalesce(db.func.sum(PredictionDailyRollup.spam_count), 0),
+            db.func.coalesce(db.func.sum(PredictionDailyRollup.ham_count), 0),
+            db.func.coalesce(db.func.sum(PredictionDailyRollup.confidence_sum), 0.0)
+        ).filter(PredictionDailyRollup.user_id == user_id).one()
+
+        counts = {label: count for label, count, _ in live}
+        spam_count = counts.get('spam', 0) + int(rolled[0])
+        ham_count = counts.get('ham', 0) + int(rolled[1])
+        total_messages = spam_count + ham_count
+        confidence_sum = sum(float(conf_sum) for _, _, conf_sum in live) + float(rolled[2])
         
         spam_rate = spam_count / total_messages if total_messages > 0 else 0
-        avg_confidence = sum(p.confidence for p in predictions) / total_messages if total_messages > 0 else 0
+        avg_confidence = confidence_sum / total_messages if total_messages > 0 else 0
         
         # Get recent predictions (last 10)
         recent_predictions = Prediction.query.filter_by(user_id=user_id)\
@@ -0,0 +1,218 @@
+"""
+On-demand profiling for live workers
+
+Two tools, both off unless configured:
+
+- A stack sampler. A background thread reads sys._current_frames() at a
+  fixed interval for N seconds and writes flamegraph-compatible collapsed
+  stacks ("thread;outer;...;inner count" per line, for flamegraph.pl or
+  speedscope). Start it with POST /api/admin/profile (routes/admin.py) or
+  by sending PROFILE_SIGNAL (e.g. SIGUSR2) to a worker pid. The sampler
+  runs beside the worker's request thread, so it also works under
+  gunicorn sync workers.
+- Per-request cProfile for /api/predict and /api/explain. Set
+  PROFILE_REQUESTS=true and send "X-Profile: 1" with the admin token. The
+  response then carries X-Profile-Id, and the pstats text is available
+  from GET /api/admin/profile/<id>.
+
+Results go to PROFILE_DIR, shared by all workers on a host, so any worker
+can serve any profile. Without PROFILE_REQUESTS or PROFILE_SIGNAL nothing
+is installed and requests take no extra work.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'smsguard_profiles'))
+MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+DEFAULT_INTERVAL_MS = 10
+# Endpoints that honour X-Profile when PROFILE_REQUESTS is on
+PROFILED_ENDPOINTS = {'predictions.predict_spam', 'predictions.explain_prediction'}
+
+_sampler_lock = threading.Lock()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    """Frames from outermost to innermost, joined with ';'"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def sample_stacks(seconds, interval_ms=DEFAULT_INTERVAL_MS):
+    """Sample every other thread's stack for `seconds`; returns Counter of collapsed stacks"""
+    me = threading.get_ident()
+    interval = interval_ms / 1000.0
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            thread = names.get(ident, f"thread-{ident}").replace(' ', '_').replace(';', '_')
+            stacks[f"{thread};{_collapse(frame)}"] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def format_collapsed(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _path(profile_id, ext):
+    # ids are generated here ("<pid>-<ms>-<kind>"); reject anything else
+    if not profile_id.replace('-', '').isalnum():
+        raise ValueError('invalid profile id')
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{ext}")
+
+
+def _new_id(kind):
+    return f"{os.getpid()}-{int(time.time() * 1000)}-{kind}"
+
+
+def start_sampler(seconds, interval_ms=DEFAULT_INTERVAL_MS):
+    """
+    Start sampling in a background thread
+
+    Returns the profile id, or None if this worker is already sampling.
+    The result is written to PROFILE_DIR/<id>.folded when done.
+    """
+    if not _sampler_lock.acquire(blocking=False):
+        return None
+    seconds = max(0.1, min(float(seconds), MAX_SECONDS))
+    interval_ms = max(1.0, float(interval_ms))
+    profile_id = _new_id('stacks')
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    running = _path(profile_id, 'running')
+    open(running, 'w').close()
+
+    def run():
+        try:
+            stacks = sample_stacks(seconds, interval_ms)
+            tmp = _path(profile_id, 'folded.tmp')
+            with open(tmp, 'w') as f:
+                f.write(format_collapsed(stacks))
+            os.replace(tmp, _path(profile_id, 'folded'))
+            print(f"🔬 Profile {profile_id} written ({sum(stacks.values())} samples)")
+        except Exception as e:
+            print(f"❌ Profile {profile_id} failed: {e}")
+        finally:
+            try:
+                os.remove(running)
+            except OSError:
+                pass
+            _sampler_lock.release()
+
+    threading.Thread(target=run, name=f"profiler-{profile_id}", daemon=True).start()
+    return profile_id
+
+
+def read_profile(profile_id):
+    """
+    (status, body, mimetype) for a stored profile
+
+    status is 'ready', 'running' or 'missing'.
+    """
+    for ext, mimetype in (('folded', 'text/plain'), ('txt', 'text/plain')):
+        path = _path(profile_id, ext)
+        if os.path.exists(path):
+            with open(path) as f:
+                return 'ready', f.read(), mimetype
+    running = _path(profile_id, 'running')
+    # A marker older than the longest allowed run belongs to a worker that died mid-profile
+    if os.path.exists(running) and time.time() - os.path.getmtime(running) < MAX_SECONDS + 5:
+        return 'running', None, None
+    return 'missing', None, None
+
+
+def raw_profile_path(profile_id):
+    """Path of the binary pstats dump for a per-request profile, if any"""
+    path = _path(profile_id, 'prof')
+    return path if os.path.exists(path) else None
+
+
+# --- Per-request cProfile ---
+
+def _before_request():
+    if request.endpoint not in PROFILED_ENDPOINTS or request.headers.get('X-Profile') != '1':
+        return
+    try:
+        from backend.routes.admin import admin_token_valid
+    except ImportError:
+        from routes.admin import admin_token_valid
+    if not admin_token_valid():
+        return
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def _after_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    profile_id = _new_id('request')
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(_path(profile_id, 'prof'))
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    out.write(f"{request.method} {request.path} -> {response.status_code}\n")
+    stats.sort_stats('cumulative').print_stats(40)
+    with open(_path(profile_id, 'txt'), 'w') as f:
+        f.write(out.getvalue())
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped on unhandled errors; make sure the profiler stops
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+
+def _install_signal_handler(signame, seconds):
+    signum = getattr(signal, signame, None)
+    if signum is None:
+        print(f"⚠️ PROFILE_SIGNAL {signame} is not available on this platform")
+        return
+    if threading.current_thread() is not threading.main_thread():
+        print(f"⚠️ PROFILE_SIGNAL {signame} not installed (not on the main thread)")
+        return
+
+    def handler(signum, frame):
+        profile_id = start_sampler(seconds)
+        if profile_id:
+            print(f"🔬 Sampling worker {os.getpid()} for {seconds}s -> {_path(profile_id, 'folded')}")
+
+    signal.signal(signum, handler)
+    print(f"🔬 Send {signame} to pid {os.getpid()} to sample it for {seconds}s")
+
+
+def init_app(app):
+    """Install the per-request cProfile hooks and signal handler if configured"""
+    if app.config.get('PROFILE_REQUESTS'):
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+        app.teardown_request(_teardown_request)
+    if app.config.get('PROFILE_SIGNAL'):
+        _install_signal_handler(app.config['PROFILE_SIGNAL'].upper(),
+                                app.config.get('PROFILE_SIGNAL_SECONDS', 10))
@@ -0,0 +1,162 @@
+"""
+Admin Routes for SMS Guard API
+
+Operational endpoints for maintainers. They are only available when
+ADMIN_TOKEN is set and must be called with the header
+"X-Admin-Token: <token>". Without ADMIN_TOKEN they answer 404.
+"""
+
+import hmac
+import os
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request, send_file
+
+try:
+    from backend import profiling
+    from backend import shadow_evaluation
+    from backend.ml_model import model_registry
+except ImportError:
+    import profiling
+    import shadow_evaluation
+    from ml_model import model_registry
+
+admin_bp = Blueprint('admin', __name__)
+
+
+def admin_token_valid():
+    """True if the request carries the configured admin token"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def admin_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('ADMIN_TOKEN'):
+            return jsonify({'success': False, 'error': 'Endpoint not found'}), 404
+        if not admin_token_valid():
+            return jsonify({'success': False, 'error': 'Admin token required'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route('/profile', methods=['POST'])
+@admin_required
+def start_profile():
+    """
+    Sample this worker's stacks in the background
+    Expected: POST /api/admin/profile
+    Headers: X-Admin-Token: <token>
+    Body: { "seconds"?: number, "interval_ms"?: number }
+    Returns: 202 { "success": boolean, "data": { "id": string, "seconds": number, "url": string } }
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 10))
+        interval_ms = float(data.get('interval_ms', profiling.DEFAULT_INTERVAL_MS))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'seconds and interval_ms must be numbers'}), 400
+
+    profile_id = profiling.start_sampler(seconds, interval_ms)
+    if profile_id is None:
+        return jsonify({'success': False, 'error': 'A profile is already running on this worker'}), 409
+    return jsonify({
+        'success': True,
+        'data': {
+            'id': profile_id,
+            'pid': os.getpid(),
+            'seconds': min(seconds, profiling.MAX_SECONDS),
+            'url': f"/api/admin/profile/{profile_id}"
+        }
+    }), 202
+
+
+@admin_bp.route('/profile/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """
+    Fetch a finished profile
+    Expected: GET /api/admin/profile/<id>[?format=raw]
+    Headers: X-Admin-Token: <token>
+    Returns: collapsed stacks (sampler) or pstats text (per-request) as text/plain;
+             format=raw returns the binary pstats dump of a per-request profile;
+             202 while the sampler is still running
+    """
+    try:
+        if request.args.get('format') == 'raw':
+            path = profiling.raw_profile_path(profile_id)
+            if path is None:
+                return jsonify({'success': False, 'error': 'Profile not found'}), 404
+            return send_file(path, mimetype='application/octet-stream',
+                             as_attachment=True, download_name=f"{profile_id}.prof")
+        status, body, mimetype = profiling.read_profile(profile_id)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid profile id'}), 400
+
+    if status == 'running':
+        return jsonify({'success': True, 'data': {'id': profile_id, 'status': 'running'}}), 202
+    if status == 'missing':
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    return current_app.response_class(body, mimetype=mimetype)
+
+
+@admin_bp.route('/models', methods=['GET'])
+@admin_required
+def model_status():
+    """
+    Model bundle served by this worker
+    Expected: GET /api/admin/models
+    Headers: X-Admin-Token: <token>
+    Returns: { "success": boolean, "data": { "version": string, "members": string[],
+               "near_duplicates": object | null, "draining": string[], "watching": boolean, "reloading": boolean, "last_reload": object } }
+    """
+    return jsonify({'success': True, 'data': model_registry.status()})
+
+
+@admin_bp.route('/models/reload', methods=['POST'])
+@admin_required
+def reload_models():
+    """
+    Load the bundle in MODEL_DIR, check it on the canary messages and swap it in (this worker only)
+    Expected: POST /api/admin/models/reload
+    Headers: X-Admin-Token: <token>
+    Body: { "force"?: boolean, "wait"?: boolean }
+    Returns: 202 { "success": boolean, "data": { "state": "started" } };
+             with wait=true 200 { "success": boolean, "data": ReloadReport }, 422 if rejected or failed;
+             409 while another reload is running
+    """
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get('force'))
+    if not data.get('wait'):
+        if not model_registry.reload_in_background(force=force):
+            return jsonify({'success': False, 'error': 'A reload is already running'}), 409
+        return jsonify({'success': True, 'data': {'state': 'started'}}), 202
+
+    report = model_registry.reload(force=force)
+    if report['state'] == 'busy':
+        return jsonify({'success': False, 'error': 'A reload is already running'}), 409
+    if report['state'] in ('rejected', 'failed'):
+        return jsonify({'success': False, 'error': f"Reload {report['state']}", 'data': report}), 422
+    return jsonify({'success': True, 'data': report})
+
+
+@admin_bp.route('/shadow', methods=['GET'])
+@admin_required
+def shadow_report():
+    """
+    Shadow evaluation of the candidate bundle against the serving one
+    Expected: GET /api/admin/shadow?candidate=<version>&latency_tolerance=0.1&min_samples=200
+    Headers: X-Admin-Token: <token>
+    Returns: { "success": boolean, "data": { "status": object, "report": { "samples": number,
+               "agreement": number, "latency_ms": object, "primary_accuracy": number,
+               "candidate_accuracy": number, "verdict": "promote" | "hold", "reasons": string[] } } }
+    """
+    try:
+        latency_tolerance = float(request.args.get('latency_tolerance', 0.1))
+        min_samples = int(request.args.get('min_samples', 200))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'latency_tolerance and min_samples must be numbers'}), 400
+    report = shadow_evaluation.report(request.args.get('candidate'), latency_tolerance, min_samples)
+    return jsonify({'success': True, 'data': {'status': shadow_evaluation.status(), 'report': report}})
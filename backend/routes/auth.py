@@ -9,12 +9,14 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from flask_mail import Message
 from backend.models import User, PasswordResetToken, db
+import logging
 import re
 import os
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
 auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 
 
@@ -77,16 +79,10 @@ def login():
         user = None
         if '@' in username_or_email:
             user = User.query.filter_by(email=username_or_email.lower()).first()
-            print(f"DEBUG: Searching by email: {username_or_email.lower()}")
         else:
             user = User.query.filter_by(username=username_or_email).first()
-            print(f"DEBUG: Searching by username: {username_or_email}")
-
-        print(f"DEBUG: User found: {user is not None}")
-        if user:
-            print(f"DEBUG: User details - ID: {user.id}, Username: {user.username}, Email: {user.email}")
-            password_check = user.check_password(password)
-            print(f"DEBUG: Password check result: {password_check}")
+        logger.debug("Login lookup by %s: user found=%s", 'email' if '@' in username_or_email else 'username',
+                     user is not None)
 
         if not user:
             return jsonify({
@@ -4,16 +4,23 @@ Prediction Routes for SMS Guard API
 This module handles SMS spam prediction endpoints.
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, g, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 try:
-    from backend.models import User, Prediction, db
+    from backend.models import User, Prediction, PredictionFeedback, Message, db
 except ImportError:
-    from models import User, Prediction, db
-from backend.ml_model.spam_detector_multi import predict_consensus, get_best_accuracy, explain_consensus_prediction, predict_weighted_consensus
+    from models import User, Prediction, PredictionFeedback, Message, db
+from backend.ml_model.spam_detector_multi import predict_consensus, predict_consensus_batch, get_best_accuracy, explain_consensus_prediction, predict_weighted_consensus, NEAR_DUPLICATES
+from backend.stage_timing import StageTimer, observe, histograms
+from backend.metrics import record_cache
+from backend import shadow_evaluation
+import json
+import logging
 import time
+import uuid
 
 predictions_bp = Blueprint('predictions', __name__)
+logger = logging.getLogger(__name__)
 
 @predictions_bp.route('/predict', methods=['POST'])
 @jwt_required()
@@ -26,6 +33,7 @@ def predict_spam():
     Returns: { "success": boolean, "data": PredictionResult, "error"?: string }
     """
     try:
+        timer = g.stage_timer = StageTimer()
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
         
@@ -35,6 +43,7 @@ def predict_spam():
                 'error': 'User not found or inactive'
             }), 401
         
+        parse_start = time.perf_counter_ns()
         data = request.get_json()
         
         if not data:
@@ -56,10 +65,13 @@ def predict_spam():
                 'success': False,
                 'error': 'Message too long. Maximum 1000 characters allowed.'
             }), 400
+        timer.add('parse', time.perf_counter_ns() - parse_start)
         
         # Make consensus prediction using all models
-        consensus_result = predict_consensus(message)
-        weighted_result = predict_weighted_consensus(message, metric='f1')
+        consensus_result = predict_consensus(message, timer=timer)
+        weighted_result = predict_weighted_consensus(message, metric='f1', timer=timer)
+        if NEAR_DUPLICATES:
+            record_cache('near_duplicates', consensus_result.get("served_by") == "near_duplicate")
 
         consensus = consensus_result["consensus"]
         model_results = consensus_result["model_results"]
@@ -72,17 +84,27 @@ def predict_spam():
         consensus_confidence = consensus.get("confidence", 0.0)
         db_confidence = consensus_confidence / 100.0
 
-        # Create prediction record
-        prediction = Prediction(
-            user_id=current_user_id,
-            message=message,
-            prediction=majority_prediction,
-            confidence=db_confidence,
-            processing_time_ms=None,
-            model_version="N/A"
-        )
-        db.session.add(prediction)
-        db.session.commit()
+        # Create prediction record; the text itself is stored once in messages
+        with timer.stage('db_write'):
+            message_row = Message.get_or_create(message)
+            record_cache('messages', (message_row.seen_count or 0) > 0)
+            model_version = consensus_result.get("model_version", "N/A")
+            message_row.record_verdict(majority_prediction, db_confidence, model_version)
+            prediction = Prediction(
+                id=str(uuid.uuid4()),
+                user_id=current_user_id,
+                message_hash=message_row.content_hash,
+                prediction=majority_prediction,
+                confidence=db_confidence,
+                processing_time_ms=int(round(timer.elapsed_ms())),
+                model_version=model_version
+            )
+            db.session.add(prediction)
+            db.session.commit()
+
+        # Score the candidate bundle on a sample of requests, after the response (MODEL_SHADOW_DIR)
+        shadow_evaluation.submit(current_app._get_current_object(), prediction.id,
+                                 message_row.content_hash, message, consensus_result)
 
         # Determine confidence level and suggestion
         weighted_conf = None
@@ -119,6 +141,7 @@ def predict_spam():
 
         # Prepare response data
         response_data = {
+            "prediction_id": prediction.id,
             "message": message,
             "consensus": consensus,
             "weighted_result": weighted_result,
@@ -126,22 +149,283 @@ def predict_spam():
             "confidence_level": confidence_level,
             "suggestion": suggestion,
             "prediction": consensus.get("majority_vote", "unknown"),
-            "confidence": consensus.get("confidence", 0.0)
+            "confidence": consensus.get("confidence", 0.0),
+            "served_by": consensus_result.get("served_by", "ensemble")
         }
+        if consensus_result.get("model_results_from"):
+            # Reused verdict: the per-model rows were computed for the matched message
+            response_data["model_results_from"] = consensus_result["model_results_from"]
         
-        return jsonify({
-            "success": True,
-            "data": response_data
-        }), 200
+        with timer.stage('serialize'):
+            response = jsonify({
+                "success": True,
+                "data": response_data
+            })
+        observe(timer)
+        if current_app.config.get('DEBUG_TIMINGS') or request.headers.get('X-Debug-Timings') == '1':
+            response.headers['Server-Timing'] = timer.server_timing()
+        return response, 200
         
     except Exception as e:
         db.session.rollback()
-        print(f"Prediction error: {str(e)}")
+        logger.exception("Prediction error")
         return jsonify({
             'success': False,
             'error': 'Prediction failed. Please try again.'
         }), 500
 
+@predictions_bp.route('/predict/batch', methods=['POST'])
+@jwt_required()
+def predict_batch():
+    """
+    Batch SMS Spam Prediction endpoint
+    Expected: POST /api/predict/batch
+    Headers: Authorization: Bearer <token>
+    Body: { "messages": ["string", ...], "stream"?: boolean, "chunk_size"?: number }
+    Returns: { "success": boolean, "data": BatchResult[], "error"?: string }
+    Streaming (stream=true, ?stream=1 or Accept: application/x-ndjson):
+        one BatchResult JSON object per line, emitted as each chunk finishes,
+        followed by a final { "done": true, ... } summary line.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+
+        if not user or not user.is_active:
+            return jsonify({
+                'success': False,
+                'error': 'User not found or inactive'
+            }), 401
+
+        data = request.get_json()
+
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'No data provided'
+            }), 400
+
+        messages = data.get('messages')
+        if not isinstance(messages, list) or not messages:
+            return jsonify({
+                'success': False,
+                'error': 'messages must be a non-empty list'
+            }), 400
+
+        max_messages = current_app.config.get('BATCH_MAX_MESSAGES', 10000)
+        if len(messages) > max_messages:
+            return jsonify({
+                'success': False,
+                'error': f'Too many messages. Maximum {max_messages} per batch.'
+            }), 400
+
+        try:
+            chunk_size = int(data.get('chunk_size') or current_app.config.get('BATCH_CHUNK_SIZE', 32))
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'chunk_size must be an integer'
+            }), 400
+        chunk_size = max(1, min(chunk_size, current_app.config.get('BATCH_MAX_CHUNK_SIZE', 1024)))
+
+        stream_flag = data.get('stream')
+        if isinstance(stream_flag, str):
+            stream_flag = stream_flag.lower()
+        if stream_flag not in (None, True, False, '1', 'true', '0', 'false') or type(stream_flag) is int:
+            return jsonify({
+                'success': False,
+                'error': 'stream must be true or false'
+            }), 400
+        stream = (
+            stream_flag in (True, '1', 'true')
+            or request.args.get('stream') in ('1', 'true')
+            or request.accept_mimetypes.best == 'application/x-ndjson'
+        )
+
+        if stream:
+            lines = (json.dumps(item) + '\n' for item in _iter_batch_results(current_user_id, messages, chunk_size))
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+        results = [item for item in _iter_batch_results(current_user_id, messages, chunk_size) if 'done' not in item]
+        return jsonify({
+            'success': True,
+            'data': results
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Batch prediction error")
+        return jsonify({
+            'success': False,
+            'error': 'Batch prediction failed. Please try again.'
+        }), 500
+
+def _iter_batch_results(user_id, messages, chunk_size):
+    """
+    Yield one result dict per message, chunk by chunk, then a summary dict.
+
+    Each chunk is scored with a single predict_consensus_batch call and its
+    predictions are committed before any of its results are yielded, so only
+    one chunk is ever held in memory.
+    """
+    spam_count = 0
+    ham_count = 0
+    error_count = 0
+    for start in range(0, len(messages), chunk_size):
+        chunk = messages[start:start + chunk_size]
+        valid = []
+        items = []
+        for offset, raw in enumerate(chunk):
+            index = start + offset
+            message = raw.strip() if isinstance(raw, str) else ''
+            if not message:
+                items.append({'index': index, 'error': 'Message is required'})
+            elif len(message) > 1000:
+                items.append({'index': index, 'error': 'Message too long. Maximum 1000 characters allowed.'})
+            else:
+                items.append(None)
+                valid.append((offset, index, message))
+
+        try:
+            timer = StageTimer()
+            consensus_results = predict_consensus_batch([m for _, _, m in valid], timer=timer)
+            # Chunk cost split evenly across its messages
+            per_message_ms = int(round(timer.elapsed_ms() / len(valid))) if valid else None
+            for (offset, index, message), result in zip(valid, consensus_results):
+                consensus = result["consensus"]
+                majority_prediction = consensus.get("majority_vote", "unknown").lower()
+                db_confidence = consensus.get("confidence", 0.0) / 100.0
+                message_row = Message.get_or_create(message)
+                record_cache('messages', (message_row.seen_count or 0) > 0)
+                if NEAR_DUPLICATES:
+                    record_cache('near_duplicates', result.get("served_by") == "near_duplicate")
+                model_version = result.get("model_version", "N/A")
+                message_row.record_verdict(majority_prediction, db_confidence, model_version)
+                prediction_id = str(uuid.uuid4())
+                db.session.add(Prediction(
+                    id=prediction_id,
+                    user_id=user_id,
+                    message_hash=message_row.content_hash,
+                    prediction=majority_prediction,
+                    confidence=db_confidence,
+                    processing_time_ms=per_message_ms,
+                    model_version=model_version
+                ))
+                items[offset] = {
+                    'index': index,
+                    'prediction_id': prediction_id,
+                    'message': message,
+                    'prediction': consensus.get("majority_vote", "unknown"),
+                    'confidence': consensus.get("confidence", 0.0),
+                    'consensus': consensus,
+                    'model_results': result["model_results"],
+                    'served_by': result.get("served_by", "ensemble")
+                }
+                if result.get("model_results_from"):
+                    items[offset]['model_results_from'] = result["model_results_from"]
+            with timer.stage('db_write'):
+                db.session.commit()
+            observe(timer, prefix='batch:')
+            spam_count += sum(1 for item in items if item and item.get('prediction') == 'Spam')
+            ham_count += sum(1 for item in items if item and item.get('prediction') == 'Ham')
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Batch chunk error at index %d", start)
+            items = [item if item is not None and 'error' in item else {'index': start + offset, 'error': 'Prediction failed'}
+                     for offset, item in enumerate(items)]
+
+        for item in items:
+            if 'error' in item:
+                error_count += 1
+            yield item
+
+    yield {
+        'done': True,
+        'total': len(messages),
+        'spam': spam_count,
+        'ham': ham_count,
+        'errors': error_count
+    }
+
+@predictions_bp.route('/feedback', methods=['POST'])
+@jwt_required()
+def submit_feedback():
+    """
+    Correct (or confirm) the label of one of the user's predictions
+    Expected: POST /api/feedback
+    Headers: Authorization: Bearer <token>
+    Body: { "prediction_id": "string", "label": "spam" | "ham" }
+    Returns: { "success": boolean, "data": Feedback, "error"?: string }
+    Feedback is learned by backend/learn_from_feedback.py; sending a new
+    label for the same prediction replaces the old one until it has been
+    learned. Learned labels cannot be taken back out of the online models,
+    so changing one afterwards is refused with 409.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+
+        if not user or not user.is_active:
+            return jsonify({
+                'success': False,
+                'error': 'User not found or inactive'
+            }), 401
+
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'No data provided'
+            }), 400
+
+        label = str(data.get('label', '')).strip().lower()
+        if label not in ('spam', 'ham'):
+            return jsonify({
+                'success': False,
+                'error': "label must be 'spam' or 'ham'"
+            }), 400
+
+        prediction = db.session.get(Prediction, str(data.get('prediction_id', '')))
+        if prediction is None or prediction.user_id != current_user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Prediction not found'
+            }), 404
+        if prediction.message_hash is None:
+            # Rows from before migrate_add_messages_table.py
+            message_row = Message.get_or_create(prediction.message)
+            prediction.message_hash = message_row.content_hash
+
+        feedback = PredictionFeedback.query.filter_by(prediction_id=prediction.id).first()
+        if feedback is None:
+            feedback = PredictionFeedback(prediction_id=prediction.id, user_id=current_user_id)
+            db.session.add(feedback)
+        elif feedback.label != label:
+            if feedback.learned_version is not None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Feedback was already learned and can no longer be changed'
+                }), 409
+            # Changed its mind: learn the new label in the next snapshot
+            feedback.rejected_version = None
+        feedback.message_hash = prediction.message_hash
+        feedback.label = label
+        feedback.predicted = prediction.prediction
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'data': feedback.to_dict()
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Feedback error")
+        return jsonify({
+            'success': False,
+            'error': 'Could not save feedback. Please try again.'
+        }), 500
+
 @predictions_bp.route('/model/accuracy', methods=['GET'])
 @jwt_required()
 def get_model_accuracy():
@@ -185,6 +469,55 @@ def get_model_metrics():
             'error': 'Failed to fetch model metrics'
         }), 500
 
+@predictions_bp.route('/model/timings', methods=['GET'])
+@jwt_required()
+def get_stage_timings():
+    """
+    Per-stage latency histograms for this worker process
+    Expected: GET /api/model/timings
+    Headers: Authorization: Bearer <token>
+    Returns: { "success": boolean, "data": { [stage]: { count, avg_ms, p50_ms, p95_ms, ... } } }
+    """
+    return jsonify({
+        'success': True,
+        'data': histograms()
+    }), 200
+
+@predictions_bp.route('/campaigns/top', methods=['GET'])
+@jwt_required()
+def get_top_campaigns():
+    """
+    Largest spam campaigns, precomputed by backend/cluster_campaigns.py
+    Expected: GET /api/campaigns/top?limit=10&days=7
+    Headers: Authorization: Bearer <token>
+    Returns: { "success": boolean, "data": { "campaigns": [{ id, size, predictions, topTerms,
+               firstSeen, lastSeen }], "updatedAt": string | null }, "error"?: string }
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 100))
+        days = int(request.args['days']) if request.args.get('days') else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'limit and days must be integers'
+        }), 400
+    try:
+        from backend.cluster_campaigns import top_campaigns
+        latest, clusters = top_campaigns(limit, days)
+        return jsonify({
+            'success': True,
+            'data': {
+                'campaigns': [c.to_dict() for c in clusters],
+                'updatedAt': latest.created_at.isoformat() + 'Z' if latest else None
+            }
+        }), 200
+    except Exception:
+        logger.exception("Top campaigns error")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to fetch campaigns'
+        }), 500
+
 @predictions_bp.route('/explain', methods=['POST'])
 @jwt_required()
 def explain_prediction():
@@ -229,9 +562,9 @@ def explain_prediction():
             }), 400
 
         # Generate explanation using the consensus model
-        print(f"EXPLAIN: Generating explanation for message: {message[:50]}...")
+        logger.debug("Generating explanation for a %d-character message", len(message))
         explanation_result = explain_consensus_prediction(message, num_features)
-        print(f"EXPLAIN: Result success: {explanation_result.get('success', False)}")
+        logger.debug("Explanation success: %s", explanation_result.get('success', False))
 
         if explanation_result.get('success'):
             return jsonify({
@@ -245,9 +578,7 @@ def explain_prediction():
             }), 500
 
     except Exception as e:
-        print(f"EXPLANATION ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Explanation error")
         return jsonify({
             'success': False,
             'error': f'Explanation failed: {str(e)}'
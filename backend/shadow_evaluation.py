@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Shadow evaluation of a candidate model bundle
+
+With MODEL_SHADOW_DIR pointing at a retrained bundle, a
+MODEL_SHADOW_SAMPLE_RATE share of /api/predict requests is scored again
+by that candidate after the request has been answered. A small thread
+pool does the work (MODEL_SHADOW_WORKERS threads). At most
+MODEL_SHADOW_MAX_PENDING samples wait in its queue; further samples are
+dropped rather than slowing requests down. For each sample the worker
+times the serving engine and the candidate back to back on the same
+message, in alternating order so neither always runs warm. It writes a
+shadow_evaluations row with both verdicts, confidences, versions and
+latencies.
+
+The promotion report compares:
+- agreement between the two bundles
+- p50/p95 latency of both
+- accuracy of both on the sampled predictions users corrected or
+  confirmed through POST /api/feedback
+
+It recommends promoting only when the candidate is at least as accurate
+and its p95 is within --latency-tolerance of the serving bundle's. The
+figures are aggregated by the database, so the report never loads the
+samples themselves.
+
+    python -m backend.shadow_evaluation --report [--candidate <version>]
+    GET /api/admin/shadow
+
+Promote with model_registry (copy the bundle into MODEL_DIR and reload).
+"""
+
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import and_, case, func
+
+try:
+    from backend.models import db, ShadowEvaluation, PredictionFeedback
+    from backend.ml_model import spam_detector_multi as smd
+except ImportError:
+    from models import db, ShadowEvaluation, PredictionFeedback
+    from ml_model import spam_detector_multi as smd
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_config = {'dir': None, 'sample_rate': 0.0, 'workers': 1, 'max_pending': 100}
+_executor = None
+_candidate = None
+_candidate_error = None
+_pending = 0
+_dropped = 0
+_order = 0
+
+
+def enabled():
+    return bool(_config['dir']) and _config['sample_rate'] > 0 and _candidate_error is None
+
+
+def _load_candidate():
+    """The candidate engine, loaded on first use on a shadow worker"""
+    global _candidate, _candidate_error
+    if _candidate is None:
+        with _lock:
+            if _candidate is None and _candidate_error is None:
+                try:
+                    _candidate = smd.load_bundle(_config['dir'])
+                    logger.info("Shadow candidate %s loaded from %s", _candidate.version, _config['dir'])
+                except Exception as e:
+                    _candidate_error = f"{type(e).__name__}: {e}"
+                    logger.exception("Could not load shadow candidate from %s; shadow evaluation is off",
+                                     _config['dir'])
+    return _candidate
+
+
+def submit(app, prediction_id, message_hash, message, served):
+    """
+    Maybe queue a shadow evaluation of one answered request
+
+    served is the predict_consensus result the user got. Returns True if
+    the sample was queued. Never blocks and never raises into the request.
+    """
+    global _executor, _pending, _dropped
+    if not enabled() or random.random() >= _config['sample_rate']:
+        return False
+    primary = smd.engine
+    with _lock:
+        if _pending >= _config['max_pending']:
+            _dropped += 1
+            return False
+        if _executor is None:
+            # Created lazily so each gunicorn worker gets its own threads after the fork
+            _executor = ThreadPoolExecutor(max_workers=_config['workers'], thread_name_prefix='shadow')
+        _pending += 1
+    try:
+        _executor.submit(_evaluate, app, primary, prediction_id, message_hash, message, served)
+    except RuntimeError:
+        with _lock:
+            _pending -= 1
+        return False
+    return True
+
+
+def _timed(engine, message):
+    start = time.perf_counter()
+    result = smd.predict_consensus_batch([message], engine=engine)[0]
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _evaluate(app, primary, prediction_id, message_hash, message, served):
+    global _pending, _order
+    try:
+        candidate = _load_candidate()
+        if candidate is None or primary is None:
+            return
+        # Under the lock so concurrent workers still alternate which bundle runs first
+        with _lock:
+            _order += 1
+            candidate_first = _order % 2
+        if candidate_first:
+            shadow, candidate_ms = _timed(candidate, message)
+            _, primary_ms = _timed(primary, message)
+        else:
+            _, primary_ms = _timed(primary, message)
+            shadow, candidate_ms = _timed(candidate, message)
+
+        primary_prediction = served["consensus"].get("majority_vote", "unknown").lower()
+        candidate_prediction = shadow["consensus"].get("majority_vote", "unknown").lower()
+        with app.app_context():
+            try:
+                db.session.add(ShadowEvaluation(
+                    prediction_id=prediction_id,
+                    message_hash=message_hash,
+                    primary_version=served.get("model_version") or primary.version,
+                    candidate_version=candidate.version,
+                    primary_prediction=primary_prediction,
+                    primary_confidence=served["consensus"].get("confidence", 0.0) / 100.0,
+                    candidate_prediction=candidate_prediction,
+                    candidate_confidence=shadow["consensus"].get("confidence", 0.0) / 100.0,
+                    agrees=primary_prediction == candidate_prediction,
+                    primary_ms=round(primary_ms, 3),
+                    candidate_ms=round(candidate_ms, 3),
+                ))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+    except Exception:
+        logger.exception("Shadow evaluation failed")
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _percentile(column, where, n, q):
+    """q-th percentile of a column over n rows, picked by the database with an ordered offset"""
+    if not n:
+        return None
+    value = db.session.query(column).filter(where).order_by(column)\
+        .offset(min(n - 1, int(q / 100 * n))).limit(1).scalar()
+    return round(value, 3)
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def report(candidate_version=None, latency_tolerance=0.1, min_samples=200):
+    """Agreement, latency and feedback accuracy of a candidate; "verdict" is "promote" or "hold" """
+    if candidate_version is None:
+        candidate_version = db.session.query(ShadowEvaluation.candidate_version)\
+            .order_by(ShadowEvaluation.id.desc()).limit(1).scalar()
+    where = ShadowEvaluation.candidate_version == candidate_version
+
+    n, agreed, spam_to_ham, ham_to_spam = db.session.query(
+        func.count(ShadowEvaluation.id),
+        _count_if(ShadowEvaluation.agrees.is_(True)),
+        _count_if(and_(ShadowEvaluation.primary_prediction == 'spam',
+                       ShadowEvaluation.candidate_prediction == 'ham')),
+        _count_if(and_(ShadowEvaluation.primary_prediction == 'ham',
+                       ShadowEvaluation.candidate_prediction == 'spam')),
+    ).filter(where).one()
+    primary_versions = [v for (v,) in db.session.query(ShadowEvaluation.primary_version)
+                        .filter(where).distinct().order_by(ShadowEvaluation.primary_version)]
+    labeled, primary_right, candidate_right = db.session.query(
+        func.count(ShadowEvaluation.id),
+        _count_if(ShadowEvaluation.primary_prediction == PredictionFeedback.label),
+        _count_if(ShadowEvaluation.candidate_prediction == PredictionFeedback.label),
+    ).join(PredictionFeedback, PredictionFeedback.prediction_id == ShadowEvaluation.prediction_id)\
+        .filter(where).one()
+
+    primary_p95 = _percentile(ShadowEvaluation.primary_ms, where, n, 95)
+    candidate_p95 = _percentile(ShadowEvaluation.candidate_ms, where, n, 95)
+    result = {
+        'candidate_version': candidate_version,
+        'primary_versions': primary_versions,
+        'samples': n,
+        'agreement': round(agreed / n, 4) if n else None,
+        'disagreements': {
+            'spam_to_ham': spam_to_ham,
+            'ham_to_spam': ham_to_spam,
+        },
+        'latency_ms': {
+            'primary': {'p50': _percentile(ShadowEvaluation.primary_ms, where, n, 50), 'p95': primary_p95},
+            'candidate': {'p50': _percentile(ShadowEvaluation.candidate_ms, where, n, 50), 'p95': candidate_p95},
+        },
+        'labeled': labeled,
+        'primary_accuracy': round(primary_right / labeled, 4) if labeled else None,
+        'candidate_accuracy': round(candidate_right / labeled, 4) if labeled else None,
+        'latency_tolerance': latency_tolerance,
+    }
+
+    reasons = []
+    if n < min_samples:
+        reasons.append(f"only {n} of {min_samples} samples")
+    if not labeled:
+        reasons.append("no sampled prediction has feedback yet")
+    elif result['candidate_accuracy'] < result['primary_accuracy']:
+        reasons.append(f"less accurate on feedback ({result['candidate_accuracy']:.2%} vs "
+                       f"{result['primary_accuracy']:.2%})")
+    if n and candidate_p95 > primary_p95 * (1 + latency_tolerance):
+        reasons.append(f"p95 {candidate_p95:.1f} ms vs {primary_p95:.1f} ms")
+    result['verdict'] = 'hold' if reasons else 'promote'
+    result['reasons'] = reasons
+    return result
+
+
+def status():
+    """Live shadow state of this worker"""
+    return {
+        'enabled': enabled(),
+        'candidate_dir': _config['dir'],
+        'candidate_version': _candidate.version if _candidate else None,
+        'candidate_error': _candidate_error,
+        'sample_rate': _config['sample_rate'],
+        'pending': _pending,
+        'dropped': _dropped,
+    }
+
+
+def init_app(app):
+    """Read the MODEL_SHADOW_* settings; nothing runs until a request is sampled"""
+    _config.update(
+        dir=app.config.get('MODEL_SHADOW_DIR') or None,
+        sample_rate=float(app.config.get('MODEL_SHADOW_SAMPLE_RATE', 0.0)),
+        workers=int(app.config.get('MODEL_SHADOW_WORKERS', 1)),
+        max_pending=int(app.config.get('MODEL_SHADOW_MAX_PENDING', 100)),
+    )
+    if _config['dir'] and not os.path.isdir(_config['dir']):
+        logger.warning("MODEL_SHADOW_DIR %s does not exist; shadow evaluation is off", _config['dir'])
+        _config['dir'] = None
+
+
+def print_report(result):
+    print(f"Candidate {result['candidate_version']} vs {', '.join(result['primary_versions']) or '-'}")
+    print(f"  samples {result['samples']}, agreement {result['agreement']}, "
+          f"spam->ham {result['disagreements']['spam_to_ham']}, ham->spam {result['disagreements']['ham_to_spam']}")
+    lat = result['latency_ms']
+    print(f"  latency p50/p95: primary {lat['primary']['p50']}/{lat['primary']['p95']} ms, "
+          f"candidate {lat['candidate']['p50']}/{lat['candidate']['p95']} ms")
+    print(f"  feedback accuracy ({result['labeled']} labeled): primary {result['primary_accuracy']}, "
+          f"candidate {result['candidate_accuracy']}")
+    print(f"{'✅ promote' if result['verdict'] == 'promote' else '⏸️ hold'}"
+          + (f": {'; '.join(result['reasons'])}" if result['reasons'] else ""))
+
+
+if __name__ == "__main__":
+    import sys
+    from backend.app import create_app
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--report', action='store_true', help='print the promotion report')
+    parser.add_argument('--candidate', help='candidate version (default: the most recent one)')
+    parser.add_argument('--latency-tolerance', type=float, default=0.1,
+                        help='allowed p95 slowdown, as a fraction of the serving p95')
+    parser.add_argument('--min-samples', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        result = report(args.candidate, args.latency_tolerance, args.min_samples)
+    print_report(result)
+    # Non-zero unless promotion is recommended, for use as a deploy gate
+    sys.exit(0 if result['verdict'] == 'promote' else 1)
@@ -0,0 +1,123 @@
+"""
+Slow-request log
+
+Requests slower than SLOW_REQUEST_MS are written as one JSON object per
+line to a rotating file (SLOW_REQUEST_LOG). Each record holds the route,
+status, duration, user id, input size, per-stage timings from
+g.stage_timer, the models that ran and cache hits/misses. Message text is
+never logged, only its length.
+
+SLOW_REQUEST_SAMPLE_RATE keeps only a fraction of the slow requests. Fast
+requests cost one perf_counter call and a comparison. Records go through
+a QueueHandler, so the file write happens on a background thread, not in
+the request.
+
+{pid} in SLOW_REQUEST_LOG is replaced by the worker's process id, and the
+default (logs/slow_requests.{pid}.log) gives each gunicorn worker its own
+file. Each worker rotates its own file. A path without {pid} is only safe
+with a single worker, because rotations from several processes on one file
+lose records.
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from datetime import datetime
+
+from flask import g, request
+
+logger = logging.getLogger('backend.slow_requests')
+
+_listener = None
+
+
+def _configure_logger(path, max_bytes, backups):
+    global _listener
+    if _listener is not None:
+        return
+    path = path.replace('{pid}', str(os.getpid()))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+    file_handler.setFormatter(logging.Formatter('%(message)s'))
+    records = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, file_handler)
+    _listener.start()
+
+
+def _user_id():
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        return get_jwt_identity()
+    except RuntimeError:
+        # Route did not verify a JWT
+        return None
+
+
+def _input_summary():
+    """Sizes of the request's JSON inputs (never the text itself)"""
+    data = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(data, dict):
+        return {'content_length': request.content_length}
+    summary = {}
+    if isinstance(data.get('message'), str):
+        summary['message_length'] = len(data['message'])
+    if isinstance(data.get('messages'), list):
+        summary['message_count'] = len(data['messages'])
+        summary['total_length'] = sum(len(m) for m in data['messages'] if isinstance(m, str))
+    return summary
+
+
+def build_record(response, duration_ms):
+    timer = g.get('stage_timer')
+    stages = timer.as_dict() if timer is not None else {}
+    return {
+        'ts': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+        'route': request.url_rule.rule if request.url_rule is not None else None,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration_ms, 3),
+        'user_id': _user_id(),
+        'input': _input_summary(),
+        'stages': stages,
+        'models': [name[len('model:'):] for name in stages if name.startswith('model:')],
+        'cache': g.get('cache_results', {}),
+        'pid': os.getpid(),
+    }
+
+
+def init_app(app):
+    """Log requests slower than SLOW_REQUEST_MS (0 disables)"""
+    threshold_ms = app.config.get('SLOW_REQUEST_MS', 0)
+    if not threshold_ms or threshold_ms <= 0:
+        return
+    sample_rate = app.config.get('SLOW_REQUEST_SAMPLE_RATE', 1.0)
+    _configure_logger(app.config['SLOW_REQUEST_LOG'],
+                      app.config.get('SLOW_REQUEST_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                      app.config.get('SLOW_REQUEST_LOG_BACKUPS', 5))
+
+    @app.before_request
+    def _start_clock():
+        g.slow_log_start = time.perf_counter()
+
+    @app.after_request
+    def _log_if_slow(response):
+        start = g.pop('slow_log_start', None)
+        if start is None:
+            return response
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= threshold_ms and (sample_rate >= 1 or random.random() < sample_rate):
+            try:
+                logger.info(json.dumps(build_record(response, duration_ms), default=str))
+            except Exception:
+                logging.getLogger(__name__).exception('Could not write slow-request record')
+        return response
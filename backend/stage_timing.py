@@ -0,0 +1,140 @@
+"""
+Per-stage latency instrumentation for the prediction pipeline
+
+A StageTimer records how long each named stage of one request took, using
+time.perf_counter_ns (monotonic, high resolution). Finished timers are
+folded into process-wide histograms, one per stage, so you can see where
+the time goes per model across requests.
+
+    timer = StageTimer()
+    with timer.stage('preprocess'):
+        ...
+    observe(timer)
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class StageTimer:
+    """Named stage durations for a single request"""
+
+    def __init__(self):
+        self.started_ns = time.perf_counter_ns()
+        self.stages = {}  # name -> nanoseconds, in first-seen order
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def add(self, name, elapsed_ns):
+        """Add time to a stage (repeated stages accumulate)"""
+        self.stages[name] = self.stages.get(name, 0) + elapsed_ns
+
+    def elapsed_ms(self):
+        """Wall time since the timer was created"""
+        return (time.perf_counter_ns() - self.started_ns) / 1e6
+
+    def as_dict(self):
+        """{stage: milliseconds}"""
+        return {name: round(ns / 1e6, 3) for name, ns in self.stages.items()}
+
+    def server_timing(self):
+        """Value for a Server-Timing response header"""
+        parts = [f"{name.replace(':', '_').replace(' ', '_')};dur={ns / 1e6:.3f}" for name, ns in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed_ms():.3f}")
+        return ', '.join(parts)
+
+
+class Histogram:
+    """
+    Latency histogram (milliseconds)
+
+    counts[i] is the number of values in bucket i alone (le buckets[i],
+    above buckets[i-1]), not a cumulative count; sum a prefix for the
+    Prometheus-style "le" value.
+    """
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms):
+        i = 0
+        while i < len(self.buckets) and value_ms > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def quantile(self, q):
+        """Bucket upper bound containing the q-th quantile"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum_ms': round(self.sum, 3),
+            'avg_ms': round(self.sum / self.count, 3) if self.count else None,
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+def observe(timer, prefix=''):
+    """Fold a finished timer into the per-stage histograms"""
+    with _lock:
+        for name, ns in timer.stages.items():
+            key = prefix + name
+            hist = _histograms.get(key)
+            if hist is None:
+                hist = _histograms[key] = Histogram()
+            hist.observe(ns / 1e6)
+
+
+def observe_value(name, value_ms):
+    """Record a single duration under a named histogram"""
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.observe(value_ms)
+
+
+def histograms():
+    """Snapshot of every stage histogram"""
+    with _lock:
+        return {name: hist.snapshot() for name, hist in _histograms.items()}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
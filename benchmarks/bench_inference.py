@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Inference benchmark over spam.csv
+
+Times the serving pipeline (backend.ml_model.spam_detector_multi) stage by
+stage: preprocessing, vectorization, each consensus member, the vote, the
+full consensus call and explanations, at batch sizes 1, 32 and 1024.
+Batches are drawn from ml_notebooks/main_notebook/spam.csv with a fixed
+seed, so two runs on different commits score the same messages.
+
+For every stage and batch size the result holds p50/p95/p99 batch latency,
+throughput in messages per second and the tracemalloc peak (measured in a
+separate pass so tracing does not skew the timings).
+
+    python benchmarks/bench_inference.py --output bench.json
+    python benchmarks/compare.py baseline.json bench.json
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from backend.ml_model import spam_detector_multi as smd
+from backend.stage_timing import StageTimer
+
+DATA_PATH = os.path.join(ROOT, 'ml_notebooks', 'main_notebook', 'spam.csv')
+DEFAULT_BATCH_SIZES = (1, 32, 1024)
+# Explanations run one message at a time; larger batches take minutes
+DEFAULT_EXPLAIN_MAX_BATCH = 32
+SCHEMA_VERSION = 1
+
+
+def load_messages(path=DATA_PATH):
+    """Message texts from spam.csv, in file order"""
+    with open(path, encoding='latin-1', newline='') as f:
+        rows = list(csv.reader(f))
+    return [row[1] for row in rows[1:] if len(row) > 1]
+
+
+def default_repeats(batch_size):
+    """Enough repetitions for stable tails without making 1024 take minutes"""
+    return max(5, min(200, 4096 // batch_size))
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples_ns, batch_size):
+    samples = sorted(ns / 1e6 for ns in samples_ns)
+    total_s = sum(samples) / 1000
+    return {
+        'runs': len(samples),
+        'p50_ms': round(percentile(samples, 0.50), 4),
+        'p95_ms': round(percentile(samples, 0.95), 4),
+        'p99_ms': round(percentile(samples, 0.99), 4),
+        'mean_ms': round(sum(samples) / len(samples), 4),
+        'throughput_msgs_per_s': round(batch_size * len(samples) / total_s, 2) if total_s else None,
+    }
+
+
+class PeakTimer(StageTimer):
+    """StageTimer that records the tracemalloc peak of each stage instead of its time"""
+
+    def __init__(self):
+        super().__init__()
+        self.peaks = {}
+
+    def stage(self, name):
+        timer = self
+
+        class _Peak:
+            def __enter__(self):
+                self.before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+
+            def __exit__(self, *exc):
+                peak = tracemalloc.get_traced_memory()[1] - self.before
+                timer.peaks[name] = max(timer.peaks.get(name, 0), peak)
+                return False
+
+        return _Peak()
+
+
+def _consensus(batch, timer):
+    smd.predict_consensus_batch(batch, timer=timer)
+
+
+def _explain(batch):
+    for msg in batch:
+        smd.explain_consensus_prediction(msg)
+
+
+def bench_batch_size(messages, batch_size, repeats, rng, explain):
+    """Latency samples and memory peaks for one batch size"""
+    batches = [rng.sample(messages, batch_size) if batch_size <= len(messages)
+               else [rng.choice(messages) for _ in range(batch_size)]
+               for _ in range(repeats)]
+    samples = {}
+
+    # Warm-up: lazy loads, caches and BLAS threads outside the measurement
+    _consensus(batches[0], None)
+
+    for batch in batches:
+        timer = StageTimer()
+        start = time.perf_counter_ns()
+        _consensus(batch, timer)
+        elapsed = time.perf_counter_ns() - start
+        for name, ns in timer.stages.items():
+            samples.setdefault(name, []).append(ns)
+        samples.setdefault('consensus', []).append(elapsed)
+
+    explain_batches = batches[:max(3, repeats // 10)] if explain else []
+    for batch in explain_batches:
+        start = time.perf_counter_ns()
+        _explain(batch)
+        samples.setdefault('explain', []).append(time.perf_counter_ns() - start)
+
+    # Memory pass, one batch under tracemalloc
+    peaks = {}
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        _consensus(batches[0], None)
+        peaks['consensus'] = tracemalloc.get_traced_memory()[1] - before
+        # Per-stage peaks (PeakTimer resets the peak at each stage boundary)
+        peak_timer = PeakTimer()
+        _consensus(batches[0], peak_timer)
+        peaks.update(peak_timer.peaks)
+        if explain_batches:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            _explain(explain_batches[0])
+            peaks['explain'] = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+    results = {}
+    for name, stage_samples in samples.items():
+        results[name] = summarize(stage_samples, batch_size)
+        results[name]['peak_alloc_bytes'] = peaks.get(name)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versions():
+    versions = {'python': platform.python_version()}
+    for module in ('numpy', 'scipy', 'sklearn', 'nltk', 'joblib'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return versions
+
+
+def run(batch_sizes=DEFAULT_BATCH_SIZES, repeats=None, seed=42, explain_max_batch=DEFAULT_EXPLAIN_MAX_BATCH,
+        data_path=DATA_PATH):
+    messages = load_messages(data_path)
+    with open(data_path, 'rb') as f:
+        dataset_sha256 = hashlib.sha256(f.read()).hexdigest()
+
+    load_start = time.perf_counter()
+    smd.load_models()
+    load_ms = (time.perf_counter() - load_start) * 1000
+
+    results = {}
+    for batch_size in batch_sizes:
+        n = repeats or default_repeats(batch_size)
+        print(f"⏱️  batch_size={batch_size} x {n}...")
+        rng = random.Random(f"{seed}:{batch_size}")
+        results[str(batch_size)] = bench_batch_size(messages, batch_size, n, rng,
+                                                    explain=batch_size <= explain_max_batch)
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'platform': {'machine': platform.machine(), 'system': platform.system(), 'cpus': os.cpu_count()},
+        'versions': _versions(),
+        'dataset': {'path': os.path.relpath(data_path, ROOT), 'messages': len(messages), 'sha256': dataset_sha256},
+        'seed': seed,
+        'models': list(smd.model_results),
+        'model_load_ms': round(load_ms, 1),
+        # ru_maxrss is KiB on Linux
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'results': results,
+    }
+
+
+def print_report(report):
+    print(f"\n📊 Inference benchmark ({len(report['models'])} models, commit {str(report['commit'])[:10]})")
+    print(f"{'batch':>6} {'stage':<28} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'msg/s':>11} {'peak KiB':>10}")
+    for batch_size, stages in report['results'].items():
+        for name, r in stages.items():
+            peak = r['peak_alloc_bytes']
+            peak = f"{peak / 1024:.0f}" if peak is not None else '-'
+            print(f"{batch_size:>6} {name:<28} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+                  f"{r['throughput_msgs_per_s']:>11.1f} {peak:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the inference pipeline on spam.csv')
+    parser.add_argument('--batch-sizes', default=','.join(str(b) for b in DEFAULT_BATCH_SIZES),
+                        help='Comma-separated batch sizes (default: 1,32,1024)')
+    parser.add_argument('--repeats', type=int, default=None,
+                        help='Batches per size (default: scaled by batch size)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--explain-max-batch', type=int, default=DEFAULT_EXPLAIN_MAX_BATCH,
+                        help='Skip explanations above this batch size')
+    parser.add_argument('--data', default=DATA_PATH, help='Path to spam.csv')
+    parser.add_argument('--output', '-o', help='Write JSON results here')
+    args = parser.parse_args()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',') if b.strip()]
+    report = run(batch_sizes, args.repeats, args.seed, args.explain_max_batch, args.data)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare two bench_inference.py result files
+
+Exits with status 1 when any stage present in both files regressed by
+more than the threshold: p50 or p95 latency up, throughput down, or (with
+--memory-threshold) peak allocation up. Stages below --min-ms are ignored
+for latency since their timings are mostly noise.
+
+    python benchmarks/compare.py baseline.json current.json --threshold 0.15
+"""
+
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ('p50_ms', 'p95_ms')
+
+
+def _ratio(before, after):
+    if before is None or after is None or before <= 0:
+        return None
+    return after / before - 1
+
+
+def compare(baseline, current, threshold=0.15, memory_threshold=None, min_ms=0.05):
+    """
+    Rows for every (batch size, stage) in both reports
+
+    Each row is a dict with batch_size, stage, metric, baseline, current,
+    change (fraction, positive is worse) and regressed.
+    """
+    rows = []
+    for batch_size, stages in current['results'].items():
+        base_stages = baseline['results'].get(batch_size, {})
+        for stage, cur in stages.items():
+            base = base_stages.get(stage)
+            if base is None:
+                continue
+            checks = []
+            if max(base['p50_ms'], cur['p50_ms']) >= min_ms:
+                checks += [(key, base[key], cur[key], _ratio(base[key], cur[key]), threshold) for key in LATENCY_KEYS]
+                # Lower throughput is worse, so flip the sign
+                change = _ratio(cur['throughput_msgs_per_s'], base['throughput_msgs_per_s'])
+                checks.append(('throughput_msgs_per_s', base['throughput_msgs_per_s'],
+                               cur['throughput_msgs_per_s'], change, threshold))
+            if memory_threshold is not None:
+                checks.append(('peak_alloc_bytes', base.get('peak_alloc_bytes'), cur.get('peak_alloc_bytes'),
+                               _ratio(base.get('peak_alloc_bytes'), cur.get('peak_alloc_bytes')), memory_threshold))
+            for metric, before, after, change, limit in checks:
+                rows.append({
+                    'batch_size': batch_size,
+                    'stage': stage,
+                    'metric': metric,
+                    'baseline': before,
+                    'current': after,
+                    'change': change,
+                    'regressed': change is not None and change > limit,
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail on inference benchmark regressions')
+    parser.add_argument('baseline', help='Results JSON from the reference commit')
+    parser.add_argument('current', help='Results JSON to check')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Allowed fractional slowdown (default: 0.15 = 15%%)')
+    parser.add_argument('--memory-threshold', type=float, default=None,
+                        help='Also fail when peak allocation grows by more than this fraction')
+    parser.add_argument('--min-ms', type=float, default=0.05,
+                        help='Ignore latency of stages faster than this (default: 0.05 ms)')
+    parser.add_argument('--all', action='store_true', help='Print every row, not only regressions')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    for key in ('dataset', 'seed', 'models'):
+        if baseline.get(key) != current.get(key):
+            print(f"⚠️  {key} differs between runs; results may not be comparable")
+
+    rows = compare(baseline, current, args.threshold, args.memory_threshold, args.min_ms)
+    regressions = [r for r in rows if r['regressed']]
+    shown = rows if args.all else regressions
+    if shown:
+        print(f"{'batch':>6} {'stage':<28} {'metric':<22} {'baseline':>12} {'current':>12} {'change':>8}")
+        for r in shown:
+            change = f"{r['change'] * 100:+.1f}%" if r['change'] is not None else '-'
+            mark = ' ❌' if r['regressed'] else ''
+            print(f"{r['batch_size']:>6} {r['stage']:<28} {r['metric']:<22} {r['baseline']!s:>12} {r['current']!s:>12} {change:>8}{mark}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) above {args.threshold * 100:.0f}%")
+        sys.exit(1)
+    print(f"✅ No regressions above {args.threshold * 100:.0f}% ({len(rows)} checks, "
+          f"{str(baseline.get('commit'))[:10]} -> {str(current.get('commit'))[:10]})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the SMS Guard API
+
+Drives mixed traffic (predict, explain, stats, history, ...) against the
+real Flask app at a fixed concurrency and reports throughput, latency
+percentiles and error rates per endpoint. Everything runs offline: the
+app comes from benchmarks/loadtest_app.py, which stubs SendGrid and Gemini
+and blocks outbound connections, and the JWT is minted directly for a
+seeded load-test user.
+
+Servers:
+  --server inprocess   threaded Werkzeug server in this process (default)
+  --server gunicorn    gunicorn subprocess with --workers N, for sizing workers
+  --server url --url   an already running instance (logs in as the load-test user)
+
+    python benchmarks/loadtest.py --server gunicorn --workers 2 --concurrency 8 --duration 60
+    python benchmarks/loadtest.py --mix predict=70,history=30 --output load.json
+
+DATABASE_URL selects the database (default: a temporary SQLite file).
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from bench_inference import load_messages, percentile
+from loadtest_app import DEFAULT_DATABASE_URL, LOADTEST_USER
+
+DEFAULT_MIX = 'predict=60,explain=10,stats=15,history=15'
+BATCH_SIZE = 32
+CHAT_QUESTION = 'Is this message safe to reply to?'
+
+
+def _endpoint_request(name, rng, messages):
+    """(method, path, json body) for one request to the named endpoint"""
+    msg = rng.choice(messages)
+    if name == 'predict':
+        return 'POST', '/api/predict', {'message': msg}
+    if name == 'explain':
+        return 'POST', '/api/explain', {'message': msg}
+    if name == 'batch':
+        return 'POST', '/api/predict/batch', {'messages': [rng.choice(messages) for _ in range(BATCH_SIZE)]}
+    if name == 'stats':
+        return 'GET', '/api/user/stats', None
+    if name == 'history':
+        return 'GET', '/api/user/predictions?page=1&per_page=20', None
+    if name == 'chat':
+        return 'POST', '/api/chatbot/chat', {'message': CHAT_QUESTION, 'contextMessage': msg}
+    if name == 'forgot_password':
+        return 'POST', '/api/auth/forgot-password', {'email': LOADTEST_USER['email']}
+    if name == 'health':
+        return 'GET', '/api/health', None
+    raise ValueError(f"Unknown endpoint '{name}'")
+
+
+ENDPOINTS = ('predict', 'explain', 'batch', 'stats', 'history', 'chat', 'forgot_password', 'health')
+
+
+def parse_mix(mix):
+    """'predict=60,stats=40' -> {'predict': 60.0, 'stats': 40.0}"""
+    weights = {}
+    for part in mix.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError('Traffic mix is empty')
+    return weights
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_healthy(base_url, timeout=120, proc=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            if requests.get(base_url + '/api/health', timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{base_url} did not become healthy within {timeout}s")
+
+
+class InProcessServer:
+    """Threaded Werkzeug server on a free loopback port"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self.server = make_server('127.0.0.1', _free_port(), app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        _wait_healthy(self.base_url)
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class GunicornServer:
+    """gunicorn subprocess serving loadtest_app with N workers"""
+
+    def __init__(self, workers, threads=1, env=None):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.cmd = [
+            sys.executable, '-m', 'gunicorn', '-c', os.path.join('backend', 'gunicorn.conf.py'),
+            '--workers', str(workers), '--threads', str(threads), '--timeout', '120',
+            '-b', f"127.0.0.1:{self.port}", 'benchmarks.loadtest_app:create_app()',
+        ]
+        self.env = env
+        self.proc = None
+
+    def start(self):
+        self.proc = subprocess.Popen(self.cmd, cwd=ROOT, env=self.env)
+        _wait_healthy(self.base_url, proc=self.proc)
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def _login(base_url):
+    """Token for the load-test user on an external server, registering it if needed"""
+    body = {'usernameOrEmail': LOADTEST_USER['username'], 'password': LOADTEST_USER['password']}
+    r = requests.post(base_url + '/api/auth/login', json=body, timeout=30)
+    if r.status_code != 200:
+        r = requests.post(base_url + '/api/auth/register', json=LOADTEST_USER, timeout=30)
+    r.raise_for_status()
+    return r.json()['data']['token']
+
+
+class Recorder:
+    """Per-endpoint latency samples and outcomes, shared by the client threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}  # endpoint -> [ms]
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, endpoint, elapsed_ms, status):
+        ok = status is not None and 200 <= status < 400
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(elapsed_ms)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            counts = self.statuses.setdefault(endpoint, {})
+            key = str(status) if status is not None else 'exception'
+            counts[key] = counts.get(key, 0) + 1
+
+    def report(self, wall_s):
+        endpoints = {}
+        everything = []
+        for endpoint, samples in sorted(self.samples.items()):
+            everything.extend(samples)
+            endpoints[endpoint] = self._summary(samples, self.errors.get(endpoint, 0), wall_s)
+            endpoints[endpoint]['statuses'] = self.statuses[endpoint]
+        total_errors = sum(self.errors.values())
+        return {'total': self._summary(everything, total_errors, wall_s), 'endpoints': endpoints}
+
+    @staticmethod
+    def _summary(samples, errors, wall_s):
+        ordered = sorted(samples)
+        return {
+            'requests': len(ordered),
+            'errors': errors,
+            'error_rate': round(errors / len(ordered), 4) if ordered else 0.0,
+            'throughput_rps': round(len(ordered) / wall_s, 2) if wall_s else None,
+            'p50_ms': round(percentile(ordered, 0.50), 2) if ordered else None,
+            'p95_ms': round(percentile(ordered, 0.95), 2) if ordered else None,
+            'p99_ms': round(percentile(ordered, 0.99), 2) if ordered else None,
+            'max_ms': round(ordered[-1], 2) if ordered else None,
+        }
+
+
+def _client(base_url, token, weights, messages, seed, deadline, budget, recorder, timeout):
+    rng = random.Random(seed)
+    names, cum = list(weights), list(weights.values())
+    session = requests.Session()
+    session.headers['Authorization'] = f"Bearer {token}"
+    while time.monotonic() < deadline and budget.take():
+        endpoint = rng.choices(names, weights=cum)[0]
+        method, path, body = _endpoint_request(endpoint, rng, messages)
+        start = time.perf_counter()
+        try:
+            status = session.request(method, base_url + path, json=body, timeout=timeout).status_code
+        except requests.RequestException:
+            status = None
+        recorder.record(endpoint, (time.perf_counter() - start) * 1000, status)
+
+
+class _Budget:
+    """Shared request budget (unlimited when total is None)"""
+
+    def __init__(self, total):
+        self.remaining = total
+        self.lock = threading.Lock()
+
+    def take(self):
+        if self.remaining is None:
+            return True
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def run_load(base_url, token, weights, concurrency=4, duration=30.0, total_requests=None, seed=42,
+             timeout=60.0, warmup=True):
+    messages = load_messages()
+    if warmup:
+        # First requests load the model bundle in each worker; keep that out of the
+        # numbers. Concurrent warm-up clients spread over gunicorn's workers.
+        def _warm(i):
+            rng = random.Random(f"{seed}:warmup:{i}")
+            session = requests.Session()
+            session.headers['Authorization'] = f"Bearer {token}"
+            for endpoint in weights:
+                method, path, body = _endpoint_request(endpoint, rng, messages)
+                try:
+                    session.request(method, base_url + path, json=body, timeout=max(timeout, 300))
+                except requests.RequestException:
+                    pass
+
+        warmers = [threading.Thread(target=_warm, args=(i,), daemon=True) for i in range(concurrency)]
+        for t in warmers:
+            t.start()
+        for t in warmers:
+            t.join()
+
+    recorder = Recorder()
+    budget = _Budget(total_requests)
+    deadline = time.monotonic() + (duration if total_requests is None else float('inf'))
+    threads = [threading.Thread(target=_client, args=(base_url, token, weights, messages, f"{seed}:{i}",
+                                                      deadline, budget, recorder, timeout), daemon=True)
+               for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - start
+    report = recorder.report(wall_s)
+    report['wall_s'] = round(wall_s, 2)
+    return report
+
+
+def print_report(report):
+    cfg = report['config']
+    print(f"\n📊 Load test: {cfg['server']} (workers={cfg['workers']}), concurrency={cfg['concurrency']}, "
+          f"{report['wall_s']:.1f}s")
+    print(f"{'endpoint':<16} {'reqs':>7} {'err%':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    rows = list(report['endpoints'].items()) + [('TOTAL', report['total'])]
+    for name, r in rows:
+        print(f"{name:<16} {r['requests']:>7} {r['error_rate'] * 100:>6.2f} {r['throughput_rps']:>8.2f} "
+              f"{r['p50_ms']!s:>9} {r['p95_ms']!s:>9} {r['p99_ms']!s:>9} {r['max_ms']!s:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline HTTP load test for the SMS Guard API')
+    parser.add_argument('--server', choices=['inprocess', 'gunicorn', 'url'], default='inprocess')
+    parser.add_argument('--url', help='Base URL when --server url (e.g. http://127.0.0.1:5000)')
+    parser.add_argument('--token', help='JWT to use with --server url (default: log in as the load-test user)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (default: 2)')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker (default: 1)')
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help='Concurrent clients (default: 4)')
+    parser.add_argument('--duration', '-d', type=float, default=30.0, help='Seconds to run (default: 30)')
+    parser.add_argument('--requests', '-n', type=int, default=None, help='Stop after this many requests instead')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f"Endpoint weights (default: {DEFAULT_MIX}; also: {', '.join(ENDPOINTS)})")
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-warmup', action='store_true', help='Include the first (cold) requests')
+    parser.add_argument('--output', '-o', help='Write JSON results here')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    os.environ.setdefault('DATABASE_URL', DEFAULT_DATABASE_URL)
+    # Shared with a gunicorn subprocess so tokens minted here verify there
+    os.environ.setdefault('JWT_SECRET_KEY', 'loadtest-jwt-secret')
+
+    server = None
+    if args.server == 'url':
+        if not args.url:
+            parser.error('--server url needs --url')
+        base_url = args.url.rstrip('/')
+        token = args.token or _login(base_url)
+    else:
+        import loadtest_app
+        app = loadtest_app.create_app()
+        token = loadtest_app.seed_user(app)
+        if args.server == 'inprocess':
+            server = InProcessServer(app)
+        else:
+            env = dict(os.environ)
+            env.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='smsguard_prom_'))
+            server = GunicornServer(args.workers, args.threads, env)
+        server.start()
+        base_url = server.base_url
+
+    print(f"🚀 {base_url}: mix {weights}, concurrency {args.concurrency}, "
+          f"{args.requests or str(args.duration) + 's'}")
+    try:
+        report = run_load(base_url, token, weights, args.concurrency, args.duration, args.requests,
+                          args.seed, args.timeout, warmup=not args.no_warmup)
+    finally:
+        if server is not None:
+            server.stop()
+
+    report.update({
+        'config': {
+            'server': args.server,
+            'workers': args.workers if args.server == 'gunicorn' else None,
+            'threads': args.threads if args.server == 'gunicorn' else None,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration if args.requests is None else None,
+            'requests': args.requests,
+            'mix': weights,
+            'database': os.environ['DATABASE_URL'].split('://', 1)[0] if args.server != 'url' else None,
+            'cpus': os.cpu_count(),
+        },
+    })
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+    if report['total']['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Offline build of the Flask app for load tests
+
+create_app() returns the real backend app with external services replaced:
+SendGrid and Gemini calls return canned results after a configurable delay
+(LOADTEST_STUB_LATENCY_MS, default 50), and any outgoing connection to a
+non-loopback address raises, so a load run never touches the network.
+
+DATABASE_URL defaults to a SQLite file in the temp directory; point it at
+a local Postgres to test the production driver. Serve it with
+
+    gunicorn -c backend/gunicorn.conf.py 'benchmarks.loadtest_app:create_app()'
+
+or let benchmarks/loadtest.py start it for you.
+"""
+
+import ipaddress
+import os
+import socket
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'smsguard_loadtest.db')
+LOADTEST_USER = {'username': 'loadtest', 'email': 'loadtest@example.com', 'password': 'loadtest-password'}
+
+_real_connect = socket.socket.connect
+
+
+def _stub_delay():
+    time.sleep(float(os.environ.get('LOADTEST_STUB_LATENCY_MS', 50)) / 1000)
+
+
+def _is_local(address):
+    if not isinstance(address, tuple):
+        return True  # AF_UNIX path
+    host = address[0]
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _offline_connect(sock, address):
+    if not _is_local(address):
+        raise ConnectionRefusedError(f"load test is offline; blocked connection to {address!r}")
+    return _real_connect(sock, address)
+
+
+def install_stubs():
+    """Replace SendGrid and Gemini with local stubs and block outbound sockets"""
+    from backend.routes import auth, chatbot
+
+    def send_email_sendgrid(email, reset_link, api_key):
+        _stub_delay()
+        return True
+
+    def gemini_chatbot_response(user_message, context_message, context_prediction):
+        _stub_delay()
+        return "This is a stubbed assistant reply for load testing."
+
+    auth.send_email_sendgrid = send_email_sendgrid
+    chatbot.gemini_chatbot_response = gemini_chatbot_response
+    os.environ.setdefault('SENDGRID_API_KEY', 'loadtest-stub')
+    socket.socket.connect = _offline_connect
+
+
+def create_app():
+    """The backend app with stubs installed and tables created"""
+    os.environ.setdefault('DATABASE_URL', DEFAULT_DATABASE_URL)
+    from backend.app import create_app as create_backend_app
+    from backend.models import db
+
+    install_stubs()
+    app = create_backend_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed_user(app):
+    """Create (or reuse) the load-test user and return a JWT for it"""
+    from flask_jwt_extended import create_access_token
+    from backend.models import User, db
+
+    with app.app_context():
+        user = User.query.filter_by(username=LOADTEST_USER['username']).first()
+        if user is None:
+            user = User(username=LOADTEST_USER['username'], email=LOADTEST_USER['email'])
+            user.set_password(LOADTEST_USER['password'])
+            db.session.add(user)
+            db.session.commit()
+        return create_access_token(identity=user.id)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Vendor NLTK data into the model bundle (backend/ml_model/models/nltk_data)
+
+Run this on a build machine with network access. It downloads the
+stopwords and punkt resources into a temporary directory if needed,
+copies them into the bundle, and reports how often the bundled tokenizer
+disagrees with nltk.word_tokenize on spam.csv. Serving never downloads
+anything; see backend/ml_model/nltk_resources.py.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT)
+
+from backend.ml_model import nltk_resources
+
+RESOURCES = [
+    ('stopwords', 'corpora/stopwords/english', nltk_resources.STOPWORDS_FILE),
+    ('punkt', 'tokenizers/punkt/PY3/english.pickle', nltk_resources.PUNKT_FILE),
+]
+
+
+def vendor():
+    """Copy the resources into the bundle, downloading them first if missing"""
+    import nltk
+    download_dir = tempfile.mkdtemp(prefix='nltk_data_')
+    for package, resource, target in RESOURCES:
+        try:
+            source = nltk.data.find(resource)
+        except LookupError:
+            print(f"📦 Downloading {package}...")
+            if not nltk.download(package, download_dir=download_dir, quiet=True):
+                print(f"❌ Could not download {package}")
+                continue
+            source = nltk.data.find(resource, paths=[download_dir])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(str(source), target)
+        print(f"✅ {resource} -> {os.path.relpath(target, ROOT)}")
+    shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def check_parity():
+    """Compare the bundled tokenizer with nltk.word_tokenize on spam.csv"""
+    import csv
+    import nltk
+    data_path = os.path.join(ROOT, 'ml_notebooks', 'main_notebook', 'spam.csv')
+    with open(data_path, encoding='latin-1', newline='') as f:
+        texts = [row[1] for row in csv.reader(f) if len(row) > 1][1:]
+    mismatches = [t for t in texts if nltk.word_tokenize(t.lower()) != nltk_resources.word_tokenize(t.lower())]
+    source = 'vendored punkt' if nltk_resources.has_vendored_punkt() else 'rule-based sentence split'
+    print(f"📊 Tokenizer parity ({source}): {len(texts) - len(mismatches)}/{len(texts)} messages identical")
+    for t in mismatches[:5]:
+        print(f"   differs: {t[:80]!r}")
+
+
+if __name__ == '__main__':
+    vendor()
+    check_parity()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Regression gate for benchmarks/compare.py
+
+Checks that a slowdown above the threshold is flagged and noise below it
+is not, using two hand-written result files.
+
+Run with: python -m pytest -q test_benchmark_compare.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from compare import compare
+
+
+def _report(p50, p95, throughput, peak=1000):
+    stage = {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p95, 'throughput_msgs_per_s': throughput,
+             'peak_alloc_bytes': peak}
+    return {'results': {'32': {'consensus': stage}}}
+
+
+def test_flags_slowdown_above_threshold():
+    rows = compare(_report(10, 12, 3200), _report(13, 15, 2400), threshold=0.15)
+    assert {r['metric'] for r in rows if r['regressed']} == {'p50_ms', 'p95_ms', 'throughput_msgs_per_s'}
+
+
+def test_ignores_noise_and_improvements():
+    rows = compare(_report(10, 12, 3200), _report(10.5, 11, 3400), threshold=0.15)
+    assert not any(r['regressed'] for r in rows)
+
+
+def test_memory_only_checked_when_requested():
+    base, cur = _report(10, 12, 3200, peak=1000), _report(10, 12, 3200, peak=2000)
+    assert not any(r['regressed'] for r in compare(base, cur))
+    assert any(r['regressed'] and r['metric'] == 'peak_alloc_bytes'
+               for r in compare(base, cur, memory_threshold=0.5))
+
+
+if __name__ == '__main__':
+    test_flags_slowdown_above_threshold()
+    test_ignores_noise_and_improvements()
+    test_memory_only_checked_when_requested()
+    print('✅ compare.py checks passed')
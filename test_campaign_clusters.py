@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Campaign clustering model (backend/ml_model/campaign_clusters.py)
+
+Variants of one campaign land in the same cluster across partial_fit
+batches, cluster labels never show numbers, and the model survives the
+dumps/loads round trip through the campaign_models row with the same
+assignments.
+
+Run with: python -m pytest -q test_campaign_clusters.py
+"""
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from backend.ml_model import campaign_clusters
+
+PRIZE = "urgent prize claim call {} award cash guarante"
+LOAN = "loan approv low rate appli today repli {} credit"
+DATING = "singl area chat meet tonight text {} date"
+
+
+def _batch(start):
+    return [template.format(f"0906170{start + i:04d}") for i in range(6) for template in (PRIZE, LOAN, DATING)]
+
+
+def test_campaign_variants_cluster_together_across_batches():
+    vectorizer = TfidfVectorizer().fit(_batch(0))
+    model = campaign_clusters.CampaignModel("test", n_clusters=3, seed=0)
+    first, second = _batch(0), _batch(100)
+    model.partial_fit(vectorizer.transform(first))
+    model.partial_fit(vectorizer.transform(second))
+
+    labels, distances = model.assign(vectorizer.transform(second), second)
+    by_campaign = {}
+    for text, label in zip(second, labels):
+        by_campaign.setdefault(text.split()[0], set()).add(int(label))
+    assert all(len(found) == 1 for found in by_campaign.values())
+    assert len({next(iter(found)) for found in by_campaign.values()}) == 3
+    assert (distances >= 0).all()
+
+    prize = by_campaign["urgent"].pop()
+    terms = model.top_terms(prize, n=4)
+    assert "prize" in terms and campaign_clusters.NUMBER_TOKEN not in terms
+
+    loaded = campaign_clusters.loads(campaign_clusters.dumps(model))
+    assert loaded.fitted and loaded.samples == len(first) + len(second)
+    assert (loaded.assign(vectorizer.transform(second), second)[0] == labels).all()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Training feature cache (backend/ml_model/feature_cache.py)
+
+A cached corpus and TF-IDF matrix round-trip to the same values, and the
+vectorizer rebuilt from the cached vocabulary transforms like a fresh
+fit. Bumping PREPROCESSING_VERSION starts a new entry, and
+FEATURE_CACHE=false never touches the cache.
+
+Run with: python -m pytest -q test_feature_cache.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from backend.ml_model import feature_cache
+
+MESSAGES = [
+    ("spam", "WINNER!! You have won a 900 prize reward! Call 09061701461 to claim"),
+    ("ham", "Hey, are we still on for lunch tomorrow?"),
+    ("spam", "URGENT! Your mobile number has won a cash award. Txt CLAIM to 81010"),
+    ("ham", "Sorry, I'll call you later. In a meeting right now"),
+    ("spam", "Free entry in a weekly competition to win cup final tickets, text FA to 87121"),
+    ("ham", "Can you pick up some milk on the way home?"),
+]
+NEW = ["Claim your free prize now, call today", "See you at lunch, running late"]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / 'spam.csv'
+    path.write_text("v1,v2\n" + "".join(f'{label},"{text}"\n' for label, text in MESSAGES), encoding='latin-1')
+    return str(path), str(tmp_path / 'cache')
+
+
+def _features(df, path, cache_dir):
+    return feature_cache.load_features(df, max_features=50, ngram_range=(1, 2), path=path, cache_dir=cache_dir)
+
+
+def test_cached_features_match_a_fresh_fit(corpus):
+    path, cache_dir = corpus
+    df = feature_cache.load_corpus(path, cache_dir)
+    assert os.path.exists(os.path.join(feature_cache.corpus_dir(path, cache_dir), 'corpus.json'))
+    _features(df, path, cache_dir)
+
+    cached_df = feature_cache.load_corpus(path, cache_dir)
+    assert cached_df['transformed_text'].tolist() == df['transformed_text'].tolist()
+    assert cached_df['target'].tolist() == [1, 0, 1, 0, 1, 0]
+    vectorizer, X = _features(cached_df, path, cache_dir)
+    # Rebuilt from vocabulary.json, not refit (a fit keeps the dropped terms)
+    assert vectorizer.stop_words_ == set()
+
+    fresh = TfidfVectorizer(max_features=50, ngram_range=(1, 2))
+    X_fresh = fresh.fit_transform(df['transformed_text'])
+    assert vectorizer.vocabulary_ == fresh.vocabulary_
+    assert X.shape == X_fresh.shape and np.allclose(X.toarray(), X_fresh.toarray())
+    clean = [feature_cache.smd.transform_text(t) for t in NEW]
+    assert np.allclose(vectorizer.transform(clean).toarray(), fresh.transform(clean).toarray())
+
+
+def test_preprocessing_version_changes_the_entry(corpus, monkeypatch):
+    path, cache_dir = corpus
+    before = feature_cache.corpus_dir(path, cache_dir)
+    monkeypatch.setattr(feature_cache, 'PREPROCESSING_VERSION', feature_cache.PREPROCESSING_VERSION + 1)
+    assert feature_cache.corpus_dir(path, cache_dir) != before
+
+
+def test_disabled_cache_is_bypassed(corpus, monkeypatch):
+    path, cache_dir = corpus
+    monkeypatch.setenv('FEATURE_CACHE', 'false')
+    df = feature_cache.load_corpus(path, cache_dir)
+    _, X = _features(df, path, cache_dir)
+    assert X.shape[0] == len(MESSAGES)
+    assert not os.path.exists(cache_dir)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Prediction feedback and the online learning job
+
+POST /api/feedback validates the label, only accepts the user's own
+predictions, lets a label change until it is learned and refuses it
+afterwards. learn_from_feedback.run() marks learned rows, sets the rows
+of a rejected snapshot aside, and --requeue-rejected makes them pending
+again. The snapshot itself is stubbed; online_learning has its own
+evaluation.
+
+Run with: python -m pytest -q test_feedback.py
+"""
+
+import os
+import tempfile
+import uuid
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from backend.models import db, User, Message, Prediction, PredictionFeedback
+from backend import learn_from_feedback
+from backend.ml_model import online_learning
+
+
+@pytest.fixture
+def app(monkeypatch):
+    tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    tmp.close()
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp.name}')
+    from backend.app import create_app
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    os.unlink(tmp.name)
+
+
+def _user(name):
+    user = User(username=name, email=f'{name}@example.com')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user, {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+
+def _prediction(user, text, verdict='ham'):
+    message = Message.get_or_create(text)
+    prediction = Prediction(id=str(uuid.uuid4()), user_id=user.id, message=text,
+                            message_hash=message.content_hash, prediction=verdict, confidence=0.9)
+    db.session.add(prediction)
+    db.session.commit()
+    return prediction
+
+
+def test_feedback_endpoint(app):
+    client = app.test_client()
+    owner, headers = _user('owner')
+    _, other_headers = _user('other')
+    prediction = _prediction(owner, 'Claim your free prize now, reply WIN')
+
+    def send(label, h=headers, prediction_id=prediction.id):
+        return client.post('/api/feedback', json={'prediction_id': prediction_id, 'label': label}, headers=h)
+
+    assert send('maybe').status_code == 400
+    assert send('spam', other_headers).status_code == 404
+    assert send('spam', prediction_id='missing').status_code == 404
+
+    r = send('spam')
+    assert r.status_code == 200 and r.get_json()['data']['label'] == 'spam'
+    # A rejected label can still be corrected, and is queued again
+    PredictionFeedback.query.update({PredictionFeedback.rejected_version: 'v-rejected'})
+    db.session.commit()
+    r = send('ham')
+    assert r.status_code == 200
+    feedback = PredictionFeedback.query.one()
+    db.session.refresh(feedback)
+    assert feedback.label == 'ham' and feedback.rejected_version is None
+
+    # Once learned, the label cannot be taken back out of the online models
+    feedback.learned_version = 'v1'
+    db.session.commit()
+    assert send('spam').status_code == 409
+    assert send('ham').status_code == 200
+    db.session.refresh(feedback)
+    assert feedback.label == 'ham' and feedback.learned_version == 'v1'
+
+
+def test_rejected_snapshot_sets_rows_aside_until_requeued(app, monkeypatch):
+    user, _ = _user('learner')
+    for i in range(3):
+        prediction = _prediction(user, f'Urgent: your account {i} needs verification, call now')
+        db.session.add(PredictionFeedback(prediction_id=prediction.id, user_id=user.id,
+                                          message_hash=prediction.message_hash, label='spam', predicted='ham'))
+    db.session.commit()
+
+    monkeypatch.setattr(online_learning, 'learn', lambda *args: (None, {'version': 'v-rejected', 'metrics': {}}))
+    assert learn_from_feedback.run() is None
+    rows = PredictionFeedback.query.all()
+    assert {(r.rejected_version, r.learned_version) for r in rows} == {('v-rejected', None)}
+    assert learn_from_feedback.pending_feedback() == []
+
+    assert learn_from_feedback.requeue_rejected('v-other') == 0
+    assert learn_from_feedback.requeue_rejected('v-rejected') == 3
+    assert len(learn_from_feedback.pending_feedback()) == 3
+
+    monkeypatch.setattr(online_learning, 'learn', lambda *args: ('v2', {'version': 'v2', 'metrics': {}}))
+    assert learn_from_feedback.run() == 'v2'
+    db.session.expire_all()
+    assert {(r.rejected_version, r.learned_version) for r in PredictionFeedback.query} == {(None, 'v2')}
+    assert learn_from_feedback.pending_feedback() == []
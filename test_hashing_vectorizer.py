@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+HashedTfidfVectorizer against TfidfVectorizer
+
+With a hash space large enough for no collisions the hashed features must
+be TfidfVectorizer's features with the columns permuted, and fitting from
+a stream must give the same result as fitting from a list.
+
+Run with: python -m pytest -q test_hashing_vectorizer.py
+"""
+
+import pickle
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from backend.ml_model.hashing_features import HashedTfidfVectorizer
+
+TEXTS = [
+    "free entri wkli comp win fa cup final tkt",
+    "nah think goe usf live around though",
+    "winner valu network custom select receivea prize reward",
+    "even brother like speak treat like aid patent",
+    "urgent mobil number award cash prize call",
+    "lunch tomorrow still call later",
+] * 3
+
+
+def _sorted_rows(X):
+    X = X.tocsr()
+    return [np.sort(X[i].data) for i in range(X.shape[0])]
+
+
+def test_matches_tfidf_without_collisions():
+    expected = TfidfVectorizer(ngram_range=(1, 2)).fit_transform(TEXTS)
+    hashed = HashedTfidfVectorizer(n_features=2 ** 20, ngram_range=(1, 2), max_features=None)
+    X = hashed.fit_transform(TEXTS)
+    assert X.nnz == expected.nnz
+    # idf_ is stored as float32
+    for row, expected_row in zip(_sorted_rows(X), _sorted_rows(expected)):
+        assert np.allclose(row, expected_row, atol=1e-6)
+
+
+def test_streaming_fit_and_max_features():
+    listed = HashedTfidfVectorizer(n_features=2 ** 18, max_features=20)
+    X = listed.fit_transform(TEXTS)
+    streamed = HashedTfidfVectorizer(n_features=2 ** 18, max_features=20, chunk_size=4)
+    streamed.fit(text for text in TEXTS)
+    assert X.shape == (len(TEXTS), 20)
+    assert (abs(streamed.transform(TEXTS) - X)).max() < 1e-6
+    assert streamed.fingerprint() == listed.fingerprint()
+
+
+def test_pickle_is_small_and_transforms_after_load():
+    hashed = HashedTfidfVectorizer().fit(TEXTS)
+    blob = pickle.dumps(hashed)
+    assert len(blob) < 64 * 1024
+    loaded = pickle.loads(blob)
+    assert (abs(loaded.transform(TEXTS[:2]) - hashed.transform(TEXTS[:2]))).max() == 0
+    assert loaded.feature_index("prize") is not None
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Import-cost budget for the prediction blueprint
+
+Imports backend.routes.predictions in a fresh interpreter. It fails when a
+training/explainer-only library (pandas, LIME, SHAP, XGBoost, the sklearn
+ensembles, NLTK) is in sys.modules afterwards, or when the best of
+IMPORT_RUNS `python -X importtime` runs goes over the cumulative budget.
+The budget has headroom for noisy machines; the modules check is the one
+that catches regressions.
+
+Run with: python -m pytest -q test_import_time.py   (or python test_import_time.py)
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+TARGET = 'backend.routes.predictions'
+
+# Cumulative import time budget in milliseconds, for the fastest of IMPORT_RUNS runs
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 1500))
+IMPORT_RUNS = int(os.environ.get('IMPORT_RUNS', 3))
+
+# Only needed for training or explanations; must load on first use
+FORBIDDEN = ('pandas', 'lime', 'shap', 'xgboost', 'sklearn.ensemble', 'nltk')
+
+
+def _run(args):
+    out = subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, timeout=300,
+                         env={**os.environ, 'DATABASE_URL': os.environ.get('DATABASE_URL', 'sqlite://')})
+    assert out.returncode == 0, out.stderr[-2000:]
+    return out
+
+
+def loaded_modules(module=TARGET):
+    """Names in sys.modules after importing module in a fresh interpreter"""
+    out = _run(['-c', f'import sys, {module}; print("\\n".join(sys.modules))'])
+    return set(out.stdout.split())
+
+
+def import_profile(module=TARGET):
+    """Return {module_name: cumulative_us} from -X importtime"""
+    out = _run(['-X', 'importtime', '-c', f'import {module}'])
+    profile = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def test_prediction_blueprint_imports_no_heavy_modules():
+    heavy = sorted(name for name in loaded_modules()
+                   if any(name == f or name.startswith(f + '.') for f in FORBIDDEN))
+    assert not heavy, f"heavy modules imported on the serving path: {heavy}"
+
+
+def test_prediction_blueprint_import_budget():
+    profile = min((import_profile() for _ in range(IMPORT_RUNS)), key=lambda p: p[TARGET])
+    elapsed_ms = profile[TARGET] / 1000
+    top = sorted(profile.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    print(f"import {TARGET}: {elapsed_ms:.1f} ms, best of {IMPORT_RUNS} (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    for name, us in top:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    assert elapsed_ms < IMPORT_BUDGET_MS
+
+
+if __name__ == '__main__':
+    test_prediction_blueprint_imports_no_heavy_modules()
+    test_prediction_blueprint_import_budget()
+    print("✅ Import budget test passed")
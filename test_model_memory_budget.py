@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Memory budget for the serving model set
+
+Runs backend/ml_model/memory_report.py in a fresh interpreter and checks
+that a worker stays within budget after loading the models and serving a
+warm-up batch. Two gunicorn workers share the 1 GB Fly VM, so each worker
+has to fit well under half of it. No single artifact may exceed the
+per-artifact budget either. That catches a model pickled together with
+its training data, or a vectorizer that keeps a huge stop_words_ set.
+
+Run with: python -m pytest -q test_model_memory_budget.py   (or python test_model_memory_budget.py)
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Worker RSS after loading and warm-up, in MB
+WORKER_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 350))
+# Deep size of any single loaded artifact, in MB
+ARTIFACT_BUDGET_MB = float(os.environ.get('MODEL_ARTIFACT_BUDGET_MB', 25))
+
+
+def run_report():
+    path = os.path.join(tempfile.mkdtemp(), 'memory.json')
+    out = subprocess.run([sys.executable, '-m', 'backend.ml_model.memory_report', '--json', path],
+                         cwd=ROOT, capture_output=True, text=True, timeout=600)
+    assert out.returncode == 0, out.stderr[-2000:]
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_model_set_within_memory_budget():
+    report = run_report()
+    rss_mb = report['rss_after_warmup_bytes'] / 1024 / 1024
+    print(f"Worker RSS after warm-up: {rss_mb:.1f} MB (budget {WORKER_BUDGET_MB:.0f} MB)")
+    assert report['serving_models'], "no models loaded"
+    assert rss_mb < WORKER_BUDGET_MB
+
+    oversized = [(a['name'], round(a['object_bytes'] / 1024 / 1024, 1), a['largest'][:1])
+                 for a in report['artifacts']
+                 if 'object_bytes' in a and a['object_bytes'] / 1024 / 1024 > ARTIFACT_BUDGET_MB]
+    assert not oversized, f"artifacts over {ARTIFACT_BUDGET_MB:.0f} MB: {oversized}"
+
+
+if __name__ == '__main__':
+    test_model_set_within_memory_budget()
+    print("✅ Model memory budget test passed")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Hot model reload (backend/ml_model/model_registry.py)
+
+Swaps between copies of the committed bundle: a changed bundle is swapped
+in, the engine a running request holds keeps working and is freed once it
+is released, a bundle that does not load leaves the served one alone, and
+a bundle is loaded with its own serving_config.json member selection.
+
+Run with: python -m pytest -q test_model_registry.py
+"""
+
+import gc
+import json
+import os
+import shutil
+import tempfile
+import weakref
+
+import pytest
+
+from backend.ml_model import spam_detector_multi as smd
+from backend.ml_model import model_registry
+
+
+@pytest.fixture
+def bundle_dir(monkeypatch):
+    directory = tempfile.mkdtemp()
+    for name in os.listdir(smd.MODEL_DIR):
+        if name.endswith(('.pkl', '.json')):
+            shutil.copy(os.path.join(smd.MODEL_DIR, name), directory)
+    monkeypatch.setattr(smd, 'MODEL_DIR', directory)
+    monkeypatch.setattr(smd, 'ONLINE_UPDATES', False)
+    # Later tests in the session get the engine and registry state they had before
+    for name in ('engine', 'tfidf', 'model_results', 'student', 'online_version', '_online_checked_at'):
+        monkeypatch.setattr(smd, name, getattr(smd, name))
+    monkeypatch.setattr(model_registry, 'last_reload', None)
+    monkeypatch.setattr(model_registry, '_retired', weakref.WeakSet())
+    smd.install_engine(smd.load_bundle(directory))
+    yield directory
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def test_changed_bundle_is_swapped_and_old_engine_drains(bundle_dir):
+    held = smd.current_engine()
+    assert model_registry.reload()['state'] == 'unchanged'
+
+    os.remove(os.path.join(bundle_dir, 'KNeighbors.pkl'))
+    report = model_registry.reload()
+    assert report['state'] == 'swapped', report
+    assert report['canary']['passed']
+    assert smd.current_model_version() == report['version'] != held.version
+    assert 'KNeighbors' not in smd.engine.model_results
+
+    # A request that started before the swap finishes on its own bundle
+    item = smd.predict_consensus_batch(["See you at 5"], engine=held)[0]
+    assert item['model_version'] == held.version
+    assert held.version in model_registry.status()['draining']
+    del held, item
+    gc.collect()
+    assert model_registry.status()['draining'] == []
+
+
+def test_broken_bundle_keeps_serving_the_current_one(bundle_dir):
+    version = smd.current_model_version()
+    with open(os.path.join(bundle_dir, 'tfidf_vectorizer.pkl'), 'wb') as f:
+        f.write(b'not a pickle')
+    report = model_registry.reload(force=True)
+    assert report['state'] == 'failed'
+    assert smd.current_model_version() == version
+    assert smd.predict_consensus("Hey, are we still on for lunch tomorrow?")['model_version'] == version
+
+
+def test_bundle_loads_its_own_member_selection(bundle_dir):
+    version = smd.load_bundle(bundle_dir).version
+    with open(os.path.join(bundle_dir, 'serving_config.json'), 'w') as f:
+        json.dump({'members': ['SVC', 'MultinomialNB', 'LogisticRegression']}, f)
+    candidate = smd.load_bundle(bundle_dir)
+    assert sorted(candidate.model_results) == ['LogisticRegression', 'MultinomialNB', 'SVC']
+    assert candidate.version != version
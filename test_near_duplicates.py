@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate verdict index (backend/ml_model/near_duplicates.py)
+
+Campaign variants that only change numbers reuse the stored verdict,
+unrelated or short messages do not, unsure verdicts are never stored, and
+the index stays within max_entries. Hits are counted per kind of result.
+
+Run with: python -m pytest -q test_near_duplicates.py
+"""
+
+from backend.ml_model.near_duplicates import NearDuplicateIndex, simhash
+
+CAMPAIGN = "urgent mobil number award 2000 cash prize claim call 09061701461 txt claim 81010"
+VARIANT = "urgent mobil number award 5000 cash prize claim call 09061790121 txt claim 80086"
+OTHER = "sorri call later meet still lunch tomorrow want pick milk way home"
+
+
+def _item(spam_votes, total=8):
+    majority = "Spam" if spam_votes * 2 > total else "Ham"
+    count = max(spam_votes, total - spam_votes)
+    return {"consensus": {"majority_vote": majority, "majority_count": count, "total_votes": total},
+            "model_results": {}, "model_version": "test"}
+
+
+def test_number_variants_reuse_the_verdict():
+    index = NearDuplicateIndex(max_entries=10, max_distance=3, min_confidence=0.9, ttl_seconds=60)
+    assert simhash(CAMPAIGN) == simhash(VARIANT)
+    assert index.put(CAMPAIGN, "consensus", _item(8))
+    result, distance = index.get(VARIANT)
+    assert result["consensus"]["majority_vote"] == "Spam" and distance == 0
+    assert index.get(OTHER) is None
+    assert index.get(VARIANT, "weighted:f1") is None
+    # Each kind has its own hit rate
+    kinds = index.stats()['kinds']
+    assert kinds['consensus'] == {'hits': 1, 'misses': 1, 'stored': 1, 'hit_rate': 0.5}
+    assert kinds['weighted:f1'] == {'hits': 0, 'misses': 1, 'stored': 0, 'hit_rate': 0.0}
+
+
+def test_unsure_short_and_stale_verdicts_are_not_reused():
+    index = NearDuplicateIndex(max_entries=10, max_distance=3, min_confidence=0.9, ttl_seconds=60)
+    assert not index.put(OTHER, "consensus", _item(6))
+    assert not index.put("ok see", "consensus", _item(8))
+    assert index.get(OTHER) is None
+
+    stale = NearDuplicateIndex(max_entries=10, max_distance=3, min_confidence=0.9, ttl_seconds=0)
+    stale.put(CAMPAIGN, "consensus", _item(8))
+    assert stale.get(VARIANT) is None
+
+
+def test_lru_eviction_bounds_entries_and_buckets():
+    index = NearDuplicateIndex(max_entries=3, max_distance=3, min_confidence=0.9, ttl_seconds=60)
+    texts = [f"{word} offer winner claim prize weekend award entri" for word in
+             ("free", "cheap", "bonu", "exclus", "limit", "special")]
+    for text in texts:
+        index.put(text, "consensus", _item(8))
+    assert len(index) == 3
+    assert index.stats()['evictions'] == 3
+    assert sum(len(members) for bucket in index._buckets for members in bucket.values()) == 3 * len(index._masks)
+    assert index.get(texts[-1]) is not None
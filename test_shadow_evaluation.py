@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Shadow evaluation (backend/shadow_evaluation.py)
+
+submit() drops samples once MODEL_SHADOW_MAX_PENDING are queued and never
+raises into the request, even when the pool is gone or the candidate does
+not load. The report's verdict follows the sample count, feedback accuracy
+and p95 latency.
+
+Run with: python -m pytest -q test_shadow_evaluation.py
+"""
+
+import threading
+
+import pytest
+from flask import Flask
+
+from backend.models import db, PredictionFeedback, ShadowEvaluation
+from backend import shadow_evaluation
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def shadow(monkeypatch):
+    monkeypatch.setattr(shadow_evaluation, '_config',
+                        {'dir': '/nonexistent', 'sample_rate': 1.0, 'workers': 1, 'max_pending': 1})
+    for name, value in (('_executor', None), ('_candidate', None), ('_candidate_error', None),
+                        ('_pending', 0), ('_dropped', 0)):
+        monkeypatch.setattr(shadow_evaluation, name, value)
+    yield shadow_evaluation
+    if shadow_evaluation._executor is not None:
+        shadow_evaluation._executor.shutdown(wait=True)
+
+
+def test_submit_drops_when_full_and_never_raises(shadow, monkeypatch):
+    release = threading.Event()
+    real_evaluate = shadow._evaluate
+
+    def blocked(*args):
+        release.wait(5)
+        real_evaluate(*args)
+
+    monkeypatch.setattr(shadow, '_evaluate', blocked)
+    served = {'consensus': {'majority_vote': 'SPAM', 'confidence': 90.0}}
+    assert shadow.submit(None, 'p1', 'h1', 'win cash', served)
+    assert not shadow.submit(None, 'p2', 'h2', 'win cash', served)
+    assert shadow.status()['dropped'] == 1 and shadow.status()['pending'] == 1
+
+    # The candidate directory does not load: logged, evaluation turns off, nothing raises
+    release.set()
+    shadow._executor.shutdown(wait=True)
+    assert shadow.status()['pending'] == 0
+    assert shadow.status()['candidate_error'] and not shadow.enabled()
+
+    # A pool that is already shut down only loses the sample
+    monkeypatch.setattr(shadow, '_candidate_error', None)
+    assert not shadow.submit(None, 'p3', 'h3', 'win cash', served)
+    assert shadow.status()['pending'] == 0
+
+
+def _sample(i, primary, candidate, primary_ms, candidate_ms, label=None):
+    db.session.add(ShadowEvaluation(
+        prediction_id=f'p{i}', message_hash=f'h{i}', primary_version='v1', candidate_version='v2',
+        primary_prediction=primary, candidate_prediction=candidate, agrees=primary == candidate,
+        primary_ms=primary_ms, candidate_ms=candidate_ms))
+    if label:
+        db.session.add(PredictionFeedback(prediction_id=f'p{i}', user_id='u', message_hash=f'h{i}',
+                                          label=label, predicted=primary))
+
+
+def test_report_verdict(app):
+    assert shadow_evaluation.report(min_samples=1)['verdict'] == 'hold'
+
+    for i in range(20):
+        _sample(i, 'ham', 'ham', 10.0 + i, 10.0 + i)
+    # The candidate fixes a missed spam the user reported and flips one unlabeled ham
+    _sample(20, 'ham', 'spam', 10.0, 10.0, label='spam')
+    _sample(21, 'ham', 'spam', 10.0, 10.0)
+    _sample(22, 'spam', 'spam', 10.0, 10.0, label='spam')
+    db.session.commit()
+
+    result = shadow_evaluation.report(min_samples=20)
+    assert result['candidate_version'] == 'v2' and result['primary_versions'] == ['v1']
+    assert result['samples'] == 23 and result['agreement'] == round(21 / 23, 4)
+    assert result['disagreements'] == {'spam_to_ham': 0, 'ham_to_spam': 2}
+    assert result['labeled'] == 2
+    assert result['primary_accuracy'] == 0.5 and result['candidate_accuracy'] == 1.0
+    assert result['latency_ms']['primary']['p95'] == result['latency_ms']['candidate']['p95'] == 28.0
+    assert result['verdict'] == 'promote', result['reasons']
+
+    assert shadow_evaluation.report(min_samples=100)['verdict'] == 'hold'
+    # Twice as slow on the slowest samples
+    ShadowEvaluation.query.filter(ShadowEvaluation.primary_ms > 20)\
+        .update({ShadowEvaluation.candidate_ms: ShadowEvaluation.primary_ms * 2})
+    db.session.commit()
+    slow = shadow_evaluation.report(min_samples=20)
+    assert slow['verdict'] == 'hold' and any('p95' in reason for reason in slow['reasons'])
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Startup-time budget for the Flask app factory
+
+Times create_app() in a fresh interpreter and checks that it stays within
+budget and runs no SQL at all. Boot cost must not depend on how many users
+or predictions the database holds.
+
+The clock covers importing backend.app and the blueprints it registers,
+so heavy imports on the serving path count against the budget too.
+
+Run with: python -m pytest -q test_startup_time.py   (or python test_startup_time.py)
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# create_app() wall-clock budget in milliseconds
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 1000))
+
+PROBE = r"""
+import json, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+start = time.perf_counter()
+import backend.app
+app = backend.app.create_app()
+elapsed_ms = (time.perf_counter() - start) * 1000
+print('STARTUP_RESULT ' + json.dumps({
+    'elapsed_ms': elapsed_ms,
+    'statements': statements,
+    'module_app_built': backend.app._app is not None,
+}))
+"""
+
+
+def measure_startup():
+    """Run the probe in a clean interpreter and return its result dict"""
+    tmpdir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'startup.db')}"
+    env['UPLOAD_FOLDER'] = os.path.join(tmpdir, 'uploads')
+    env['DB_AUTO_CREATE'] = 'false'
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=600)
+    assert out.returncode == 0, out.stderr[-2000:]
+    line = [l for l in out.stdout.splitlines() if l.startswith('STARTUP_RESULT ')][-1]
+    return json.loads(line[len('STARTUP_RESULT '):])
+
+
+def test_create_app_within_budget_and_without_queries():
+    result = measure_startup()
+    print(f"create_app(): {result['elapsed_ms']:.1f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)")
+    assert result['statements'] == [], f"create_app() ran SQL: {result['statements']}"
+    assert not result['module_app_built'], "importing backend.app built a second app"
+    assert result['elapsed_ms'] < STARTUP_BUDGET_MS
+
+
+if __name__ == '__main__':
+    test_create_app_within_budget_and_without_queries()
+    print("✅ Startup budget test passed")